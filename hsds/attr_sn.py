@@ -19,6 +19,7 @@ from aiohttp.web import StreamResponse
 from json import JSONDecodeError
 
 from .util.httpUtil import getAcceptType, jsonResponse, getHref, getBooleanParam
+from .util.httpUtil import getObjectETag, isNotModified, notModifiedResponse
 from .util.globparser import globmatch
 from .util.idUtil import isValidUuid, getRootObjId
 from .util.authUtil import getUserPasswordFromRequest, validateUserPassword
@@ -270,6 +271,14 @@ async def GET_Attribute(request):
     log.debug(f"got attributes: {attributes}")
     attribute = attributes[0]
 
+    # replacing an attribute doesn't change the created timestamp,
+    # so the tag is based on the attribute content
+    etag = getObjectETag(request, obj_id, attribute["created"], attr_name, attribute)
+    if isNotModified(request, etag):
+        resp = notModifiedResponse(etag)
+        log.response(request, resp=resp)
+        return resp
+
     resp_json = {}
     resp_json["name"] = attr_name
     resp_json["type"] = attribute["type"]
@@ -291,6 +300,7 @@ async def GET_Attribute(request):
     hrefs.append({"rel": "owner", "href": getHref(request, obj_uri)})
     resp_json["hrefs"] = hrefs
     resp = await jsonResponse(request, resp_json, ignore_nan=ignore_nan)
+    resp.headers["ETag"] = etag
     log.response(request, resp=resp)
     return resp
 
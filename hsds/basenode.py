@@ -527,6 +527,14 @@ async def info(request):
         cc_stats["utililization_per"] = cc.cacheUtilizationPercent
         cc_stats["mem_used"] = cc.memUsed
         cc_stats["mem_target"] = cc.memTarget
+        cc_stats["hit_count"] = cc.hitCount
+        cc_stats["miss_count"] = cc.missCount
+        if cc.compressedMemTarget > 0:
+            cc_stats["compressed_count"] = cc.compressedCount
+            cc_stats["compressed_mem_used"] = cc.compressedMemUsed
+            cc_stats["compressed_mem_target"] = cc.compressedMemTarget
+            cc_stats["compressed_add_count"] = cc.compressedAddCount
+            cc_stats["compressed_hit_count"] = cc.compressedHitCount
     answer["chunk_cache_stats"] = cc_stats
     dc_stats = {}
     if "domain_cache" in app:
@@ -537,6 +545,44 @@ async def info(request):
         dc_stats["mem_used"] = dc.memUsed
         dc_stats["mem_target"] = dc.memTarget
     answer["domain_cache_stats"] = dc_stats
+    if "disk_cache" in app:
+        disk_cache = app["disk_cache"]  # only DN nodes have this
+        disk_stats = {}
+        disk_stats["count"] = len(disk_cache)
+        disk_stats["utililization_per"] = disk_cache.cacheUtilizationPercent
+        disk_stats["size_used"] = disk_cache.sizeUsed
+        disk_stats["size_target"] = disk_cache.sizeTarget
+        disk_stats["hit_count"] = disk_cache.hitCount
+        disk_stats["miss_count"] = disk_cache.missCount
+        disk_stats["evict_count"] = disk_cache.evictCount
+        disk_stats["expire_count"] = disk_cache.expireCount
+        disk_stats["invalidate_count"] = disk_cache.invalidateCount
+        answer["disk_cache_stats"] = disk_stats
+    if "value_cache" in app:
+        value_cache = app["value_cache"]  # only SN nodes have this
+        vc_stats = {}
+        vc_stats["count"] = len(value_cache)
+        vc_stats["utililization_per"] = value_cache.cacheUtilizationPercent
+        vc_stats["mem_used"] = value_cache.memUsed
+        vc_stats["mem_target"] = value_cache.memTarget
+        vc_stats["hit_count"] = value_cache.hitCount
+        vc_stats["miss_count"] = value_cache.missCount
+        vc_stats["evict_count"] = value_cache.evictCount
+        vc_stats["expire_count"] = value_cache.expireCount
+        vc_stats["invalidate_count"] = value_cache.invalidateCount
+        answer["value_cache_stats"] = vc_stats
+    if "codec_stats" in app:
+        answer["codec_stats"] = app["codec_stats"]
+    if "read_coalesce_stats" in app:
+        answer["read_coalesce_stats"] = app["read_coalesce_stats"]
+    if "prefetch_stats" in app:
+        answer["prefetch_stats"] = app["prefetch_stats"]
+    if "dn_limiters" in app:
+        dn_limiters = app["dn_limiters"]  # only SN nodes have this
+        limiter_stats = {}
+        for dn_url in dn_limiters:
+            limiter_stats[dn_url] = dn_limiters[dn_url].getStats()
+        answer["dn_limiter_stats"] = limiter_stats
 
     resp = await jsonResponse(request, answer)
     log.response(request, resp=resp)
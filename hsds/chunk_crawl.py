@@ -18,22 +18,24 @@ import asyncio
 import time
 import traceback
 import random
-from asyncio import CancelledError
+from asyncio import CancelledError, IncompleteReadError
 import numpy as np
 from aiohttp.web_exceptions import HTTPBadRequest, HTTPNotFound, HTTPServiceUnavailable
 from aiohttp.web_exceptions import HTTPInternalServerError
-from aiohttp.client_exceptions import ClientError
+from aiohttp.client_exceptions import ClientError, ServerTimeoutError
 
 from .util.httpUtil import http_get, http_put, http_post, get_http_client
-from .util.httpUtil import isUnixDomainUrl
+from .util.httpUtil import isUnixDomainUrl, stream_read_into
 from .util.idUtil import getDataNodeUrl, getNodeCount
 from .util.hdf5dtype import createDataType
-from .util.dsetUtil import getSliceQueryParam, getShapeDims
+from .util.dsetUtil import getSliceQueryParam, getShapeDims, isVlen
 from .util.dsetUtil import getSelectionShape, getChunkLayout
 from .util.chunkUtil import getChunkCoverage, getDataCoverage
 from .util.chunkUtil import getChunkIdForPartition, getQueryDtype
+from .util.chunkUtil import CHUNK_FRAME_HEADER, getDatasetId
 from .util.arrayUtil import jsonToArray, getNumpyValue
 from .util.arrayUtil import getNumElements, arrayToBytes, bytesToArray
+from .util.concurrencyLimiter import ConcurrencyLimiter
 
 from . import config
 from . import hsds_logger as log
@@ -45,6 +47,25 @@ CHUNK_REF_LAYOUTS = (
 )
 
 
+def getDataNodeLimiter(app, dn_url):
+    """Return the concurrency limiter for the given DN.  Limiters are shared
+    by all the requests on this node"""
+    if "dn_limiters" not in app:
+        app["dn_limiters"] = {}
+    dn_limiters = app["dn_limiters"]
+    if dn_url not in dn_limiters:
+        kwargs = {
+            "name": f"ConcurrencyLimiter({dn_url})",
+            "initial_limit": int(config.get("max_tasks_per_node_per_request", default=16)),
+            "min_limit": int(config.get("dn_min_concurrency", default=1)),
+            "max_limit": int(config.get("dn_max_concurrency", default=32)),
+            "backoff": float(config.get("dn_concurrency_backoff", default=0.5)),
+            "latency_threshold": float(config.get("dn_latency_threshold", default=2.0)),
+        }
+        dn_limiters[dn_url] = ConcurrencyLimiter(**kwargs)
+    return dn_limiters[dn_url]
+
+
 def getFillValue(dset_json):
     """ Return the fill value of the given dataset as a numpy array.
       If no fill value is defined, return an zero array of given type """
@@ -155,6 +176,18 @@ async def write_chunk_hyperslab(
     log.debug(msg)
 
 
+def getOutBuffer(np_arr, data_sel):
+    """Return a writable memoryview of np_arr[data_sel] if the selection is a
+    contiguous region of a fixed size array, otherwise None.  Chunk data can
+    be read directly into it rather than copied from a temporary array"""
+    if np_arr is None or isVlen(np_arr.dtype) or data_sel is None:
+        return None
+    dest_arr = np_arr[data_sel]
+    if not dest_arr.flags["C_CONTIGUOUS"] or not np.may_share_memory(dest_arr, np_arr):
+        return None
+    return memoryview(dest_arr.reshape(-1).view(np.uint8))
+
+
 async def read_chunk_hyperslab(
     app,
     chunk_id,
@@ -348,19 +381,28 @@ async def read_chunk_hyperslab(
         if select is not None:
             params["select"] = select
 
+    # if the target selection is a contiguous region of np_arr, have the
+    # response be read directly into it rather than copying from a temporary array
+    out = None
+    if query_dtype is None:
+        out = getOutBuffer(np_arr, data_sel)
+        if out is not None:
+            log.debug(f"read_chunk_hyperslab - reading {out.nbytes} bytes into np_arr")
+
     # send request
     try:
         log.debug(f"read_chunk_hyperslab - {method} chunk req: {req}")
         log.debug(f"params: {params}")
         if method == "GET":
-            array_data = await http_get(app, req, params=params, client=client)
-            log.debug(f"http_get {req}, returned {len(array_data)} bytes")
+            array_data = await http_get(app, req, params=params, client=client, out=out)
+            log.debug(f"http_get {req} done")
         elif method == "PUT":
             array_data = await http_put(app, req, data=body, params=params, client=client)
             log.debug(f"http_put {req}, returned {len(array_data)} bytes")
         else:  # POST
-            array_data = await http_post(app, req, data=body, params=params, client=client)
-            log.debug(f"http_post {req}, returned {len(array_data)} bytes")
+            kwargs = {"data": body, "params": params, "client": client, "out": out}
+            array_data = await http_post(app, req, **kwargs)
+            log.debug(f"http_post {req} done")
     except HTTPNotFound:
         if query is None and "s3path" in params:
             s3path = params["s3path"]
@@ -370,6 +412,13 @@ async def read_chunk_hyperslab(
     # process response
     if array_data is None:
         log.debug(f"read_chunk_hyperslab - No data returned for chunk: {chunk_id}")
+    elif out is not None and isinstance(array_data, int):
+        # response was read directly into np_arr
+        if array_data != out.nbytes:
+            msg = f"Expected {out.nbytes} bytes for chunk: {chunk_id}, "
+            msg += f"but got: {array_data}"
+            log.error(msg)
+            raise HTTPInternalServerError()
     elif not isinstance(array_data, bytes):
         log.warn(f"read_chunk_hyperslab - expected bytes but got: {array_data}")
         raise HTTPInternalServerError()
@@ -395,7 +444,11 @@ async def read_chunk_hyperslab(
             try:
                 log.debug(f"np_arr.dtype: {np_arr.dtype}")
                 log.debug(f"chunk_shape: {chunk_shape}")
-                chunk_arr = bytesToArray(array_data, np_arr.dtype, chunk_shape)
+                if isVlen(np_arr.dtype):
+                    chunk_arr = bytesToArray(array_data, np_arr.dtype, chunk_shape)
+                else:
+                    # read-only view of the response, will be copied to np_arr
+                    chunk_arr = np.frombuffer(array_data, dtype=np_arr.dtype)
             except ValueError as ve:
                 log.warn(f"bytesToArray ValueError: {ve}")
                 raise HTTPBadRequest()
@@ -422,6 +475,108 @@ async def read_chunk_hyperslab(
     log.debug(f"read_chunk_hyperslab {chunk_id} - done")
 
 
+async def read_chunk_batch(
+    app,
+    chunk_ids,
+    dset_items,
+    chunk_map=None,
+    bucket=None,
+    client=None,
+):
+    """read the hyperslab selections for a batch of chunks that are
+    all served by the same DN with one request.
+    dset_items: list with the dict of dset_json, arr, and select_dtype
+        for the dataset of each chunk (chunks may be from different datasets)
+    Returns a map of chunk_id to status code for each chunk returned by
+    the DN.  Chunks with no entry should be retried individually.
+    """
+    msg = f"read_chunk_batch, {len(chunk_ids)} chunks, bucket: {bucket}"
+    log.info(msg)
+
+    items = []
+    for chunk_id, dset_item in zip(chunk_ids, dset_items):
+        dset_json = dset_item["dset_json"]
+        chunk_info = chunk_map[chunk_id]
+        item = {"id": getChunkIdForPartition(chunk_id, dset_json)}
+        item["select"] = getSliceQueryParam(chunk_info["chunk_sel"])
+        for key in ("s3path", "s3offset", "s3size", "hyper_dims"):
+            if key in chunk_info:
+                item[key] = chunk_info[key]
+        select_dtype = dset_item.get("select_dtype")
+        if select_dtype is not None:
+            dset_dt = createDataType(dset_json["type"])
+            if len(select_dtype) < len(dset_dt):
+                # field selection, pass in the field names
+                item["fields"] = ":".join(select_dtype.names)
+        items.append(item)
+
+    params = {"bucket": bucket}
+
+    req = getDataNodeUrl(app, items[0]["id"])
+    req += "/chunks"
+    body = {"chunks": items}
+    status_map = {}
+
+    async def read_frames(rsp):
+        # read each frame as it arrives, fixed size chunk data goes
+        # directly into the target array where possible
+        content = rsp.content
+        header_size = CHUNK_FRAME_HEADER.size
+        try:
+            while True:
+                try:
+                    header = await content.readexactly(header_size)
+                except IncompleteReadError as ire:
+                    if ire.partial:
+                        raise
+                    break  # end of response
+                index, status, nbytes = CHUNK_FRAME_HEADER.unpack(header)
+                if index >= len(chunk_ids):
+                    log.warn(f"read_chunk_batch - unexpected frame index: {index}")
+                    break
+                chunk_id = chunk_ids[index]
+                if status != 200:
+                    if nbytes:
+                        await content.readexactly(nbytes)  # discard
+                    if status == 404:
+                        # chunk hasn't been written, use the fill value
+                        log.debug(f"read_chunk_batch - no data returned for chunk: {chunk_id}")
+                        status = 200
+                    else:
+                        log.warn(f"read_chunk_batch - got status {status} for chunk: {chunk_id}")
+                    status_map[chunk_id] = status
+                    continue
+                np_arr = dset_items[index]["arr"]
+                chunk_info = chunk_map[chunk_id]
+                out = getOutBuffer(np_arr, chunk_info["data_sel"])
+                if out is not None and out.nbytes == nbytes:
+                    await stream_read_into(content, out)
+                    status_map[chunk_id] = status
+                    continue
+                data = await content.readexactly(nbytes)
+                chunk_shape = getSelectionShape(chunk_info["chunk_sel"])
+                try:
+                    if isVlen(np_arr.dtype):
+                        chunk_arr = bytesToArray(data, np_arr.dtype, chunk_shape)
+                    else:
+                        # view of the frame data, will be copied to np_arr
+                        chunk_arr = np.frombuffer(data, dtype=np_arr.dtype)
+                        chunk_arr = chunk_arr.reshape(chunk_shape)
+                except ValueError as ve:
+                    msg = f"read_chunk_batch - bytesToArray ValueError for {chunk_id}: {ve}"
+                    log.warn(msg)
+                    continue
+                np_arr[chunk_info["data_sel"]] = chunk_arr
+                status_map[chunk_id] = status
+        except IncompleteReadError as ire:
+            # chunks that weren't read will be retried individually
+            log.warn(f"read_chunk_batch - truncated response: {ire}")
+
+    await http_post(app, req, data=body, params=params, client=client, reader=read_frames)
+    log.debug(f"read_chunk_batch - got {len(status_map)} of {len(chunk_ids)} chunks")
+    return status_map
+
+
 async def read_point_sel(
     app,
     chunk_id,
@@ -528,9 +683,7 @@ async def read_point_sel(
         raise HTTPInternalServerError()
 
     # Fill in the return array based on passed in index values
-    for i in range(num_points):
-        index = point_index[i]
-        np_arr[index] = np_arr_rsp[i]
+    np_arr[point_index] = np_arr_rsp
 
 
 async def write_point_sel(
@@ -573,7 +726,7 @@ async def write_point_sel(
     # create a numpy array with point_data
 
     # if point data was already decoded from binary, don't decode again
-    if len(point_data) > 0 and isinstance(point_data[0], np.ndarray):
+    if isinstance(point_data, np.ndarray):
         data_arr = point_data
     else:
         data_arr = jsonToArray((num_points,), dset_dtype, point_data)
@@ -589,12 +742,8 @@ async def write_point_sel(
     np_arr = np.zeros((num_points,), dtype=comp_type)
 
     # Zip together coordinate and point_data to one numpy array
-    for i in range(num_points):
-        if rank == 1:
-            elem = (point_list[i], data_arr[i])
-        else:
-            elem = (tuple(point_list[i]), data_arr[i])
-        np_arr[i] = elem
+    np_arr["coord"] = np.asarray(point_list).reshape(np_arr["coord"].shape)
+    np_arr["value"] = data_arr
 
     post_data = arrayToBytes(np_arr)
 
@@ -627,7 +776,11 @@ class ChunkCrawler:
         limit=0,
         points=None,
         action=None,
+        dset_map=None,
     ):
+        """dset_map can be used in place of the dset_json, arr, select_dtype,
+        and slices arguments for a crawl over chunks from multiple datasets.
+        It is a map of dataset id to a dict with those keys."""
 
         max_tasks_per_node = config.get("max_tasks_per_node_per_request", default=16)
         client_pool_count = config.get("client_pool_count", default=10)
@@ -653,16 +806,55 @@ class ChunkCrawler:
         self._q = asyncio.Queue()
         self._fail_count = 0
         self._action = action
-
-        for chunk_id in chunk_ids:
-            self._q.put_nowait(chunk_id)
+        self._aborted = False  # set if the crawl gets cancelled
+        self._dset_map = dset_map
+        self._dset_item = {
+            "dset_json": dset_json,
+            "arr": arr,
+            "select_dtype": select_dtype,
+            "slices": slices,
+        }
+
+        # hyperslab reads for chunks on the same DN get sent as one request
+        batch_size = int(config.get("chunk_batch_size", default=16))
+        if batch_size > 1 and len(chunk_ids) > 1 and self._isBatchable():
+            batches = {}  # map of dn url to list of chunk ids
+            for chunk_id in chunk_ids:
+                chunk_dset_json = self._getDsetItem(chunk_id)["dset_json"]
+                partition_chunk_id = getChunkIdForPartition(chunk_id, chunk_dset_json)
+                dn_url = getDataNodeUrl(app, partition_chunk_id)
+                if dn_url not in batches:
+                    batches[dn_url] = []
+                batch = batches[dn_url]
+                batch.append(chunk_id)
+                if len(batch) == batch_size:
+                    self._q.put_nowait(batch)
+                    batches[dn_url] = []
+            for batch in batches.values():
+                if len(batch) == 1:
+                    self._q.put_nowait(batch[0])
+                elif batch:
+                    self._q.put_nowait(batch)
+            log.debug(f"ChunkCrawler - {self._q.qsize()} batches, batch_size: {batch_size}")
+        else:
+            batch_size = 1
+            for chunk_id in chunk_ids:
+                self._q.put_nowait(chunk_id)
 
         self._bucket = bucket
+        # with adaptive concurrency the per-DN limiters decide how many
+        # requests are in flight, so start enough tasks to reach the max limit
+        self._adaptive = config.get("dn_adaptive_concurrency", default=True)
+        if self._adaptive:
+            max_tasks_per_node = int(config.get("dn_max_concurrency", default=32))
+        # each task handles a batch of chunks, so scale down the number of
+        # tasks to keep the number of chunk reads in flight per DN the same
+        max_tasks_per_node = max(int(max_tasks_per_node) // batch_size, 1)
         max_tasks = max_tasks_per_node * getNodeCount(app)
-        if len(chunk_ids) > max_tasks:
+        if self._q.qsize() > max_tasks:
             self._max_tasks = max_tasks
         else:
-            self._max_tasks = len(chunk_ids)
+            self._max_tasks = self._q.qsize()
         log.debug(f"ChunkCrawler max_tasks: {max_tasks}")
 
         if self._max_tasks >= client_pool_count:
@@ -676,12 +868,52 @@ class ChunkCrawler:
             app["cc_clients"] = {}
         self._clients = app["cc_clients"]
 
-    def get_status(self):
+    def _getDsetItem(self, chunk_id):
+        """Return dict of dset_json, arr, select_dtype, and slices for the
+        dataset of the given chunk"""
+        if self._dset_map is None:
+            return self._dset_item
+        return self._dset_map[getDatasetId(chunk_id)]
+
+    def _getLimiter(self, chunk_id):
+        """Return the concurrency limiter for the DN that handles chunk_id or
+        None if adaptive concurrency is not enabled"""
+        if not self._adaptive:
+            return None
+        dset_json = self._getDsetItem(chunk_id)["dset_json"]
+        if dset_json is not None:
+            chunk_id = getChunkIdForPartition(chunk_id, dset_json)
+        dn_url = getDataNodeUrl(self._app, chunk_id)
+        return getDataNodeLimiter(self._app, dn_url)
+
+    def _isBatchable(self):
+        """Return True if chunk requests can be sent in batches"""
+        if self._action != "read_chunk_hyperslab":
+            return False
+        if self._query is not None or self._query_update is not None:
+            return False
+        if self._chunk_map is None:
+            return False
+        if self._arr is None and self._dset_map is None:
+            return False
+        for chunk_id in self._chunk_ids:
+            chunk_info = self._chunk_map.get(chunk_id)
+            if not chunk_info or "chunk_sel" not in chunk_info or "data_sel" not in chunk_info:
+                return False
+            if "points" in chunk_info:
+                return False
+        return True
+
+    def get_status(self, chunk_ids=None):
+        """Return 200 if all chunks (or the given subset of chunks) were
+        processed successfully, otherwise the first failing status code"""
         if len(self._status_map) != len(self._chunk_ids):
             msg = "get_status code while crawler not complete"
             log.error(msg)
             raise ValueError(msg)
-        for chunk_id in self._chunk_ids:
+        if chunk_ids is None:
+            chunk_ids = self._chunk_ids
+        for chunk_id in chunk_ids:
             if chunk_id not in self._status_map:
                 msg = f"expected to find chunk_id {chunk_id} in ChunkCrawler status_map"
                 log.error(msg)
@@ -704,13 +936,19 @@ class ChunkCrawler:
         msg = f"ChunkCrawler max_tasks {self._max_tasks} = await queue.join "
         msg += f"- count: {len(self._chunk_ids)}"
         log.info(msg)
-        await self._q.join()
-        msg = f"ChunkCrawler - join complete - count: {len(self._chunk_ids)}"
-        log.info(msg)
-
-        for w in workers:
-            w.cancel()
-        log.debug("ChunkCrawler - workers canceled")
+        try:
+            await self._q.join()
+            msg = f"ChunkCrawler - join complete - count: {len(self._chunk_ids)}"
+            log.info(msg)
+        except CancelledError:
+            # request was abandoned, stop any in-flight DN requests
+            log.info(f"ChunkCrawler - crawl cancelled - count: {len(self._chunk_ids)}")
+            self._aborted = True
+            raise
+        finally:
+            for w in workers:
+                w.cancel()
+            log.debug("ChunkCrawler - workers canceled")
 
     async def work(self):
         """Process chunk ids from queue till we are done"""
@@ -720,10 +958,16 @@ class ChunkCrawler:
         task_suffix = random.randrange(0, self._client_pool)
         client_name = f"{task_name}.{task_suffix}"
         log.info(f"ChunkCrawler - client_name: {client_name}")
-        while True:
+        while not self._aborted:
             try:
                 start = time.time()
                 chunk_id = await self._q.get()
+                if isinstance(chunk_id, list):
+                    # batch of chunks for one DN
+                    batch = chunk_id
+                    chunk_id = batch[0]
+                else:
+                    batch = None
                 if self._limit > 0 and self._hits >= self._limit:
                     msg = f"ChunkCrawler - maxhits exceeded, skipping fetch for chunk: {chunk_id}"
                     log.debug(msg)
@@ -744,7 +988,10 @@ class ChunkCrawler:
                             self._clients[client_name] = client
                         else:
                             client = self._clients[client_name]
-                    await self.do_work(chunk_id, client=client)
+                    if batch:
+                        await self.do_batch_work(batch, client=client)
+                    else:
+                        await self.do_work(chunk_id, client=client)
 
                 self._q.task_done()
                 elapsed = time.time() - start
@@ -756,6 +1003,57 @@ class ChunkCrawler:
                 # raise the exception so worker is truly cancelled
                 raise
 
+    async def do_batch_work(self, chunk_ids, client=None):
+        """fetch a batch of chunks from one DN.  Any chunks that are not
+        returned successfully get retried with per-chunk requests"""
+        msg = f"ChunkCrawler - do_batch_work for {len(chunk_ids)} chunks bucket: "
+        msg += f"{self._bucket}"
+        log.debug(msg)
+        status_map = {}
+        status_code = 200
+        limiter = self._getLimiter(chunk_ids[0])
+        if limiter:
+            await limiter.acquire()
+        try:
+            dset_items = [self._getDsetItem(chunk_id) for chunk_id in chunk_ids]
+            status_map = await read_chunk_batch(
+                self._app,
+                chunk_ids,
+                dset_items,
+                chunk_map=self._chunk_map,
+                bucket=self._bucket,
+                client=client,
+            )
+        except (ServerTimeoutError, asyncio.TimeoutError) as toe:
+            # treat timeouts as a sign the DN is overloaded, same as a 503
+            log.warn(f"TimeoutError for read_chunk_batch: {toe}")
+            status_code = 503
+        except ClientError as ce:
+            log.warn(f"ClientError {type(ce)} for read_chunk_batch: {ce}")
+            status_code = 500
+        except (HTTPBadRequest, HTTPNotFound, HTTPInternalServerError) as he:
+            log.warn(f"{type(he)} for read_chunk_batch: {he}")
+            status_code = he.status_code
+        except HTTPServiceUnavailable as sue:
+            log.warn(f"HTTPServiceUnavailable for read_chunk_batch: {sue}")
+            status_code = 503
+        except ValueError as ve:
+            log.warn(f"ValueError for read_chunk_batch: {ve}")
+            status_code = 500
+        finally:
+            if limiter:
+                # batch request times depend on the batch size, so don't
+                # use them for latency tracking
+                if status_code == 200 and 503 in status_map.values():
+                    status_code = 503
+                limiter.release(status_code=status_code)
+
+        for chunk_id in chunk_ids:
+            if status_map.get(chunk_id) == 200:
+                self._status_map[chunk_id] = 200
+            else:
+                await self.do_work(chunk_id, client=client)
+
     async def do_work(self, chunk_id, client=None):
         """fetch the indicated chunk and update status map"""
         msg = f"ChunkCrawler - do_work for chunk: {chunk_id} bucket: "
@@ -766,15 +1064,21 @@ class ChunkCrawler:
         log.debug(f"ChunkCrawler - retry_exp: {retry_exp:.3f}")
         retry = 0
         status_code = None
-        while retry < max_retries:
+        limiter = self._getLimiter(chunk_id)
+        dset_item = self._getDsetItem(chunk_id)
+        dset_json = dset_item["dset_json"]
+        while retry < max_retries and not self._aborted:
+            if limiter:
+                await limiter.acquire()
+            request_start = time.time()
             try:
                 if self._action == "read_chunk_hyperslab":
                     await read_chunk_hyperslab(
                         self._app,
                         chunk_id,
-                        self._dset_json,
-                        self._arr,
-                        select_dtype=self._select_dtype,
+                        dset_json,
+                        dset_item["arr"],
+                        select_dtype=dset_item["select_dtype"],
                         query=self._query,
                         query_update=self._query_update,
                         limit=self._limit,
@@ -789,9 +1093,9 @@ class ChunkCrawler:
                     await write_chunk_hyperslab(
                         self._app,
                         chunk_id,
-                        self._dset_json,
-                        self._slices,
-                        self._arr,
+                        dset_json,
+                        dset_item["slices"],
+                        dset_item["arr"],
                         bucket=self._bucket,
                         client=client,
                     )
@@ -817,10 +1121,10 @@ class ChunkCrawler:
                     await read_point_sel(
                         self._app,
                         chunk_id,
-                        self._dset_json,
+                        dset_json,
                         point_list,
                         point_data,
-                        self._arr,
+                        dset_item["arr"],
                         chunk_map=self._chunk_map,
                         bucket=self._bucket,
                         client=client,
@@ -847,7 +1151,7 @@ class ChunkCrawler:
                     await write_point_sel(
                         self._app,
                         chunk_id,
-                        self._dset_json,
+                        dset_json,
                         point_list,
                         point_data,
                         bucket=self._bucket,
@@ -861,6 +1165,10 @@ class ChunkCrawler:
                     status_code = 500
                     break
 
+            except (ServerTimeoutError, asyncio.TimeoutError) as toe:
+                # treat timeouts as a sign the DN is overloaded, same as a 503
+                status_code = 503
+                log.warn(f"TimeoutError for {self._action}({chunk_id}): {toe}")
             except ClientError as ce:
                 status_code = 500
                 msg = f"ClientError {type(ce)} for {self._action}({chunk_id}): {ce} "
@@ -889,6 +1197,14 @@ class ChunkCrawler:
                 log.error(msg)
                 tb = traceback.format_exc()
                 print("traceback:", tb)
+            finally:
+                if limiter:
+                    elapsed = time.time() - request_start
+                    if self._aborted:
+                        # errors from the cancellation don't reflect DN load
+                        limiter.release(status_code=None)
+                    else:
+                        limiter.release(status_code=status_code, elapsed=elapsed)
             retry += 1
             if status_code == 200:
                 break
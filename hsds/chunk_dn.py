@@ -14,29 +14,104 @@
 # handles regauests to read/write chunk data
 #
 
+import asyncio
 import numpy as np
+from aiohttp.web_exceptions import HTTPException
 from aiohttp.web_exceptions import HTTPBadRequest, HTTPInternalServerError
 from aiohttp.web_exceptions import HTTPNotFound, HTTPServiceUnavailable
 from aiohttp.web import json_response, StreamResponse
 
 from .util.httpUtil import request_read, getContentType
+from .util.httpUtil import cancelOnDisconnect, isClientDisconnected
 from .util.arrayUtil import bytesToArray, arrayToBytes, getBroadcastShape
 from .util.idUtil import getS3Key, validateInPartition, isValidUuid
 from .util.storUtil import isStorObj, deleteStorObj
 from .util.hdf5dtype import createDataType, getSubType
 from .util.dsetUtil import getSelectionList, getChunkLayout, getShapeDims
 from .util.dsetUtil import getSelectionShape, getChunkInitializer
+from .util.dsetUtil import isSelectAll, isVlen
 from .util.chunkUtil import getChunkIndex, getDatasetId, chunkQuery
 from .util.chunkUtil import chunkWriteSelection, chunkReadSelection
 from .util.chunkUtil import chunkWritePoints, chunkReadPoints
+from .util.chunkUtil import packChunkFrameHeader
 from .util.domainUtil import isValidBucketName
 from .util.boolparser import BooleanParser
 from .datanode_lib import get_metadata_obj, get_chunk, save_chunk
+from .datanode_lib import chunk_prefetch, chunk_prefetch_hit
+from .dset_lib import getFillValue
 
 from . import hsds_logger as log
 from . import config
 
 
+def _isInitArray(arr, dset_json):
+    """Return True if arr may be the same as a newly initialized chunk"""
+    if isVlen(arr.dtype) or getChunkInitializer(dset_json):
+        return True  # can't tell without creating the chunk
+    fill_value = getFillValue(dset_json)
+    if fill_value is None:
+        fill_value = np.zeros((1,), dtype=arr.dtype)
+    return bool(np.all(arr == fill_value))
+
+
+async def _read_chunk_arr(
+    app,
+    chunk_id,
+    dset_json,
+    bucket=None,
+    s3path=None,
+    s3offset=0,
+    s3size=0,
+    hyper_dims=None,
+):
+    """Return the chunk array for a chunk read, raising HTTPNotFound if
+    the chunk doesn't exist"""
+    if s3path:
+        # calculate how many chunk bytes we'll read
+        num_bytes = 0
+        if isinstance(s3size, int):
+            num_bytes = s3size
+        else:
+            # list
+            num_bytes = np.sum(s3size)
+        log.debug(f"reading {num_bytes} bytes from {s3path}")
+        if num_bytes == 0:
+            log.warn(f"chunk read for s3path: {s3path} with empty byte range")
+            raise HTTPNotFound()
+
+    if getChunkInitializer(dset_json):
+        chunk_init = True
+    else:
+        chunk_init = False
+
+    kwargs = {}
+    if s3path:
+        kwargs["s3path"] = s3path
+        kwargs["s3offset"] = s3offset
+        kwargs["s3size"] = s3size
+        if hyper_dims:
+            kwargs["hyper_dims"] = hyper_dims
+    else:
+        kwargs["bucket"] = bucket
+
+    kwargs["chunk_init"] = chunk_init
+
+    chunk_prefetch_hit(app, chunk_id)
+    chunk_arr = await get_chunk(app, chunk_id, dset_json, **kwargs)
+    if chunk_arr is None:
+        msg = f"chunk {chunk_id} not found"
+        log.warn(msg)
+        raise HTTPNotFound()
+    if not s3path:
+        # read-ahead if chunks are being accessed sequentially
+        chunk_prefetch(app, chunk_id, dset_json, bucket=bucket)
+
+    if chunk_init:
+        save_chunk(app, chunk_id, dset_json, chunk_arr, bucket=bucket)
+
+    return chunk_arr
+
+
 async def PUT_Chunk(request):
     """
     Update the requested chunk/selection
@@ -177,16 +252,24 @@ async def PUT_Chunk(request):
     else:
         chunk_init = True
 
-    kwargs = {"bucket": bucket, "chunk_init": chunk_init}
-    chunk_arr = await get_chunk(app, chunk_id, dset_json, **kwargs)
+    # if the selection covers the entire chunk, the current chunk contents
+    # are not needed - skip fetching the chunk from storage
+    overwrite = False
+    if not query and not select_fields and chunk_id not in chunk_cache:
+        overwrite = isSelectAll(selection, dims)
+
     is_dirty = False
-    if chunk_arr is None:
-        if chunk_init:
-            log.error("failed to create numpy array")
-            raise HTTPInternalServerError()
-        else:
-            log.warn(f"chunk {chunk_id} not found")
-            raise HTTPNotFound()
+    chunk_arr = None
+    if not overwrite:
+        kwargs = {"bucket": bucket, "chunk_init": chunk_init}
+        chunk_arr = await get_chunk(app, chunk_id, dset_json, **kwargs)
+        if chunk_arr is None:
+            if chunk_init:
+                log.error("failed to create numpy array")
+                raise HTTPInternalServerError()
+            else:
+                log.warn(f"chunk {chunk_id} not found")
+                raise HTTPNotFound()
 
     if query:
         if not dset_dt.fields:
@@ -294,8 +377,33 @@ async def PUT_Chunk(request):
         else:
             input_arr = input_arr.reshape(mshape)
 
-        kwargs = {"chunk_arr": chunk_arr, "slices": selection, "data": input_arr}
-        is_dirty = chunkWriteSelection(**kwargs)
+        if overwrite:
+            pending_s3_read = app["pending_s3_read"]
+            if chunk_id in chunk_cache or chunk_id in pending_s3_read:
+                # chunk was fetched while we were reading the request body
+                overwrite = False
+            elif not config.get("write_zero_chunks", default=False):
+                # a chunk with just the fill value doesn't get saved unless
+                # there's an existing chunk that would be modified
+                if _isInitArray(input_arr, dset_json):
+                    overwrite = False
+
+        if overwrite:
+            log.debug(f"PUT_Chunk {chunk_id} - full chunk overwrite")
+            if input_arr.flags.writeable:
+                chunk_arr = input_arr
+            else:
+                chunk_arr = input_arr.copy()
+            is_dirty = True
+        else:
+            if chunk_arr is None:
+                kwargs = {"bucket": bucket, "chunk_init": chunk_init}
+                chunk_arr = await get_chunk(app, chunk_id, dset_json, **kwargs)
+                if chunk_arr is None:
+                    log.error("failed to create numpy array")
+                    raise HTTPInternalServerError()
+            kwargs = {"chunk_arr": chunk_arr, "slices": selection, "data": input_arr}
+            is_dirty = chunkWriteSelection(**kwargs)
 
         # chunk update successful
         resp = {}
@@ -327,6 +435,8 @@ async def GET_Chunk(request):
 
     app = request.app
     params = request.rel_url.query
+    # stop fetching the chunk if the SN abandons the request
+    cancelOnDisconnect(request)
 
     chunk_id = request.match_info.get("id")
     if not chunk_id:
@@ -411,19 +521,6 @@ async def GET_Chunk(request):
             log.error(f"invalid Limit param: {param_limit}")
             raise HTTPBadRequest()
 
-    if s3path:
-        # calculate how many chunk bytes we'll read
-        num_bytes = 0
-        if isinstance(s3size, int):
-            num_bytes = s3size
-        else:
-            # list
-            num_bytes = np.sum(s3size)
-        log.debug(f"reading {num_bytes} bytes from {s3path}")
-        if num_bytes == 0:
-            log.warn(f"GET_Chunk for s3path: {s3path} with empty byte range")
-            raise HTTPNotFound()
-
     dset_id = getDatasetId(chunk_id)
 
     dset_json = await get_metadata_obj(app, dset_id, bucket=bucket)
@@ -455,31 +552,17 @@ async def GET_Chunk(request):
     else:
         select_fields = []
 
-    if getChunkInitializer(dset_json):
-        chunk_init = True
-    else:
-        chunk_init = False
+    if isClientDisconnected(request):
+        log.info(f"GET_Chunk {chunk_id} - request abandoned, skipping read")
+        raise HTTPServiceUnavailable()
 
-    kwargs = {}
+    kwargs = {"bucket": bucket}
     if s3path:
         kwargs["s3path"] = s3path
         kwargs["s3offset"] = s3offset
         kwargs["s3size"] = s3size
-        if hyper_dims:
-            kwargs["hyper_dims"] = hyper_dims
-    else:
-        kwargs["bucket"] = bucket
-
-    kwargs["chunk_init"] = chunk_init
-
-    chunk_arr = await get_chunk(app, chunk_id, dset_json, **kwargs)
-    if chunk_arr is None:
-        msg = f"chunk {chunk_id} not found"
-        log.warn(msg)
-        raise HTTPNotFound()
-
-    if chunk_init:
-        save_chunk(app, chunk_id, dset_json, chunk_arr, bucket=bucket)
+        kwargs["hyper_dims"] = hyper_dims
+    chunk_arr = await _read_chunk_arr(app, chunk_id, dset_json, **kwargs)
 
     if select_fields:
         try:
@@ -570,6 +653,129 @@ async def GET_Chunk(request):
     return resp
 
 
+async def POST_Chunks(request):
+    """
+    Return data for a batch of chunk hyperslab selections.
+    The request body is a JSON list of chunk items with an "id", "select",
+    and optionally "fields", "s3path", "s3offset", "s3size", and "hyper_dims"
+    keys.  Chunks may be from different datasets.
+    The response is a sequence of binary frames (one per chunk) with the
+    index of the chunk item, status code, and selection bytes, written in
+    the order the chunk reads complete.
+    """
+    log.request(request)
+    app = request.app
+    params = request.rel_url.query
+
+    bucket = params.get("bucket")
+    if not bucket:
+        msg = "POST_Chunks - expected bucket param"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if not isValidBucketName(bucket):
+        msg = f"Invalid bucket name: {bucket}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    if "fields" in params:
+        select_fields = params["fields"].split(":")
+        log.debug(f"POST_Chunks - got fields: {select_fields}")
+    else:
+        select_fields = []
+
+    if not request.has_body:
+        msg = "POST_Chunks with no body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    body = await request.json()
+    items = body.get("chunks")
+    if not isinstance(items, list):
+        msg = "POST_Chunks - expected list of chunks in body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    log.info(f"POST_Chunks - {len(items)} chunks")
+    # stop fetching chunks if the SN abandons the request
+    cancelOnDisconnect(request)
+
+    async def read_item(index, item):
+        chunk_id = item.get("id")
+        try:
+            if isClientDisconnected(request):
+                log.info(f"POST_Chunks {chunk_id} - request abandoned, skipping read")
+                raise HTTPServiceUnavailable()
+            if not chunk_id or not isValidUuid(chunk_id, "Chunk"):
+                log.warn(f"POST_Chunks - invalid chunk id: {chunk_id}")
+                raise HTTPBadRequest()
+            try:
+                validateInPartition(app, chunk_id)
+            except KeyError:
+                log.error(f"invalid partition for obj id: {chunk_id}")
+                raise HTTPInternalServerError()
+            dset_id = getDatasetId(chunk_id)
+            dset_json = await get_metadata_obj(app, dset_id, bucket=bucket)
+            dims = getChunkLayout(dset_json)
+            try:
+                selection = getSelectionList(item.get("select"), dims)
+            except ValueError as ve:
+                log.warn(f"POST_Chunks - invalid select for {chunk_id}: {ve}")
+                raise HTTPBadRequest()
+            kwargs = {"bucket": bucket}
+            for key in ("s3path", "s3offset", "s3size", "hyper_dims"):
+                if key in item:
+                    kwargs[key] = item[key]
+            chunk_arr = await _read_chunk_arr(app, chunk_id, dset_json, **kwargs)
+            item_fields = select_fields
+            if item.get("fields"):
+                item_fields = item["fields"].split(":")
+            if item_fields:
+                try:
+                    select_dt = getSubType(chunk_arr.dtype, item_fields)
+                except TypeError as te:
+                    log.warn(f"invalid fields selection: {te}")
+                    raise HTTPBadRequest()
+            else:
+                select_dt = chunk_arr.dtype
+            output_arr = chunkReadSelection(chunk_arr, slices=selection, select_dt=select_dt)
+            data = arrayToBytes(output_arr)
+            status = 200
+        except HTTPException as he:
+            log.debug(f"POST_Chunks - {chunk_id} returned status: {he.status_code}")
+            data = b""
+            status = he.status_code
+        except Exception as e:
+            log.error(f"POST_Chunks - unexpected exception {type(e)} for {chunk_id}: {e}")
+            data = b""
+            status = 500
+        return index, status, data
+
+    # limit the number of chunk reads in progress for this request
+    max_concurrency = int(config.get("chunk_batch_max_concurrency", default=4))
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def read_item_limited(index, item):
+        async with semaphore:
+            return await read_item(index, item)
+
+    tasks = [read_item_limited(index, item) for index, item in enumerate(items)]
+
+    try:
+        resp = StreamResponse()
+        resp.headers["Content-Type"] = "application/octet-stream"
+        await resp.prepare(request)
+        for task in asyncio.as_completed(tasks):
+            index, status, data = await task
+            await resp.write(packChunkFrameHeader(index, status, len(data)))
+            if data:
+                await resp.write(data)
+    except Exception as e:
+        log.error(f"Exception during binary data write: {e}")
+        raise HTTPInternalServerError()
+    finally:
+        await resp.write_eof()
+
+    return resp
+
+
 async def POST_Chunk(request):
     """
     Return data from requested chunk and point selection
@@ -862,7 +1068,7 @@ async def DELETE_Chunk(request):
     s3key = getS3Key(chunk_id)
     log.debug(f"DELETE_Chunk s3_key: {s3key}")
 
-    if chunk_id in chunk_cache:
+    if chunk_id in chunk_cache or chunk_cache.isCompressed(chunk_id):
         del chunk_cache[chunk_id]
 
     filter_map = app["filter_map"]
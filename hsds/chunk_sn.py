@@ -14,8 +14,10 @@
 # handles dataset /value requests for service node
 #
 
+import asyncio
 import base64
 import math
+import json
 import numpy as np
 from json import JSONDecodeError
 from asyncio import IncompleteReadError
@@ -26,6 +28,10 @@ from aiohttp.web import StreamResponse
 
 from .util.httpUtil import getHref, getAcceptType, getContentType
 from .util.httpUtil import request_read, jsonResponse, isAWSLambda
+from .util.httpUtil import cancelOnDisconnect, getRequestDeadline
+from .util.httpUtil import getAcceptEncoding, getContentEncoding, CONTENT_ENCODINGS
+from .util.httpUtil import encodeContent, decodeContent
+from .util.httpUtil import getETag, isNotModified, notModifiedResponse
 from .util.idUtil import isValidUuid
 from .util.domainUtil import getDomainFromRequest, isValidDomain
 from .util.domainUtil import getBucketForDomain
@@ -33,13 +39,18 @@ from .util.hdf5dtype import getItemSize, getDtypeItemSize, getSubType, createDat
 from .util.dsetUtil import isNullSpace, isScalarSpace, get_slices, getShapeDims
 from .util.dsetUtil import isExtensible, getSelectionPagination
 from .util.dsetUtil import getSelectionShape, getDsetMaxDims, getChunkLayout
-from .util.chunkUtil import getNumChunks, getChunkIds, getChunkId
+from .util.chunkUtil import getNumChunks, getChunkIds, getChunkIdsForPoints, getQueryDtype
+from .util.chunkUtil import CHUNK_FRAME_HEADER, packChunkFrameHeader, unpackChunkFrames
 from .util.arrayUtil import bytesArrayToList, jsonToArray
 from .util.arrayUtil import getNumElements, arrayToBytes, bytesToArray
 from .util.arrayUtil import squeezeArray, getBroadcastShape
 from .util.authUtil import getUserPasswordFromRequest, validateUserPassword
-from .servicenode_lib import getDsetJson, validateAction
-from .dset_lib import getSelectionData, getParser, extendShape
+from .util.arrowUtil import ARROW_STREAM_TYPE, ARROW_EOS, isArrowType
+from .util.arrowUtil import getArrowSchema, getArrowSchemaBytes
+from .util.arrowUtil import arrayToArrowBatch, arrayToArrowStream
+from .servicenode_lib import getDsetJson, validateAction, invalidateValueCache
+from .dset_lib import getSelectionData, getMultiSelectionData, writeMultiSelectionData
+from .dset_lib import getParser, extendShape, gatherLimited
 from .chunk_crawl import ChunkCrawler
 from . import config
 from . import hsds_logger as log
@@ -64,6 +75,180 @@ def get_hrefs(request, dset_json):
     return hrefs
 
 
+async def _writeResponseData(request, resp, data, encoding=None):
+    """Write data to the response.  On the first write the data is compressed
+    with the given content encoding unless it is small or incompressible, and
+    the response is prepared.  Later writes to an encoded response are
+    compressed as separate frames."""
+    if not resp.prepared:
+        if encoding:
+            cdata = await encodeContent(data, encoding)
+            if cdata is not None:
+                resp.headers["Content-Encoding"] = encoding
+                if resp.content_length is not None:
+                    resp.content_length = len(cdata)
+                data = cdata
+        await resp.prepare(request)
+    elif resp.headers.get("Content-Encoding") in CONTENT_ENCODINGS:
+        data = await encodeContent(data, resp.headers["Content-Encoding"], force=True)
+    await resp.write(data)
+
+
+def _prepareValueResponse(resp, response_type, encoding=None, content_length=None):
+    """Set the headers for a value response"""
+    if encoding is None and config.get("http_compression"):
+        log.debug("enabling http_compression")
+        resp.enable_compression()
+    if response_type == "binary":
+        resp.headers["Content-Type"] = "application/octet-stream"
+        if content_length is None:
+            log.debug("content_length could not be determined")
+        else:
+            resp.content_length = content_length
+    elif response_type == "arrow":
+        resp.headers["Content-Type"] = ARROW_STREAM_TYPE
+    else:
+        resp.headers["Content-Type"] = "application/json"
+    resp.headers["Vary"] = "Accept-Encoding"
+
+
+async def _getPageData(
+    app,
+    dset_id,
+    dset_json,
+    pages,
+    page_queue,
+    select_dtype=None,
+    query=None,
+    bucket=None,
+    limit=0,
+    arrow_schema=None,
+):
+    """Read each page of a streaming selection and add the bytes to page_queue,
+    so that the next page can be fetched while the prior one is being sent.
+    None is added after the last page, or the exception if a read fails.
+    If arrow_schema is set, each page is added as an Arrow record batch."""
+    try:
+        for page_number in range(len(pages)):
+            page = pages[page_number]
+            msg = f"streaming response data for page: {page_number + 1} "
+            msg += f"of {len(pages)}, selection: {page}"
+            log.info(msg)
+
+            arr = await getSelectionData(
+                app,
+                dset_id,
+                dset_json,
+                slices=page,
+                select_dtype=select_dtype,
+                query=query,
+                bucket=bucket,
+                limit=limit
+            )
+
+            if arr is None or math.prod(arr.shape) == 0:
+                log.warn(f"no data returned for streaming page: {page_number}")
+                continue
+
+            if arrow_schema is None:
+                output_data = arrayToBytes(arr)
+            else:
+                output_data = arrayToArrowBatch(arr, schema=arrow_schema)
+            log.debug(f"got {len(output_data)} bytes for page: {page_number + 1}")
+            await page_queue.put(output_data)
+
+            if query and limit > 0:
+                query_rows = arr.shape[0]
+                msg = f"streaming page {page_number} returned {query_rows} rows"
+                log.debug(msg)
+                limit -= query_rows
+                if limit <= 0:
+                    log.debug("skipping remaining pages, query limit reached")
+                    break
+        await page_queue.put(None)
+    except Exception as e:
+        await page_queue.put(e)
+
+
+async def _streamPageData(
+    request,
+    resp,
+    dset_id,
+    dset_json,
+    pages,
+    select_dtype=None,
+    query=None,
+    bucket=None,
+    limit=0,
+    encoding=None,
+    output_dtype=None,
+):
+    """Write the selection data for each page to the response as it's read.
+    If output_dtype is set, the pages are written as an Arrow stream.
+    Errors after the first write can't be reported to the client, so they
+    just end the response early."""
+    app = request.app
+    bytes_streamed = 0
+    # fetch pages in a separate task so that the DN reads for the
+    # next pages overlap with writing the current page
+    # the queue size limits how many pages are held in memory
+    page_queue_size = max(int(config.get("stream_page_queue_size", default=2)), 1)
+    page_queue = asyncio.Queue(maxsize=page_queue_size)
+    kwargs = {
+        "select_dtype": select_dtype,
+        "query": query,
+        "bucket": bucket,
+        "limit": limit,
+    }
+    stream_prefix = b""  # written before the first page
+    if output_dtype is not None:
+        # one record batch per page following the schema message
+        arrow_schema = getArrowSchema(output_dtype)
+        kwargs["arrow_schema"] = arrow_schema
+        stream_prefix = getArrowSchemaBytes(output_dtype, schema=arrow_schema)
+    # each page is compressed as a separate frame, which only zstd
+    # decoders will treat as one stream
+    stream_encoding = encoding if encoding == "zstd" else None
+    if stream_encoding:
+        resp.content_length = None
+    page_task = asyncio.create_task(
+        _getPageData(app, dset_id, dset_json, pages, page_queue, **kwargs)
+    )
+    try:
+        while True:
+            output_data = await page_queue.get()
+            if output_data is None:
+                if output_dtype is not None:
+                    # only mark the end of the stream if all pages were sent
+                    output_data = stream_prefix + ARROW_EOS
+                    bytes_streamed += len(output_data)
+                    await _writeResponseData(request, resp, output_data)
+                break  # all pages done
+            if isinstance(output_data, Exception):
+                raise output_data
+            if stream_prefix:
+                output_data = stream_prefix + output_data
+                stream_prefix = b""
+            bytes_streamed += len(output_data)
+            log.debug(f"write {len(output_data)} bytes")
+            await _writeResponseData(request, resp, output_data, encoding=stream_encoding)
+    except HTTPException as he:
+        # can't raise a HTTPException here since write is in progress
+        log.error(f"got {type(he)} exception doing getSelectionData: {he}")
+    except Exception as e:
+        log.error(f"got {type(e)} exception doing getSelectionData: {e}")
+    finally:
+        page_task.cancel()
+        msg = f"streaming data for {len(pages)} pages complete, "
+        msg += f"{bytes_streamed} bytes written"
+        log.info(msg)
+
+        if not resp.prepared:
+            await resp.prepare(request)
+        await resp.write_eof()
+        return bytes_streamed
+
+
 def use_http_streaming(request, rank):
     """ return boolean indicating whether http streaming should be used """
     if rank == 0:
@@ -311,6 +496,26 @@ def _getPoints(body, rank=1):
     return points
 
 
+def _checkPoints(points, dims, method="POST"):
+    """ raise HTTPBadRequest if the points don't match the dataset rank or
+    any are outside the bounds of the dataset """
+    rank = len(dims)
+    num_points = len(points)
+    if num_points == 0:
+        return
+    if points.size != num_points * rank:
+        msg = f"{method} Value point value did not match dataset rank"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    coords = points.reshape((num_points, rank))
+    invalid = np.any((coords < 0) | (coords >= np.asarray(dims, dtype=np.uint64)), axis=1)
+    if np.any(invalid):
+        point = points[int(np.flatnonzero(invalid)[0])]
+        msg = f"{method} Value point: {point} is not within the bounds of the dataset"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+
 def _getQuery(params, dtype, rank=1, body=None):
     """ get query parameter and validate if set """
 
@@ -367,16 +572,41 @@ def _getElementCount(params, body=None):
     return element_count
 
 
-async def _getRequestData(request, http_streaming=True):
+def _getValueCacheKey(request, response_type, dims, slices):
+    """ return key for the value cache that identifies the GET value
+    response for the given request (other than the dataset id) """
+    params = request.rel_url.query
+    key = [response_type, str(dims), str(slices)]
+    for kw in ("fields", "query", "Limit", "ignore_nan", "reduce_dim"):
+        key.append(params.get(kw, ""))
+    if response_type == "json":
+        # hrefs depend on the endpoint and domain used in the request
+        key.append(getHref(request, "/"))
+    return "|".join(key)
+
+
+async def _getRequestBody(request, content_encoding=None):
+    """ return the JSON body of the request, uncompressing it first if
+        the request has a content encoding """
+    if content_encoding:
+        data = await request_read(request)
+        data = await decodeContent(data, content_encoding)
+        return json.loads(data)
+    return await request.json()
+
+
+async def _getRequestData(request, http_streaming=True, body=None, content_encoding=None):
     """ get input data from request
         return dict for json input, bytes for non-streaming binary
-        or None, for streaming """
+        or None, for streaming.  body is the JSON body if it has already
+        been read """
 
     input_data = None
     request_type = getContentType(request)
     log.debug(f"_getRequestData - request_type: {request_type}")
     if request_type == "json":
-        body = await request.json()
+        if body is None:
+            body = await _getRequestBody(request, content_encoding=content_encoding)
         log.debug(f"getRequestData - got json: {body}")
         if "value" in body:
             input_data = body["value"]
@@ -412,6 +642,8 @@ async def _getRequestData(request, http_streaming=True):
             # TBD: support streaming for variable length types
             try:
                 input_data = await request_read(request)
+                if content_encoding:
+                    input_data = await decodeContent(input_data, content_encoding)
             except HTTPRequestEntityTooLarge as tle:
                 msg = "Got HTTPRequestEntityTooLarge exception during "
                 msg += f"binary read: {tle})"
@@ -432,13 +664,10 @@ async def arrayResponse(arr, request, dset_json):
         # write response
         try:
             resp = StreamResponse()
-            if config.get("http_compression"):
-                log.debug("enabling http_compression")
-                resp.enable_compression()
-            resp.headers["Content-Type"] = "application/octet-stream"
-            resp.content_length = len(output_data)
-            await resp.prepare(request)
-            await resp.write(output_data)
+            encoding = getAcceptEncoding(request)
+            kwargs = {"encoding": encoding, "content_length": len(output_data)}
+            _prepareValueResponse(resp, response_type, **kwargs)
+            await _writeResponseData(request, resp, output_data, encoding=encoding)
             await resp.write_eof()
         except Exception as e:
             log.error(f"Exception during binary data write: {e}")
@@ -474,48 +703,12 @@ async def _doPointWrite(app,
     layout = getChunkLayout(dset_json)
     datashape = dset_json["shape"]
     dims = getShapeDims(datashape)
-    rank = len(dims)
 
-    chunk_dict = {}  # chunk ids to list of points in chunk
-
-    for pt_indx in range(num_points):
-        if rank == 1:
-            point = int(points[pt_indx])
-        else:
-            point_tuple = points[pt_indx]
-            point = []
-            for i in range(len(point_tuple)):
-                point.append(int(point_tuple[i]))
-        if rank == 1:
-            if point < 0 or point >= dims[0]:
-                msg = f"PUT Value point: {point} is not within the "
-                msg += "bounds of the dataset"
-                log.warn(msg)
-                raise HTTPBadRequest(reason=msg)
-        else:
-            if len(point) != rank:
-                msg = "PUT Value point value did not match dataset rank"
-                log.warn(msg)
-                raise HTTPBadRequest(reason=msg)
-            for i in range(rank):
-                if point[i] < 0 or point[i] >= dims[i]:
-                    msg = f"PUT Value point: {point} is not within the "
-                    msg += "bounds of the dataset"
-                    log.warn(msg)
-                    raise HTTPBadRequest(reason=msg)
-        chunk_id = getChunkId(dset_id, point, layout)
-        # get the pt_indx element from the input data
-        value = data[pt_indx]
-        if chunk_id not in chunk_dict:
-            point_list = [point, ]
-            point_data = [value, ]
-            chunk_dict[chunk_id] = {"indices": point_list, "points": point_data}
-        else:
-            item = chunk_dict[chunk_id]
-            point_list = item["indices"]
-            point_list.append(point)
-            point_data = item["points"]
-            point_data.append(value)
+    _checkPoints(points, dims, method="PUT")
+    chunk_dict = {}  # chunk ids to points in chunk and values to write
+    chunk_points = getChunkIdsForPoints(dset_id, points, layout)
+    for chunk_id, point_index in chunk_points.items():
+        chunk_dict[chunk_id] = {"indices": points[point_index], "points": data[point_index]}
 
     num_chunks = len(chunk_dict)
     log.debug(f"num_chunks: {num_chunks}")
@@ -689,6 +882,8 @@ async def PUT_Value(request):
     await validateAction(app, domain, dset_id, username, "update")
 
     request_type = getContentType(request)
+    # zstd or x-hsds-lz4 compressed request body
+    content_encoding = getContentEncoding(request)
 
     log.debug(f"PUT value - request_type is {request_type}")
 
@@ -711,7 +906,7 @@ async def PUT_Value(request):
 
     if request_type == "json":
         try:
-            body = await request.json()
+            body = await _getRequestBody(request, content_encoding=content_encoding)
         except JSONDecodeError:
             msg = "Unable to load JSON body"
             log.warn(msg)
@@ -744,6 +939,9 @@ async def PUT_Value(request):
 
     if item_size == 'H5T_VARIABLE' or element_count or not use_http_streaming(request, rank):
         http_streaming = False
+    elif content_encoding:
+        # the body needs to be uncompressed before it can be split into pages
+        http_streaming = False
     else:
         http_streaming = True
 
@@ -753,16 +951,19 @@ async def PUT_Value(request):
         log.debug(f"got query: {query}")
         limit = _getLimit(params, body=body)
 
-        arr_rsp = await getSelectionData(
-            app,
-            dset_id,
-            dset_json,
-            slices=slices,
-            query=query,
-            bucket=bucket,
-            limit=limit,
-            query_update=body,
-        )
+        try:
+            arr_rsp = await getSelectionData(
+                app,
+                dset_id,
+                dset_json,
+                slices=slices,
+                query=query,
+                bucket=bucket,
+                limit=limit,
+                query_update=body,
+            )
+        finally:
+            invalidateValueCache(app, dset_id)
         resp = await arrayResponse(arr_rsp, request, dset_json)
         log.response(request, resp=resp)
         return resp
@@ -770,7 +971,10 @@ async def PUT_Value(request):
     # regular PUT_Value processing without query update
     np_shape = []  # shape of incoming data
     bc_shape = []  # shape of broadcast array (if element_count is set)
-    input_data = await _getRequestData(request, http_streaming=http_streaming)
+    kwargs = {"http_streaming": http_streaming, "content_encoding": content_encoding}
+    if request_type == "json":
+        kwargs["body"] = body
+    input_data = await _getRequestData(request, **kwargs)
     # could be int, list, str, bytes, or  None
     log.debug(f"got input data type: {type(input_data)}")
 
@@ -909,39 +1113,43 @@ async def PUT_Value(request):
         log.debug("will use streaming for request data")
 
     slices = tuple(slices)  # no more edits to slices
-    if points is None:
-        # do a hyperslab write
-        if arr is not None:
-            # make a one page list to handle the write in one chunk crawler run
-            # (larger write request should user binary streaming)
-            pages = (slices,)
-            log.debug(f"non-streaming data, setting page list to: {slices}")
-        else:
-            max_request_size = int(config.get("max_request_size"))
-            pages = getSelectionPagination(slices, dims, select_item_size, max_request_size)
-            log.debug(f"getSelectionPagination returned: {len(pages)} pages")
-
-        for page_number in range(len(pages)):
-            page = pages[page_number]
-            msg = f"streaming request data for page: {page_number + 1} of {len(pages)}, "
-            msg += f"selection: {page}"
-            log.info(msg)
-            kwargs = {"page_number": page_number, "page": page}
-            kwargs["dset_json"] = dset_json
-            kwargs["bucket"] = bucket
-            kwargs["select_dtype"] = select_dtype
-            if arr is not None and page_number == 0:
-                kwargs["data"] = arr
+    try:
+        if points is None:
+            # do a hyperslab write
+            if arr is not None:
+                # make a one page list to handle the write in one chunk crawler run
+                # (larger write request should user binary streaming)
+                pages = (slices,)
+                log.debug(f"non-streaming data, setting page list to: {slices}")
             else:
-                kwargs["data"] = None
-            # do write for one page selection
-            await _doHyperslabWrite(app, request, **kwargs)
-    else:
-        #
-        # Do point put
-        #
-        kwargs = {"points": points, "data": arr, "dset_json": dset_json, "bucket": bucket}
-        await _doPointWrite(app, request, **kwargs)
+                max_request_size = int(config.get("max_request_size"))
+                pages = getSelectionPagination(slices, dims, select_item_size, max_request_size)
+                log.debug(f"getSelectionPagination returned: {len(pages)} pages")
+
+            for page_number in range(len(pages)):
+                page = pages[page_number]
+                msg = f"streaming request data for page: {page_number + 1} of {len(pages)}, "
+                msg += f"selection: {page}"
+                log.info(msg)
+                kwargs = {"page_number": page_number, "page": page}
+                kwargs["dset_json"] = dset_json
+                kwargs["bucket"] = bucket
+                kwargs["select_dtype"] = select_dtype
+                if arr is not None and page_number == 0:
+                    kwargs["data"] = arr
+                else:
+                    kwargs["data"] = None
+                # do write for one page selection
+                await _doHyperslabWrite(app, request, **kwargs)
+        else:
+            #
+            # Do point put
+            #
+            kwargs = {"points": points, "data": arr, "dset_json": dset_json, "bucket": bucket}
+            await _doPointWrite(app, request, **kwargs)
+    finally:
+        # any cached responses for the dataset are now out of date
+        invalidateValueCache(app, dset_id)
 
     # write successful
 
@@ -957,6 +1165,8 @@ async def GET_Value(request):
     log.request(request)
     app = request.app
     params = request.rel_url.query
+    # stop reading data if the client goes away
+    cancelOnDisconnect(request, deadline=getRequestDeadline(request))
 
     dset_id = request.match_info.get("id")
     if not dset_id:
@@ -1024,8 +1234,19 @@ async def GET_Value(request):
     query = _getQuery(params, dset_dtype, rank=rank)
 
     response_type = getAcceptType(request)
+    if response_type == "arrow":
+        # arrow record batches are only supported for compound types
+        if query:
+            output_dtype = getQueryDtype(select_dtype)
+        else:
+            output_dtype = select_dtype
+        if not isArrowType(output_dtype):
+            msg = "Client requested arrow, but arrow is not supported "
+            msg += f"for type: {output_dtype}, returning JSON"
+            log.info(msg)
+            response_type = "json"
 
-    if response_type == "binary" and use_http_streaming(request, rank):
+    if response_type in ("binary", "arrow") and use_http_streaming(request, rank):
         stream_pagination = True
         log.debug("use stream_pagination")
     else:
@@ -1063,23 +1284,46 @@ async def GET_Value(request):
     else:
         content_length = None
 
+    encoding = getAcceptEncoding(request)
+    log.debug(f"response content encoding: {encoding}")
+
+    cache_key = None
+    if "value_cache" in app:
+        # repeated selections can be returned without reading from the DNs
+        value_cache = app["value_cache"]
+        if stream_pagination and request_size <= value_cache.maxItemSize:
+            # return small selections with one write so they can be cached
+            log.debug("value cache enabled, no stream_pagination")
+            stream_pagination = False
+    if "value_cache" in app and not stream_pagination:
+        cache_key = _getValueCacheKey(request, response_type, dims, slices)
+        cache_item = value_cache.get(dset_id, cache_key)
+        if cache_item is not None:
+            output_data, etag = cache_item
+            if isNotModified(request, etag):
+                log.info("GET Value - value cache etag matched, not modified")
+                resp = notModifiedResponse(etag)
+                log.response(request, resp=resp)
+                return resp
+            log.info(f"GET Value - returning {len(output_data)} bytes from value cache")
+            resp = StreamResponse()
+            kwargs = {"encoding": encoding, "content_length": len(output_data)}
+            _prepareValueResponse(resp, response_type, **kwargs)
+            resp.headers["ETag"] = etag
+            await _writeResponseData(request, resp, output_data, encoding=encoding)
+            await resp.write_eof()
+            return resp
+        # don't cache the response if the dataset is updated while reading
+        cache_generation = value_cache.generation
+
     resp_json = {"status": 200}  # will over-write if there's a problem
     # write response
     try:
         resp = StreamResponse()
-        if config.get("http_compression"):
-            log.debug("enabling http_compression")
-            resp.enable_compression()
-        if response_type == "binary":
-            resp.headers["Content-Type"] = "application/octet-stream"
-            if content_length is None:
-                log.debug("content_length could not be determined")
-            else:
-                resp.content_length = content_length
-        else:
-            resp.headers["Content-Type"] = "application/json"
-        log.debug("prepare request")
-        await resp.prepare(request)
+        kwargs = {"encoding": encoding, "content_length": content_length}
+        _prepareValueResponse(resp, response_type, **kwargs)
+        # the response gets prepared with the first write so the content
+        # encoding can be chosen based on the data
         arr = None  # will be set based on returned data
 
         if stream_pagination:
@@ -1091,62 +1335,17 @@ async def GET_Value(request):
                 page_item_size = item_size
             pages = getSelectionPagination(slices, dims, page_item_size, max_request_size)
             log.debug(f"getSelectionPagination returned: {len(pages)} pages")
-            bytes_streamed = 0
-            try:
-                for page_number in range(len(pages)):
-                    page = pages[page_number]
-                    msg = f"streaming response data for page: {page_number + 1} "
-                    msg += f"of {len(pages)}, selection: {page}"
-                    log.info(msg)
-
-                    log.debug("calling getSelectionData!")
-
-                    arr = await getSelectionData(
-                        app,
-                        dset_id,
-                        dset_json,
-                        slices=page,
-                        select_dtype=select_dtype,
-                        query=query,
-                        bucket=bucket,
-                        limit=limit
-                    )
-
-                    if arr is None or math.prod(arr.shape) == 0:
-                        log.warn(f"no data returned for streaming page: {page_number}")
-                        continue
-
-                    log.debug("preparing binary response")
-                    output_data = arrayToBytes(arr)
-                    log.debug(f"got {len(output_data)} bytes for resp")
-                    bytes_streamed += len(output_data)
-                    log.debug("write request")
-                    await resp.write(output_data)
-
-                    if query and limit > 0:
-                        query_rows = arr.shape[0]
-                        msg = f"streaming page {page_number} returned {query_rows} rows"
-                        log.debug(msg)
-                        limit -= query_rows
-                        if limit <= 0:
-                            log.debug("skipping remaining pages, query limit reached")
-                            break
-
-            except HTTPException as he:
-                # close the response stream
-                log.error(f"got {type(he)} exception doing getSelectionData: {he}")
-                resp_json["status"] = he.status_code
-                # can't raise a HTTPException here since write is in progress
-                #
-            except Exception as e:
-                log.error(f"got {type(e)} exception doing getSelectionData: {e}")
-            finally:
-                msg = f"streaming data for {len(pages)} pages complete, "
-                msg += f"{bytes_streamed} bytes written"
-                log.info(msg)
-
-                await resp.write_eof()
-                return resp
+            kwargs = {
+                "select_dtype": select_dtype,
+                "query": query,
+                "bucket": bucket,
+                "limit": limit,
+                "encoding": encoding,
+            }
+            if response_type == "arrow":
+                kwargs["output_dtype"] = output_dtype
+            await _streamPageData(request, resp, dset_id, dset_json, pages, **kwargs)
+            return resp
 
         #
         # non-paginated response
@@ -1169,6 +1368,7 @@ async def GET_Value(request):
             resp_json["status"] = he.status_code
             # can't raise a HTTPException here since write is in progress
 
+        output_data = None  # response bytes
         if arr is None:
             # no array (OPTION request?)  Return empty json response
             log.warn("got None response from getSelectionData")
@@ -1186,8 +1386,12 @@ async def GET_Value(request):
                 log.debug("preparing binary response")
                 output_data = arrayToBytes(arr)
                 log.debug(f"got {len(output_data)} bytes for resp")
-                log.debug("write request")
-                await resp.write(output_data)
+        elif response_type == "arrow":
+            if resp_json["status"] != 200:
+                log.warn(f"GET Value - got error status: {resp_json['status']}")
+            else:
+                output_data = arrayToArrowStream(arr)
+                log.debug(f"got {len(output_data)} bytes for arrow resp")
         else:
             # return json
             log.debug("GET Value - returning JSON data")
@@ -1213,8 +1417,25 @@ async def GET_Value(request):
                 resp, resp_json, ignore_nan=ignore_nan, body_only=True
             )
             log.debug(f"jsonResponse returned: {len(resp_body)} items")
-            resp_body = resp_body.encode("utf-8")
-            await resp.write(resp_body)
+            output_data = resp_body.encode("utf-8")
+        if output_data is not None:
+            if cache_key or request.if_none_match:
+                # hash the response off the event loop
+                loop = asyncio.get_running_loop()
+                etag = await loop.run_in_executor(None, getETag, output_data)
+                if cache_key:
+                    kwargs = {"generation": cache_generation, "etag": etag}
+                    value_cache.put(dset_id, cache_key, output_data, **kwargs)
+                if isNotModified(request, etag):
+                    # the data is unchanged since the client's last read
+                    resp = notModifiedResponse(etag)
+                    log.response(request, resp=resp)
+                    return resp
+                resp.headers["ETag"] = etag
+            log.debug("write request")
+            await _writeResponseData(request, resp, output_data, encoding=encoding)
+        if not resp.prepared:
+            await resp.prepare(request)
         await resp.write_eof()
     except Exception as e:
         log.error(f"{type(e)} Exception during data write: {e}")
@@ -1235,6 +1456,8 @@ async def POST_Value(request):
 
     app = request.app
     body = None
+    # stop reading data if the client goes away
+    cancelOnDisconnect(request, deadline=getRequestDeadline(request))
 
     dset_id = request.match_info.get("id")
     if not dset_id:
@@ -1318,6 +1541,12 @@ async def POST_Value(request):
     select_dtype = _getSelectDtype(params, dset_dtype, body=body)
     log.debug(f"got select_dtype: {select_dtype}")
 
+    if response_type == "arrow" and not isArrowType(select_dtype):
+        msg = "Client requested arrow, but arrow is not supported "
+        msg += f"for type: {select_dtype}, returning JSON"
+        log.info(msg)
+        response_type = "json"
+
     if request_type == "json":
         if "points" in body:
             points_list = body["points"]
@@ -1391,42 +1620,15 @@ async def POST_Value(request):
 
     if points is not None:
         # validate content of points input array
-        for i in range(len(points)):
-            point = points[i]
-            if rank == 1:
-                if point < 0 or point >= dims[0]:
-                    msg = f"POST Value point: {point} is not within the bounds "
-                    msg += "of the dataset"
-                    log.warn(msg)
-                    raise HTTPBadRequest(reason=msg)
-            else:
-                if len(point) != rank:
-                    msg = "POST Value point value did not match dataset rank"
-                    log.warn(msg)
-                    raise HTTPBadRequest(reason=msg)
-                for i in range(rank):
-                    if point[i] < 0 or point[i] >= dims[i]:
-                        msg = f"POST Value point: {point} is not within the "
-                        msg += "bounds of the dataset"
-                        log.warn(msg)
-                        raise HTTPBadRequest(reason=msg)
+        _checkPoints(points, dims, method="POST")
 
     # write response
+    encoding = getAcceptEncoding(request)
+    log.debug(f"response content encoding: {encoding}")
     resp = StreamResponse()
     try:
-        if config.get("http_compression"):
-            log.debug("enabling http_compression")
-            resp.enable_compression()
-        if response_type == "binary":
-            resp.headers["Content-Type"] = "application/octet-stream"
-            if content_length is None:
-                log.debug("content_length could not be determined")
-            else:
-                resp.content_length = content_length
-        else:
-            resp.headers["Content-Type"] = "application/json"
-        log.debug("prepare request...")
-        await resp.prepare(request)
+        kwargs = {"encoding": encoding, "content_length": content_length}
+        _prepareValueResponse(resp, response_type, **kwargs)
 
         kwargs = {"bucket": bucket}
         if points is None:
@@ -1448,7 +1650,12 @@ async def POST_Value(request):
             output_data = arrayToBytes(arr_rsp)
             msg = f"POST Value - returning {len(output_data)} bytes binary data"
             log.debug(msg)
-            await resp.write(output_data)
+            await _writeResponseData(request, resp, output_data, encoding=encoding)
+        elif response_type == "arrow":
+            output_data = arrayToArrowStream(arr_rsp)
+            msg = f"POST Value - returning {len(output_data)} bytes arrow data"
+            log.debug(msg)
+            await _writeResponseData(request, resp, output_data, encoding=encoding)
         else:
             log.debug("POST Value - returning JSON data")
             resp_json = {}
@@ -1466,7 +1673,7 @@ async def POST_Value(request):
             )
             log.debug(f"jsonResponse returned: {len(resp_body)} items")
             resp_body = resp_body.encode("utf-8")
-            await resp.write(resp_body)
+            await _writeResponseData(request, resp, resp_body, encoding=encoding)
     except Exception as e:
         log.error(f"{type(e)} Exception during response write")
         import traceback
@@ -1475,7 +1682,272 @@ async def POST_Value(request):
         print("traceback:", tb)
 
     # finalize response
+    if not resp.prepared:
+        await resp.prepare(request)
+    await resp.write_eof()
+
+    log.response(request, resp=resp)
+    return resp
+
+
+async def _getBulkItems(request, body, bucket=None):
+    """Return list of (item, dset_json) for the items in a multi-dataset
+    value request body"""
+    app = request.app
+    if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+        msg = "Expected list of items in request body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    items = body["items"]
+    if not items:
+        msg = "No items in request body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    max_items = int(config.get("bulk_value_max_items", default=1000))
+    if max_items and len(items) > max_items:
+        msg = f"Too many items in request: {len(items)}, max is: {max_items}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    dset_ids = []
+    for item in items:
+        dset_id = item.get("id") if isinstance(item, dict) else None
+        if not dset_id or not isValidUuid(dset_id, "Dataset"):
+            msg = f"Invalid dataset id: {dset_id}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        if dset_id in dset_ids:
+            msg = f"Dataset {dset_id} appears more than once in request"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        dset_ids.append(dset_id)
+
+    # get state for the datasets from the DNs
+    tasks = [getDsetJson(app, dset_id, bucket=bucket) for dset_id in dset_ids]
+    dset_jsons = await gatherLimited(app, tasks)
+
+    for dset_json in dset_jsons:
+        if isNullSpace(dset_json):
+            msg = f"Value request not supported for dataset {dset_json['id']} "
+            msg += "with NULL shape"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+
+    return list(zip(items, dset_jsons))
+
+
+async def POST_Values(request):
+    """
+    Handler for POST /datasets/value request - hyperslab reads from
+    multiple datasets.  The request body is a JSON object with an "items"
+    key listing the dataset "id" and optional "select" and "fields" for each
+    read.  The response is a sequence of binary frames in the order of the
+    request items, each giving the item index, status, and nbytes followed by
+    the selection data (see packChunkFrameHeader).
+    """
+    log.request(request)
+
+    app = request.app
+    # stop reading data if the client goes away
+    cancelOnDisconnect(request, deadline=getRequestDeadline(request))
+
+    domain = getDomainFromRequest(request)
+    if not isValidDomain(domain):
+        msg = f"Invalid domain: {domain}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    bucket = getBucketForDomain(domain)
+
+    username, pswd = getUserPasswordFromRequest(request)
+    if username is None and app["allow_noauth"]:
+        username = "default"
+    else:
+        await validateUserPassword(app, username, pswd)
+
+    if getAcceptType(request) != "binary":
+        msg = "POST datasets value requires Accept: application/octet-stream"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    if not request.has_body or getContentType(request) != "json":
+        msg = "POST datasets value expects a JSON body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    try:
+        body = await request.json()
+    except JSONDecodeError:
+        msg = "Unable to load JSON body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    bulk_items = await _getBulkItems(request, body, bucket=bucket)
+    log.info(f"POST_Values, {len(bulk_items)} datasets")
+
+    # one ACL check covers all the datasets since they are in the same domain
+    dset_ids = [dset_json["id"] for _, dset_json in bulk_items]
+    await validateAction(app, domain, dset_ids, username, "read")
+
+    read_items = []
+    request_size = 0
+    for item, dset_json in bulk_items:
+        dset_dtype = createDataType(dset_json["type"])
+        slices = _getSelect({}, dset_json, body=item)
+        select_dtype = _getSelectDtype({}, dset_dtype, body=item)
+        item_size = getDtypeItemSize(select_dtype)
+        if item_size == "H5T_VARIABLE":
+            item_size = VARIABLE_AVG_ITEM_SIZE  # random guess of avg item_size
+        request_size += math.prod(getSelectionShape(slices)) * item_size
+        kwargs = {"dset_json": dset_json, "slices": slices, "select_dtype": select_dtype}
+        read_items.append(kwargs)
+    log.debug(f"request_size: {request_size}")
+    max_request_size = int(config.get("max_request_size"))
+    if request_size >= max_request_size:
+        msg = "POST datasets value request too large"
+        log.warn(msg)
+        raise HTTPRequestEntityTooLarge(max_request_size, request_size)
+
+    # read all the selections with one crawl
+    results = await getMultiSelectionData(app, read_items, bucket=bucket)
+
+    frames = []
+    content_length = 0
+    for index, (status, arr) in enumerate(results):
+        data = arrayToBytes(arr) if arr is not None else b""
+        frames.append(packChunkFrameHeader(index, status, len(data)))
+        frames.append(data)
+        content_length += CHUNK_FRAME_HEADER.size + len(data)
+
+    resp = StreamResponse()
+    _prepareValueResponse(resp, "binary", content_length=content_length)
+    await resp.prepare(request)
+    for data in frames:
+        if data:
+            await resp.write(data)
     await resp.write_eof()
 
     log.response(request, resp=resp)
     return resp
+
+
+async def PUT_Values(request):
+    """
+    Handler for PUT /datasets/value request - hyperslab writes to
+    multiple datasets.  The request body is a sequence of binary frames
+    (see packChunkFrameHeader).  The first frame holds a JSON object with an
+    "items" key listing the dataset "id" and optional "select" and "fields"
+    for each write.  It is followed by a frame for each item, using the item
+    index, with the data to be written.  Returns the status of each write.
+    """
+    log.request(request)
+
+    app = request.app
+
+    if not request.has_body:
+        msg = "PUT datasets value with no body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    domain = getDomainFromRequest(request)
+    if not isValidDomain(domain):
+        msg = f"Invalid domain: {domain}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    bucket = getBucketForDomain(domain)
+
+    # authenticate and authorize action
+    username, pswd = getUserPasswordFromRequest(request)
+    await validateUserPassword(app, username, pswd)
+
+    if getContentType(request) != "binary":
+        msg = "PUT datasets value expects Content-Type: application/octet-stream"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    max_request_size = int(config.get("max_request_size"))
+    if isinstance(request.content_length, int):
+        if request.content_length >= max_request_size:
+            msg = f"Request size {request.content_length} too large, max: {max_request_size}"
+            log.warn(msg)
+            raise HTTPRequestEntityTooLarge(max_request_size, request.content_length)
+
+    data = await request_read(request)
+    content_encoding = getContentEncoding(request)
+    if content_encoding:
+        data = await decodeContent(data, content_encoding)
+
+    try:
+        frames = list(unpackChunkFrames(data))
+    except ValueError as ve:
+        msg = f"Unable to read request frames: {ve}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if not frames:
+        msg = "PUT datasets value with no frames in body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    try:
+        body = json.loads(bytes(frames[0][2]))
+    except (JSONDecodeError, UnicodeDecodeError):
+        msg = "Unable to load JSON from first frame of request"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    bulk_items = await _getBulkItems(request, body, bucket=bucket)
+    log.info(f"PUT_Values, {len(bulk_items)} datasets")
+
+    # map of item index to the data to be written
+    item_data = {}
+    for index, _, buffer in frames[1:]:
+        if index >= len(bulk_items) or index in item_data:
+            msg = f"Unexpected data frame for item: {index}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        item_data[index] = buffer
+    if len(item_data) != len(bulk_items):
+        msg = f"Expected data frames for {len(bulk_items)} items but got {len(item_data)}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    # one ACL check covers all the datasets since they are in the same domain
+    dset_ids = [dset_json["id"] for _, dset_json in bulk_items]
+    await validateAction(app, domain, dset_ids, username, "update")
+
+    write_items = []
+    for index, (item, dset_json) in enumerate(bulk_items):
+        dset_dtype = createDataType(dset_json["type"])
+        slices = _getSelect({}, dset_json, body=item)
+        select_dtype = _getSelectDtype({}, dset_dtype, body=item)
+        np_shape = getSelectionShape(slices)
+        buffer = item_data[index]
+        item_size = getDtypeItemSize(select_dtype)
+        if item_size != "H5T_VARIABLE":
+            num_bytes = math.prod(np_shape) * item_size
+            if len(buffer) != num_bytes:
+                msg = f"Expected {num_bytes} bytes for item {index}, but got {len(buffer)}"
+                log.warn(msg)
+                raise HTTPBadRequest(reason=msg)
+        try:
+            arr = bytesToArray(bytes(buffer), select_dtype, np_shape)
+        except ValueError as ve:
+            msg = f"bytesToArray value error for item {index}: {ve}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        kwargs = {"dset_json": dset_json, "slices": slices, "arr": arr}
+        write_items.append(kwargs)
+
+    # write all the selections with one crawl
+    try:
+        results = await writeMultiSelectionData(app, write_items, bucket=bucket)
+    finally:
+        # any cached responses for the datasets are now out of date
+        for dset_id in dset_ids:
+            invalidateValueCache(app, dset_id)
+
+    rsp_items = []
+    for dset_id, status in zip(dset_ids, results):
+        rsp_items.append({"id": dset_id, "status": status})
+    resp_json = {"items": rsp_items}
+    resp = await jsonResponse(request, resp_json)
+    log.response(request, resp=resp)
+    return resp
@@ -14,16 +14,20 @@
 #
 
 import asyncio
+import os
+import os.path as pp
 import traceback
+from functools import partial
 from aiohttp.web import run_app
 
 from . import config
 from .util.lruCache import LruCache
+from .util.diskCache import DiskCache, removeStaleCacheDirs
 from .util.idUtil import isValidUuid, isSchema2Id, getCollectionForId
 from .util.idUtil import isRootObjId
 from .util.httpUtil import isUnixDomainUrl, bindToSocket, getPortFromUrl
 from .util.httpUtil import jsonResponse, release_http_client
-from .util.storUtil import setBloscThreads, getBloscThreads
+from .util.storUtil import setBloscThreads, getBloscThreads, releaseCodecExecutor
 from .util.timeUtil import getNow
 from .basenode import healthCheck, baseInit
 from . import hsds_logger as log
@@ -36,8 +40,8 @@ from .attr_dn import PUT_Attributes, DELETE_Attributes
 from .ctype_dn import GET_Datatype, POST_Datatype, DELETE_Datatype
 from .dset_dn import GET_Dataset, POST_Dataset, DELETE_Dataset
 from .dset_dn import PUT_DatasetShape
-from .chunk_dn import PUT_Chunk, GET_Chunk, POST_Chunk, DELETE_Chunk
-from .datanode_lib import s3syncCheck
+from .chunk_dn import PUT_Chunk, GET_Chunk, POST_Chunk, POST_Chunks, DELETE_Chunk
+from .datanode_lib import s3syncCheck, chunk_prefetch_evict
 from .async_lib import scanRoot, removeKeys
 from aiohttp.web_exceptions import HTTPNotFound, HTTPInternalServerError
 from aiohttp.web_exceptions import HTTPForbidden, HTTPBadRequest
@@ -84,6 +88,7 @@ async def init():
     app.router.add_route("PUT", "/chunks/{id}", PUT_Chunk)
     app.router.add_route("GET", "/chunks/{id}", GET_Chunk)
     app.router.add_route("POST", "/chunks/{id}", POST_Chunk)
+    app.router.add_route("POST", "/chunks", POST_Chunks)
     app.router.add_route("DELETE", "/chunks/{id}", DELETE_Chunk)
     app.router.add_route("POST", "/roots/{id}", POST_Root)
     app.router.add_route("DELETE", "/prestop", preStop)
@@ -296,8 +301,24 @@ def create_app():
         "mem_target": chunk_mem_cache_size,
         "name": "ChunkCache",
         "expire_time": chunk_mem_cache_expire,
+        "compressed_target": int(config.get("chunk_mem_cache_compressed_size", default=0)),
+        "compressor": config.get("chunk_mem_cache_compressor", default="lz4"),
+        "inline_threshold": int(config.get("codec_inline_threshold", default=65536)),
+        "evict_callback": partial(chunk_prefetch_evict, app),
     }
     app["chunk_cache"] = LruCache(**kwargs)
+    disk_cache_dir = config.get("disk_cache_dir")
+    if disk_cache_dir:
+        disk_cache_size = int(config.get("disk_cache_size"))
+        disk_cache_expire = int(config.get("disk_cache_expire", default=3600))
+        # remove directories left behind by DN processes that have exited
+        removeStaleCacheDirs(disk_cache_dir, "dn_")
+        # use a sub-directory per process so that DNs can share a volume
+        dirpath = pp.join(disk_cache_dir, f"dn_{os.getpid()}")
+        log.info(f"Using disk cache at: {dirpath} with size: {disk_cache_size}")
+        kwargs = {"size_target": disk_cache_size, "name": "DiskCache"}
+        kwargs["expire_time"] = disk_cache_expire
+        app["disk_cache"] = DiskCache(dirpath, **kwargs)
     app["deleted_ids"] = set()
     app["deleted_attrs"] = {}  # map of objectid to set of deleted attribute names
     app["deleted_links"] = {}  # map of objecctid to set of deleted link names
@@ -366,6 +387,13 @@ async def on_shutdown(app):
     # finally release any http_clients
     await release_http_client(app)
 
+    # and the codec worker pool
+    releaseCodecExecutor(app)
+
+    # remove the disk cache files
+    if "disk_cache" in app:
+        app["disk_cache"].close()
+
     log.info("on_shutdown - done")
 
 
@@ -22,18 +22,22 @@ from aiohttp.web_exceptions import HTTPServiceUnavailable, HTTPBadRequest
 from .util.idUtil import validateInPartition, getS3Key, isValidUuid
 from .util.idUtil import isValidChunkId, getDataNodeUrl, isSchema2Id
 from .util.idUtil import getRootObjId, isRootObjId
+from .util.idUtil import getObjPartition, getNodeNumber, getNodeCount
 from .util.storUtil import getStorJSONObj, putStorJSONObj, putStorBytes
 from .util.storUtil import getStorBytes, isStorObj, deleteStorObj, getHyperChunks
 from .util.storUtil import getBucketFromStorURI, getKeyFromStorURI, getURIFromKey
+from .util.storUtil import getRangeGetGap
 from .util.domainUtil import isValidDomain, getBucketForDomain
 from .util.attrUtil import getRequestCollectionName
 from .util.httpUtil import http_post
 from .util.dsetUtil import getChunkLayout, getFilterOps, getShapeDims
 from .util.dsetUtil import getChunkInitializer, getSliceQueryParam, getFilters
 from .util.chunkUtil import getDatasetId, getChunkSelection, getChunkIndex
+from .util.chunkUtil import getChunkIdForPartition
 from .util.arrayUtil import arrayToBytes, bytesToArray, jsonToArray
 from .util.hdf5dtype import createDataType
-from .util.rangegetUtil import ChunkLocation, chunkMunge, getHyperChunkIndex, getHyperChunkFactors
+from .util.rangegetUtil import ChunkLocation, chunkMunge, getHyperChunkIndices
+from .util.rangegetUtil import getHyperChunkFactors
 from .util.timeUtil import getNow
 from . import config
 from . import hsds_logger as log
@@ -831,13 +835,19 @@ async def get_chunk_bytes(
             "filter_ops": filter_ops,
             "offset": offset,
             "length": length,
-            "bucket": bucket
+            "bucket": bucket,
+            "use_cache": True,
         }
 
         chunk_bytes = await getStorBytes(app, s3key, **kwargs)
         if chunk_bytes is None:
             msg = f"read {chunk_id} bucket: {bucket} returned None"
             raise ValueError(msg)
+        if isinstance(chunk_bytes, memoryview):
+            # memory mapped read of an uncompressed chunk.  Copy the data
+            # out so the chunk cache doesn't hold the mapping (and its
+            # file descriptor) open
+            chunk_bytes = bytearray(chunk_bytes)
         if layout_class == "H5D_CONTIGUOUS_REF":
             if len(chunk_bytes) < chunk_size:
                 # we may get less than expected bytes if this chunk
@@ -896,13 +906,11 @@ async def get_chunk_bytes(
         chunk_arr = np.zeros(chunk_dims, dtype=dtype, order="C")
 
     # create a list of the hyperchunks to be fetched
+    # (ignoring empty range get requests)
+    hyper_indices = getHyperChunkIndices(table_factors).tolist()
     chunk_list = []
-    for i in range(num_chunks):
-        if length[i] == 0:
-            # ignore empty range get requests
-            continue
-        hyper_index = getHyperChunkIndex(i, table_factors)
-        chunk_location = ChunkLocation(hyper_index, offset[i], length[i])
+    for i in np.flatnonzero(length).tolist():
+        chunk_location = ChunkLocation(tuple(hyper_indices[i]), offset[i], length[i])
         chunk_list.append(chunk_location)
 
     if len(chunk_list) == 0:
@@ -911,8 +919,9 @@ async def get_chunk_bytes(
 
     # munge adjacent chunks to reduce the number of storage
     # requests needed
-    max_gap = int(config.get("max_rangeget_gap", default=1024))
-    chunk_list = chunkMunge(chunk_list, max_gap=max_gap)
+    max_gap = getRangeGetGap(app, bucket=bucket)
+    max_size = int(config.get("max_rangeget_size", default=0))
+    chunk_list = chunkMunge(chunk_list, max_gap=max_gap, max_size=max_size)
     log.info(f"get_chunk_bytes - get requests reduced from {num_chunks} to {len(chunk_list)}")
 
     # gather all the individual h5 chunk reads into a list of tasks
@@ -934,6 +943,7 @@ async def get_chunk_bytes(
             "bucket": bucket,
             "chunk_arr": chunk_arr,
             "hyper_dims": hyper_dims,
+            "use_cache": True,
         }
         msg = f"get_chunk_bytes - {len(chunk_locations)} h5 chunks"
         log.debug(msg)
@@ -1045,6 +1055,8 @@ async def get_chunk(
     else:
         s3key = getS3Key(chunk_id)
         log.debug(f"getChunk chunkid: {chunk_id} bucket: {bucket}")
+    # move chunk back from the compressed tier if it's there
+    await chunk_cache.restore(chunk_id)
     if chunk_id in chunk_cache:
         log.debug(f"getChunk chunkid: {chunk_id} found in cache")
         chunk_arr = chunk_cache[chunk_id]
@@ -1154,6 +1166,147 @@ async def get_chunk(
     return chunk_arr
 
 
+def _prefetch_stats_increment(app, counter, inc=1):
+    """Increment the indicated chunk prefetch counter"""
+    if "prefetch_stats" not in app:
+        counters = ("prefetch_count", "prefetch_bytes", "hit_count", "waste_count", "skip_count")
+        app["prefetch_stats"] = dict.fromkeys(counters, 0)
+    app["prefetch_stats"][counter] += inc
+
+
+def chunk_prefetch_evict(app, chunk_id):
+    """Note the removal of the given chunk from the chunk cache.  Used as the
+    chunk cache evict_callback so prefetched chunks that are evicted without
+    being read stop counting against the prefetch memory budget"""
+    if "prefetch_chunks" not in app:
+        return
+    prefetch_chunks = app["prefetch_chunks"]
+    if chunk_id not in prefetch_chunks:
+        return
+    log.debug(f"chunk_prefetch - {chunk_id} was evicted before being read")
+    app["prefetch_mem_used"] -= prefetch_chunks.pop(chunk_id)
+    _prefetch_stats_increment(app, "waste_count")
+
+
+def chunk_prefetch_hit(app, chunk_id):
+    """Note a read of the given chunk.  Returns True if the chunk
+    was prefetched"""
+    if "prefetch_chunks" not in app:
+        return False
+    prefetch_chunks = app["prefetch_chunks"]
+    if chunk_id not in prefetch_chunks:
+        return False
+    app["prefetch_mem_used"] -= prefetch_chunks.pop(chunk_id)
+    _prefetch_stats_increment(app, "hit_count")
+    log.debug(f"chunk_prefetch - hit for {chunk_id}")
+    return True
+
+
+async def _prefetch_chunk(app, chunk_id, dset_json, bucket=None):
+    """Read the given chunk into the chunk cache"""
+    prefetch_pending = app["prefetch_pending"]
+    try:
+        chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket)
+        prefetch_chunks = app["prefetch_chunks"]
+        if chunk_arr is not None and chunk_id in app["chunk_cache"]:
+            if chunk_id not in prefetch_chunks:
+                app["prefetch_mem_used"] += chunk_arr.nbytes
+            prefetch_chunks[chunk_id] = chunk_arr.nbytes
+            _prefetch_stats_increment(app, "prefetch_count")
+            _prefetch_stats_increment(app, "prefetch_bytes", inc=chunk_arr.nbytes)
+    except HTTPNotFound:
+        log.debug(f"chunk_prefetch - {chunk_id} not found")
+    except Exception as e:
+        log.warn(f"chunk_prefetch - got exception {type(e)} reading {chunk_id}: {e}")
+    finally:
+        prefetch_pending.discard(chunk_id)
+
+
+def chunk_prefetch(app, chunk_id, dset_json, bucket=None):
+    """Detect sequential access of chunks along the first dimension of a
+    dataset and start background reads of the next chunks owned by
+    this node"""
+    prefetch_count = int(config.get("chunk_prefetch_count", default=0))
+    if prefetch_count <= 0:
+        return  # prefetch disabled
+    if dset_json["layout"].get("class") not in (None, "H5D_CHUNKED"):
+        return  # chunk locations for reference layouts are provided by the SN
+    if getChunkInitializer(dset_json):
+        return
+    if "prefetch_access" not in app:
+        app["prefetch_access"] = {}  # map of dset_id to last index and run length
+        app["prefetch_chunks"] = {}  # map of prefetched chunk_id to nbytes
+        app["prefetch_mem_used"] = 0  # bytes of prefetched chunks not read yet
+        app["prefetch_pending"] = set()  # chunk ids being prefetched
+
+    dset_id = getDatasetId(chunk_id)
+    chunk_index = getChunkIndex(chunk_id)
+    if not chunk_index:
+        return
+    node_count = getNodeCount(app)
+    node_number = getNodeNumber(app)
+
+    # chunks owned by this node are spread out by the node count,
+    # so treat any forward step that's not too far as sequential
+    prefetch_access = app["prefetch_access"]
+    run_length = 1
+    if dset_id in prefetch_access:
+        last_index, last_run_length = prefetch_access[dset_id]
+        del prefetch_access[dset_id]  # will be re-added as most recent
+        if last_index[1:] == chunk_index[1:]:
+            step = chunk_index[0] - last_index[0]
+            if 0 < step <= 4 * node_count:
+                run_length = last_run_length + 1
+            elif step == 0:
+                run_length = last_run_length
+    prefetch_access[dset_id] = (chunk_index, run_length)
+    max_datasets = int(config.get("chunk_prefetch_max_datasets", default=1000))
+    while len(prefetch_access) > max_datasets:
+        # remove the least recently accessed dataset
+        del prefetch_access[next(iter(prefetch_access))]
+
+    prefetch_trigger = int(config.get("chunk_prefetch_trigger", default=2))
+    if run_length < prefetch_trigger:
+        return
+
+    chunk_cache = app["chunk_cache"]
+    chunk_dims = getChunkLayout(dset_json)
+    shape_dims = getShapeDims(dset_json["shape"])
+    extent = -(-shape_dims[0] // chunk_dims[0])  # number of chunks in first dimension
+    mem_budget = int(config.get("chunk_prefetch_mem_budget", default=64 * 1024 * 1024))
+    mem_used = app["prefetch_mem_used"]
+    chunk_size = np.prod(chunk_dims) * createDataType(dset_json["type"]).itemsize
+
+    suffix = "_".join(map(str, chunk_index[1:]))
+    index = chunk_index[0]
+    count = 0
+    # look ahead far enough to find prefetch_count chunks for this node
+    max_index = min(extent, index + prefetch_count * node_count * 4 + 1)
+    while count < prefetch_count:
+        index += 1
+        if index >= max_index:
+            break
+        next_id = f"c-{dset_id[2:]}_{index}"
+        if suffix:
+            next_id += f"_{suffix}"
+        next_id = getChunkIdForPartition(next_id, dset_json)
+        if getObjPartition(next_id, node_count, nodes=app["dn_urls"]) != node_number:
+            continue  # another node will handle this one
+        count += 1
+        if next_id in chunk_cache or next_id in app["prefetch_pending"]:
+            continue
+        if chunk_cache.isCompressed(next_id):
+            continue  # no storage read needed
+        if mem_used + chunk_size > mem_budget or chunk_cache.memFree < chunk_size:
+            log.debug(f"chunk_prefetch - no room to prefetch {next_id}")
+            _prefetch_stats_increment(app, "skip_count")
+            break
+        log.debug(f"chunk_prefetch - prefetching {next_id}")
+        mem_used += chunk_size
+        app["prefetch_pending"].add(next_id)
+        asyncio.ensure_future(_prefetch_chunk(app, next_id, dset_json, bucket=bucket))
+
+
 def save_chunk(app, chunk_id, dset_json, chunk_arr, bucket=None):
     """Persist the given chunk"""
     log.info(f"save_chunk {chunk_id} bucket={bucket}")
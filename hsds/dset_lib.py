@@ -21,16 +21,16 @@ from .util.boolparser import BooleanParser
 from .util.dsetUtil import isNullSpace, getDatasetLayout, getDatasetLayoutClass, get_slices
 from .util.dsetUtil import getChunkLayout, getSelectionShape, getShapeDims
 from .util.chunkUtil import getChunkCoordinate, getChunkIndex, getChunkSuffix
-from .util.chunkUtil import getNumChunks, getChunkIds, getChunkId
+from .util.chunkUtil import getNumChunks, getChunkIds, getChunkIdsForPoints
 from .util.chunkUtil import getChunkCoverage, getDataCoverage
 from .util.chunkUtil import getQueryDtype, get_chunktable_dims
 from .util.hdf5dtype import createDataType, getItemSize
 from .util.httpUtil import http_delete, http_put
-from .util.idUtil import getDataNodeUrl, isSchema2Id, getS3Key, getObjId
+from .util.idUtil import getDataNodeUrl, isSchema2Id, getS3Key, getObjId, getNodeCount
 from .util.rangegetUtil import getHyperChunkFactors
 from .util.storUtil import getStorKeys
 
-from .servicenode_lib import getDsetJson, doFlush
+from .servicenode_lib import getDsetJson, doFlush, invalidateValueCache
 from .chunk_crawl import ChunkCrawler
 from . import config
 from . import hsds_logger as log
@@ -67,41 +67,50 @@ def getFillValue(dset_json):
     return arr
 
 
-def _get_arr_pts(arr_points, arr_index, pt, dim=0, chunk_index=None, factors=None):
-    """ recursive function which fills arr_points with the coordinates to locate
-        all the hyperchunks for a given chunk.
+def _getFillArray(dset_json, np_shape, dtype):
+    """Return array of the given shape and type initialized to the
+    dataset fill value (or zeros if no fill value is set)"""
+    fill_value = getFillValue(dset_json)
+    if fill_value is not None:
+        arr = np.empty(np_shape, dtype=dtype, order="C")
+        arr[...] = fill_value
+    else:
+        arr = np.zeros(np_shape, dtype=dtype, order="C")
+    return arr
 
-        arr_points: numpy array of shape (num_chunks, rank)
-        arr_index: row of arr_points for the first hyper chunk pt
-        pt: list of [0,] * rank - one element will get set for each recursive call
-        dim: the current dimension - only set in recursion
-        chunk_index: the HSDS chunk index
-        factors: the hyper scaling factors
 
-        on return arr_points rows arr_index[arr_index*N:(arr_index+1)*N-1] will be
-        set to the values needed to do a point selection on the chunk table, where
-        N is the ratio of chunks to hyperchunks - np.prod(factors)
+async def gatherLimited(app, tasks):
+    """Run the given coroutines with at most max_tasks_per_node_per_request
+    per DN in progress, and return their results in order"""
+    max_tasks_per_node = int(config.get("max_tasks_per_node_per_request", default=16))
+    semaphore = asyncio.Semaphore(max(max_tasks_per_node * getNodeCount(app), 1))
+
+    async def run_task(task):
+        async with semaphore:
+            return await task
+
+    return await asyncio.gather(*[run_task(task) for task in tasks])
+
 
+def _get_arr_pts(chunk_indices, factors):
+    """ return the coordinates to locate all the hyperchunks for the given
+        chunks as an array of shape (num_chunks * N, rank), where N is the
+        ratio of chunks to hyperchunks - np.prod(factors).
+
+        chunk_indices: list of HSDS chunk indices
+        factors: the hyper scaling factors
+
+        rows i*N to (i+1)*N-1 of the returned array will be set to the values
+        needed to do a point selection on the chunk table for chunk i
     """
 
-    log.debug(f"get_arr_pts = arr_index: {arr_index}, dim: {dim}, pt: {pt}")
-    log.debug(f"chunk_index: {chunk_index}")
-
-    index = chunk_index[dim]
-    factor = factors[dim]
-    rank = len(chunk_index)
-    for i in range(factor):
-        pt[dim] = (index * factor + i)
-        if dim + 1 == rank:
-            idx = int(arr_index) + i
-            if rank == 1:
-                arr_points[idx] = pt[0]  # need to set 1d arrays with an int index
-            else:
-                arr_points[idx] = pt
-        else:
-            kwargs = {"dim": dim + 1, "chunk_index": chunk_index, "factors": factors}
-            next_index = arr_index + (i * np.prod(factors[(dim + 1):]))
-            _get_arr_pts(arr_points, next_index, pt, **kwargs)
+    factors = np.asarray(factors, dtype=np.dtype("u8"))
+    rank = len(factors)
+    chunk_indices = np.asarray(chunk_indices, dtype=np.dtype("u8")).reshape((-1, rank))
+    # offsets of each hyperchunk within a chunk, in C order
+    offsets = np.indices(factors).reshape((rank, -1)).T.astype(np.dtype("u8"))
+    arr_points = chunk_indices[:, np.newaxis, :] * factors + offsets[np.newaxis, :, :]
+    return arr_points.reshape((-1, rank))
 
 
 async def getChunkLocations(app, dset_id, dset_json, chunkinfo_map, chunk_ids, bucket=None):
@@ -275,24 +284,12 @@ async def getChunkLocations(app, dset_id, dset_json, chunkinfo_map, chunk_ids, b
         log.debug(f"ref_num_chunks: {ref_num_chunks}")
         log.debug(f"hyper_dims: {hyper_dims}")
 
-        arr_points_shape = (ref_num_chunks, rank)
-        arr_points = np.zeros(arr_points_shape, dtype=np.dtype("u8"))
-
+        chunk_indices = [getChunkIndex(chunk_id) for chunk_id in chunk_ids]
         if ref_num_chunks == num_chunks:
-            for i in range(num_chunks):
-                chunk_id = chunk_ids[i]
-                indx = getChunkIndex(chunk_id)
-                arr_points[i] = indx
+            arr_points = np.asarray(chunk_indices, dtype=np.dtype("u8")).reshape((-1, rank))
         else:
             # hyper chunking
-            chunks_per_hyperchunk = np.prod(table_factors)
-            pt = [0,] * rank
-            for i in range(num_chunks):
-                chunk_id = chunk_ids[i]
-                chunk_index = getChunkIndex(chunk_id)
-                arr_index = i * chunks_per_hyperchunk
-                kwargs = {"chunk_index": chunk_index, "factors": table_factors}
-                _get_arr_pts(arr_points, arr_index, pt, **kwargs)
+            arr_points = _get_arr_pts(chunk_indices, table_factors)
 
         msg = f"got chunktable - {len(arr_points)} entries, calling getSelectionData"
         log.debug(msg)
@@ -485,30 +482,10 @@ async def getSelectionData(
         chunk_ids = getChunkIds(dset_id, slices, layout)
     else:
         # points - already checked it is not None
-        num_points = len(points)
-        chunk_ids = []
-        for pt_indx in range(num_points):
-            point = points[pt_indx]
-            chunk_id = getChunkId(dset_id, point, layout)
-            if chunk_id in chunkinfo:
-                chunk_entry = chunkinfo[chunk_id]
-            else:
-                chunk_entry = {}
-                chunkinfo[chunk_id] = chunk_entry
-                chunk_ids.append(chunk_id)
-            if "points" in chunk_entry:
-                point_list = chunk_entry["points"]
-            else:
-                point_list = []
-                chunk_entry["points"] = point_list
-            if "indices" in chunk_entry:
-                point_index = chunk_entry["indices"]
-            else:
-                point_index = []
-                chunk_entry["indices"] = point_index
-
-            point_list.append(point)
-            point_index.append(pt_indx)
+        chunk_points = getChunkIdsForPoints(dset_id, points, layout)
+        chunk_ids = list(chunk_points.keys())
+        for chunk_id, point_index in chunk_points.items():
+            chunkinfo[chunk_id] = {"points": points[point_index], "indices": point_index}
 
     # Get information about where chunks are located
     #   Will be None except for H5D_CHUNKED_REF_INDIRECT type
@@ -540,6 +517,126 @@ async def getSelectionData(
     return arr
 
 
+async def getMultiSelectionData(app, items, bucket=None):
+    """Read hyperslab selections from multiple datasets with one
+    ChunkCrawler.  items is a list of dicts with dset_json, slices, and
+    select_dtype keys (a dataset can only appear once).
+    Returns a list of (status, arr) tuples in the same order as items,
+    where arr is None if the status is not 200."""
+    log.info(f"getMultiSelectionData - {len(items)} datasets")
+    chunk_ids = []
+    chunkinfo = {}
+    dset_map = {}
+    dset_chunk_ids = []  # list of chunk ids for each item
+    for item in items:
+        dset_json = item["dset_json"]
+        dset_id = dset_json["id"]
+        if dset_id in dset_map:
+            msg = f"getMultiSelectionData - {dset_id} appears more than once"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        slices = item["slices"]
+        select_dtype = item.get("select_dtype")
+        if select_dtype is None:
+            select_dtype = createDataType(dset_json["type"])
+        layout = getChunkLayout(dset_json)
+        item_chunk_ids = getChunkIds(dset_id, slices, layout)
+        dset_chunk_ids.append(item_chunk_ids)
+        chunk_ids.extend(item_chunk_ids)
+        np_shape = getSelectionShape(slices)
+        arr = _getFillArray(dset_json, np_shape, select_dtype)
+        kwargs = {"dset_json": dset_json, "arr": arr, "select_dtype": select_dtype}
+        kwargs["slices"] = slices
+        dset_map[dset_id] = kwargs
+
+    # Get information about where chunks are located
+    #   chunk ids include the dataset id, so one map can be used for all the datasets
+    tasks = []
+    for item, item_chunk_ids in zip(items, dset_chunk_ids):
+        dset_json = item["dset_json"]
+        kwargs = {"bucket": bucket}
+        args = (app, dset_json["id"], dset_json, chunkinfo, item_chunk_ids)
+        tasks.append(getChunkLocations(*args, **kwargs))
+    await gatherLimited(app, tasks)
+
+    for item, item_chunk_ids in zip(items, dset_chunk_ids):
+        get_chunk_selections(chunkinfo, item_chunk_ids, item["slices"], item["dset_json"])
+    log.debug(f"chunkinfo_map: {len(chunkinfo)} items")
+
+    crawler = ChunkCrawler(
+        app,
+        chunk_ids,
+        dset_map=dset_map,
+        chunk_map=chunkinfo,
+        bucket=bucket,
+        action="read_chunk_hyperslab",
+    )
+    await crawler.crawl()
+
+    results = []
+    for item, item_chunk_ids in zip(items, dset_chunk_ids):
+        dset_id = item["dset_json"]["id"]
+        status = crawler.get_status(chunk_ids=item_chunk_ids)
+        if status in (200, 201):
+            results.append((200, dset_map[dset_id]["arr"]))
+        else:
+            log.info(f"getMultiSelectionData - got status {status} for {dset_id}")
+            if status != 400:
+                status = 500
+            results.append((status, None))
+    return results
+
+
+async def writeMultiSelectionData(app, items, bucket=None):
+    """Write hyperslab selections to multiple datasets with one
+    ChunkCrawler.  items is a list of dicts with dset_json, slices, and
+    arr keys (a dataset can only appear once).
+    Returns a list of status codes in the same order as items."""
+    log.info(f"writeMultiSelectionData - {len(items)} datasets")
+    chunk_ids = []
+    dset_map = {}
+    dset_chunk_ids = []  # list of chunk ids for each item
+    for item in items:
+        dset_json = item["dset_json"]
+        dset_id = dset_json["id"]
+        if dset_id in dset_map:
+            msg = f"writeMultiSelectionData - {dset_id} appears more than once"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        slices = item["slices"]
+        arr = item["arr"]
+        layout = getChunkLayout(dset_json)
+        item_chunk_ids = getChunkIds(dset_id, slices, layout)
+        dset_chunk_ids.append(item_chunk_ids)
+        chunk_ids.extend(item_chunk_ids)
+        kwargs = {"dset_json": dset_json, "arr": arr, "select_dtype": arr.dtype}
+        kwargs["slices"] = slices
+        dset_map[dset_id] = kwargs
+    log.debug(f"writeMultiSelectionData - {len(chunk_ids)} chunks")
+
+    crawler = ChunkCrawler(
+        app,
+        chunk_ids,
+        dset_map=dset_map,
+        bucket=bucket,
+        action="write_chunk_hyperslab",
+    )
+    await crawler.crawl()
+
+    results = []
+    for item, item_chunk_ids in zip(items, dset_chunk_ids):
+        status = crawler.get_status(chunk_ids=item_chunk_ids)
+        if status in (200, 201):
+            status = 200
+        else:
+            dset_id = item["dset_json"]["id"]
+            log.warn(f"writeMultiSelectionData - got status {status} for {dset_id}")
+            if status != 400:
+                status = 500
+        results.append(status)
+    return results
+
+
 async def doReadSelection(
     app,
     chunk_ids,
@@ -607,13 +704,7 @@ async def doReadSelection(
             raise HTTPBadRequest(reason=msg)
 
         # initialize to fill_value if specified
-        fill_value = getFillValue(dset_json)
-
-        if fill_value is not None:
-            arr = np.empty(np_shape, dtype=select_dtype, order="C")
-            arr[...] = fill_value
-        else:
-            arr = np.zeros(np_shape, dtype=select_dtype, order="C")
+        arr = _getFillArray(dset_json, np_shape, select_dtype)
 
     crawler = ChunkCrawler(
         app,
@@ -809,6 +900,8 @@ async def extendShape(app, dset_json, nelements, axis=0, bucket=None):
     except HTTPConflict:
         log.warn("got 409 extending dataspace for PUT value")
         raise
+    finally:
+        invalidateValueCache(app, dset_id)
     if not selection:
         log.error("expected to get selection in PUT shape response")
         raise HTTPInternalServerError()
@@ -1048,6 +1141,8 @@ async def updateShape(app, dset_json, shape_update, bucket=None):
     except HTTPConflict:
         log.warn("got 409 extending dataspace")
         raise
+    finally:
+        invalidateValueCache(app, dset_id)
 
     log.info(f"got shape put rsp: {put_rsp}")
     if "selection" in put_rsp:
@@ -20,6 +20,7 @@ from aiohttp.web_exceptions import HTTPBadRequest, HTTPNotFound
 
 from .util.httpUtil import getHref, respJsonAssemble
 from .util.httpUtil import jsonResponse, getBooleanParam
+from .util.httpUtil import getObjectETag, isNotModified, notModifiedResponse
 from .util.idUtil import isValidUuid, isSchema2Id
 from .util.dsetUtil import getPreviewQuery, getFilterItem, getShapeDims
 from .util.arrayUtil import getNumElements, getNumpyValue
@@ -351,6 +352,17 @@ async def GET_Dataset(request):
     # check that we have permissions to read the object
     await validateAction(app, domain, dset_id, username, "read")
 
+    etag = None
+    if not getAlias and not verbose:
+        # shape updates don't change lastModified, so include the shape.
+        # (alias and verbose details depend on other objects)
+        last_modified = dset_json.get("lastModified")
+        etag = getObjectETag(request, dset_id, last_modified, domain, dset_json["shape"])
+        if isNotModified(request, etag):
+            resp = notModifiedResponse(etag)
+            log.response(request, resp=resp)
+            return resp
+
     dset_json = respJsonAssemble(dset_json, params, dset_id)
 
     dset_json["domain"] = getPathForDomain(domain)
@@ -411,6 +423,8 @@ async def GET_Dataset(request):
                 dset_json["lastModified"] = dset_detail["lastModified"]
 
     resp = await jsonResponse(request, dset_json)
+    if etag:
+        resp.headers["ETag"] = etag
     log.response(request, resp=resp)
     return resp
 
@@ -17,6 +17,7 @@ from aiohttp.web_exceptions import HTTPBadRequest, HTTPForbidden, HTTPNotFound
 from json import JSONDecodeError
 
 from .util.httpUtil import getHref, jsonResponse, getBooleanParam
+from .util.httpUtil import getObjectETag, isNotModified, notModifiedResponse
 from .util.idUtil import isValidUuid
 from .util.authUtil import getUserPasswordFromRequest, aclCheck
 from .util.authUtil import validateUserPassword
@@ -118,6 +119,16 @@ async def GET_Group(request):
     group_json = await getObjectJson(app, group_id, **kwargs)
     log.debug(f"domain from request: {domain}")
 
+    etag = None
+    if not getAlias:
+        # (alias depends on the links of other groups, so isn't covered
+        # by this group's lastModified)
+        etag = getObjectETag(request, group_id, group_json.get("lastModified"), domain)
+        if isNotModified(request, etag):
+            resp = notModifiedResponse(etag)
+            log.response(request, resp=resp)
+            return resp
+
     group_json["domain"] = getPathForDomain(domain)
     if bucket:
         group_json["bucket"] = bucket
@@ -151,6 +162,8 @@ async def GET_Group(request):
     group_json["hrefs"] = hrefs
 
     resp = await jsonResponse(request, group_json)
+    if etag:
+        resp.headers["ETag"] = etag
     log.response(request, resp=resp)
     return resp
 
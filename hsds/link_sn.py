@@ -18,13 +18,14 @@ from json import JSONDecodeError
 
 from .util.httpUtil import getHref, getBooleanParam
 from .util.httpUtil import jsonResponse
+from .util.httpUtil import getObjectETag, isNotModified, notModifiedResponse
 from .util.globparser import globmatch
 from .util.idUtil import isValidUuid, getDataNodeUrl, getCollectionForId
 from .util.authUtil import getUserPasswordFromRequest, validateUserPassword
 from .util.domainUtil import getDomainFromRequest, isValidDomain, verifyRoot
 from .util.domainUtil import getBucketForDomain
 from .util.linkUtil import validateLinkName, getLinkClass
-from .servicenode_lib import getDomainJson, validateAction
+from .servicenode_lib import getDomainJson, getObjectJson, validateAction
 from .servicenode_lib import getLink, putLink, putLinks, getLinks, deleteLinks
 from .domain_crawl import DomainCrawler
 from . import hsds_logger as log
@@ -92,6 +93,20 @@ async def GET_Links(request):
     else:
         marker = None
 
+    etag = None
+    if not follow_links and request.if_none_match:
+        # get the group's lastModified (updated by the DN on any link change)
+        # before the links, so a concurrent update can't give a newer tag
+        # with older links.  Only done for conditional requests since it
+        # takes an extra DN request
+        kwargs = {"refresh": True, "bucket": bucket}
+        group_json = await getObjectJson(app, group_id, **kwargs)
+        etag = getObjectETag(request, group_id, group_json.get("lastModified"))
+        if isNotModified(request, etag):
+            resp = notModifiedResponse(etag)
+            log.response(request, resp=resp)
+            return resp
+
     if follow_links:
         # Use DomainCrawler to fetch links from multiple objects.
         # set the follow_links and bucket params
@@ -160,6 +175,8 @@ async def GET_Links(request):
     resp_json["hrefs"] = hrefs
 
     resp = await jsonResponse(request, resp_json)
+    if etag:
+        resp.headers["ETag"] = etag
     log.response(request, resp=resp)
     return resp
 
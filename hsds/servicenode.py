@@ -18,6 +18,7 @@ import time
 from aiohttp.web import run_app
 import aiohttp_cors
 from .util.lruCache import LruCache
+from .util.valueCache import ValueCache
 from .util.httpUtil import isUnixDomainUrl, bindToSocket, getPortFromUrl
 from .util.httpUtil import release_http_client, jsonResponse
 
@@ -36,7 +37,7 @@ from .attr_sn import DELETE_Attributes, DELETE_Attribute, GET_AttributeValue, PU
 from .ctype_sn import GET_Datatype, POST_Datatype, DELETE_Datatype
 from .dset_sn import GET_Dataset, POST_Dataset, DELETE_Dataset
 from .dset_sn import GET_DatasetShape, PUT_DatasetShape, GET_DatasetType
-from .chunk_sn import PUT_Value, GET_Value, POST_Value
+from .chunk_sn import PUT_Value, GET_Value, POST_Value, PUT_Values, POST_Values
 
 
 async def init():
@@ -178,6 +179,10 @@ async def init():
     app.router.add_route("GET", path, GET_Value)
     app.router.add_route("POST", path, POST_Value)
 
+    path = "/datasets/value"
+    app.router.add_route("PUT", path, PUT_Values)
+    app.router.add_route("POST", path, POST_Values)
+
     # Add CORS to all routes
     cors_domain = config.get("cors_domain")
     if cors_domain:
@@ -248,6 +253,14 @@ def create_app():
     kwargs["name"] = "DomainCache"
     app["domain_cache"] = LruCache(**kwargs)
 
+    value_cache_size = int(config.get("value_cache_size", default=0))
+    if value_cache_size > 0:
+        log.info(f"Using value response cache size of: {value_cache_size}")
+        kwargs = {"mem_target": value_cache_size, "name": "ValueCache"}
+        kwargs["max_item_size"] = int(config.get("value_cache_max_item_size", default=8388608))
+        kwargs["expire_time"] = int(config.get("value_cache_expire", default=10))
+        app["value_cache"] = ValueCache(**kwargs)
+
     if config.get("allow_noauth"):
         allow_noauth = config.get("allow_noauth")
         if isinstance(allow_noauth, str):
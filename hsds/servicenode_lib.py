@@ -207,6 +207,8 @@ async def validateAction(app, domain, obj_id, username, action):
     """check that the given object belongs in the domain and that the
     requested action (create, read, update, delete, readACL, udpateACL)
     is permitted for the requesting user.
+    obj_id can also be a list of object ids, in which case each object
+    is checked for membership in the domain but the ACL is checked once.
     """
     meta_cache = app["meta_cache"]
     msg = f"validateAction(domain={domain}, obj_id={obj_id}, "
@@ -220,34 +222,40 @@ async def validateAction(app, domain, obj_id, username, action):
     domain_json = await getDomainJson(app, domain)
     verifyRoot(domain_json)
 
-    obj_json = None
-    if obj_id in meta_cache:
-        log.debug(f"validateAction - found {obj_id} in meta_cache")
-        obj_json = meta_cache[obj_id]
+    if isinstance(obj_id, str):
+        obj_ids = [obj_id, ]
     else:
-        # fetch from DN
-        log.debug(f"validateAction - fetch {obj_id}")
-        collection = getCollectionForId(obj_id)
-        req = getDataNodeUrl(app, obj_id)
-        req += "/" + collection + "/" + obj_id
-        bucket = getBucketForDomain(domain)
-        params = {}
-        if bucket:
-            params["bucket"] = bucket
-        obj_json = await http_get(app, req, params=params)
-        meta_cache[obj_id] = obj_json
+        obj_ids = obj_id
 
-    s1 = obj_json["root"]
-    s2 = domain_json["root"]
-    msg = f"obj_json[root]: {s1} domain_json[root]: {s2}"
-    log.debug(msg)
-    if obj_json["root"] != domain_json["root"]:
-        log.info("unexpected root, reloading domain")
-        domain_json = await getDomainJson(app, domain, reload=True)
-        if "root" not in domain_json or s1 != domain_json["root"]:
-            msg = "Object id is not a member of the given domain"
-            log.warn(msg)
-            raise HTTPBadRequest(reason=msg)
+    for obj_id in obj_ids:
+        obj_json = None
+        if obj_id in meta_cache:
+            log.debug(f"validateAction - found {obj_id} in meta_cache")
+            obj_json = meta_cache[obj_id]
+        else:
+            # fetch from DN
+            log.debug(f"validateAction - fetch {obj_id}")
+            collection = getCollectionForId(obj_id)
+            req = getDataNodeUrl(app, obj_id)
+            req += "/" + collection + "/" + obj_id
+            bucket = getBucketForDomain(domain)
+            params = {}
+            if bucket:
+                params["bucket"] = bucket
+            obj_json = await http_get(app, req, params=params)
+            meta_cache[obj_id] = obj_json
+
+        s1 = obj_json["root"]
+        s2 = domain_json["root"]
+        msg = f"obj_json[root]: {s1} domain_json[root]: {s2}"
+        log.debug(msg)
+        if obj_json["root"] != domain_json["root"]:
+            log.info("unexpected root, reloading domain")
+            domain_json = await getDomainJson(app, domain, reload=True)
+            if "root" not in domain_json or s1 != domain_json["root"]:
+                msg = "Object id is not a member of the given domain"
+                log.warn(msg)
+                raise HTTPBadRequest(reason=msg)
 
     acl_keys = getAclKeys()
     if action not in acl_keys:
@@ -1042,6 +1050,15 @@ async def deleteObject(app, obj_id, bucket=None):
     meta_cache = app["meta_cache"]
     if obj_id in meta_cache:
         del meta_cache[obj_id]  # remove from cache
+    if collection == "datasets":
+        invalidateValueCache(app, obj_id)
+
+
+def invalidateValueCache(app, dset_id):
+    """ remove any cached value responses for the given dataset.
+        Should be called after any update to the dataset's values or shape """
+    if "value_cache" in app:
+        app["value_cache"].invalidate(dset_id)
 
 
 async def createObject(app,
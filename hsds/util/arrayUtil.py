@@ -502,6 +502,7 @@ def bytesToArray(data, dt, shape, encoding=None):
         data = decodeData(data)
     if not isVlen(dt):
         # regular numpy from string
+        # (no copy is made for writable buffers such as memory mapped reads)
         arr = np.frombuffer(data, dtype=dt)
     else:
         nelements = getNumElements(shape)
@@ -0,0 +1,124 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# arrowUtil.py
+#
+# Conversion of compound type arrays to Apache Arrow IPC streams
+#
+import numpy as np
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from .. import hsds_logger as log
+from .hdf5dtype import check_dtype
+
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"  # end of stream marker
+
+
+def _getArrowType(dt):
+    """Return the arrow type for the given (non-compound) numpy type or
+    None if there is no equivalent"""
+    if dt.subdtype is not None:
+        # fixed size array of a numeric type
+        base_dt, shape = dt.subdtype
+        if base_dt.kind not in ("b", "i", "u", "f"):
+            return None
+        list_size = int(np.prod(shape))
+        return pyarrow.list_(pyarrow.from_numpy_dtype(base_dt), list_size)
+    if dt.kind in ("b", "i", "u", "f"):
+        return pyarrow.from_numpy_dtype(dt)
+    if dt.kind == "S":
+        return pyarrow.binary()
+    if dt.kind == "U":
+        return pyarrow.string()
+    if dt.kind == "O":
+        vlen = check_dtype(vlen=dt)
+        if vlen == str:
+            return pyarrow.string()
+        if vlen == bytes:
+            return pyarrow.binary()
+    return None
+
+
+def isArrowType(dt):
+    """Return True if arrays of the given type can be returned as
+    Arrow record batches.  Requires pyarrow and a compound type whose
+    fields are numeric, strings, or fixed size numeric arrays."""
+    if pyarrow is None:
+        log.debug("pyarrow not available")
+        return False
+    if dt.names is None:
+        return False
+    for name in dt.names:
+        if _getArrowType(dt.fields[name][0]) is None:
+            log.debug(f"no arrow equivalent for field {name}: {dt.fields[name][0]}")
+            return False
+    return True
+
+
+def getArrowSchema(dt):
+    """Return the arrow schema for the given compound type"""
+    fields = []
+    for name in dt.names:
+        fields.append(pyarrow.field(name, _getArrowType(dt.fields[name][0])))
+    return pyarrow.schema(fields)
+
+
+def _getArrowColumn(arr, name, arrow_type):
+    """Return the given field of arr as an arrow array"""
+    col = arr[name]
+    if isinstance(arrow_type, pyarrow.FixedSizeListType):
+        values = np.ascontiguousarray(col).reshape(-1)
+        return pyarrow.FixedSizeListArray.from_arrays(values, arrow_type.list_size)
+    if col.dtype.kind == "O":
+        values = col.tolist()
+        if pyarrow.types.is_string(arrow_type):
+            # vlen strings may be returned as bytes
+            values = [x.decode("utf-8") if isinstance(x, bytes) else x for x in values]
+        return pyarrow.array(values, type=arrow_type)
+    return pyarrow.array(np.ascontiguousarray(col), type=arrow_type)
+
+
+def getArrowSchemaBytes(dt, schema=None):
+    """Return the schema message that starts an Arrow IPC stream for
+    arrays of the given type"""
+    if schema is None:
+        schema = getArrowSchema(dt)
+    return schema.serialize().to_pybytes()
+
+
+def arrayToArrowBatch(arr, schema=None):
+    """Return the rows of the given compound type array as an Arrow IPC
+    record batch message.  Multi-dimensional arrays are flattened in
+    C order."""
+    if schema is None:
+        schema = getArrowSchema(arr.dtype)
+    arr = arr.reshape(-1)
+    columns = []
+    for arrow_field in schema:
+        columns.append(_getArrowColumn(arr, arrow_field.name, arrow_field.type))
+    batch = pyarrow.RecordBatch.from_arrays(columns, schema=schema)
+    return batch.serialize().to_pybytes()
+
+
+def arrayToArrowStream(arr):
+    """Return the given compound type array as a complete Arrow IPC stream
+    with one record batch"""
+    schema = getArrowSchema(arr.dtype)
+    stream = [schema.serialize().to_pybytes(), ]
+    stream.append(arrayToArrowBatch(arr, schema=schema))
+    stream.append(ARROW_EOS)
+    return b"".join(stream)
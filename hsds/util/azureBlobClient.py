@@ -1,7 +1,10 @@
+import asyncio
 from inspect import iscoroutinefunction
 from asyncio import CancelledError
+import base64
 import datetime
 import time
+from azure.storage.blob import BlobBlock
 from azure.storage.blob.aio import BlobServiceClient
 from azure.core.exceptions import AzureError
 from .. import hsds_logger as log
@@ -154,22 +157,57 @@ class AzureBlobClient:
 
         return data
 
-    async def put_object(self, key, data, bucket=None):
+    async def _put_blocks(self, blob_client, data, block_size):
+        """Upload data as staged blocks with concurrent requests, then
+        commit the block list.  Returns the commit response"""
+        max_concurrency = int(config.get("multipart_upload_concurrency", default=4))
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+        async def stage_block(block_index, start):
+            # block ids need to be the same length for all blocks in the blob
+            block_id = base64.b64encode(f"{block_index:08d}".encode("ascii")).decode("ascii")
+            body = bytes(data[start:start + block_size])
+            async with semaphore:
+                await blob_client.stage_block(block_id, body)
+            return BlobBlock(block_id=block_id)
+
+        tasks = []
+        for i, start in enumerate(range(0, len(data), block_size)):
+            tasks.append(stage_block(i, start))
+        log.debug(f"azureBlobClient.put_object - staging {len(tasks)} blocks")
+        block_list = await asyncio.gather(*tasks)
+        blob_rsp = await blob_client.commit_block_list(block_list)
+        return blob_rsp
+
+    async def put_object(self, key, data, bucket=None, multipart=None):
         """Write data to given key.
+        If multipart is True, or multipart is None and the data is larger
+        than multipart_upload_threshold, upload with staged blocks.
         Returns client specific dict on success
         """
         if not bucket:
             log.error("put_object - bucket not set")
             raise HTTPInternalServerError()
 
+        if multipart is None:
+            threshold = int(config.get("multipart_upload_threshold", default=0))
+            multipart = threshold > 0 and len(data) > threshold
+        if multipart:
+            block_size = int(config.get("multipart_upload_part_size", default=8 * 1024 * 1024))
+            if len(data) <= block_size:
+                multipart = False  # just one block, so do a regular upload
+
         start_time = time.time()
         msg = f"azureBlobClient.put_object({bucket}/{key} start: {start_time}"
         log.debug(msg)
         try:
             kwargs = {"container": bucket, "blob": key}
             async with self._client.get_blob_client(**kwargs) as blob_client:
-                kwargs = {"blob_type": "BlockBlob", "overwrite": True}
-                blob_rsp = await blob_client.upload_blob(data, **kwargs)
+                if multipart:
+                    blob_rsp = await self._put_blocks(blob_client, data, block_size)
+                else:
+                    kwargs = {"blob_type": "BlockBlob", "overwrite": True}
+                    blob_rsp = await blob_client.upload_blob(data, **kwargs)
 
             finish_time = time.time()
             ETag = blob_rsp["etag"]
@@ -1,3 +1,4 @@
+import struct
 import numpy as np
 from .. import hsds_logger as log
 from .arrayUtil import ndarray_compare
@@ -7,6 +8,7 @@ CHUNK_MIN = 512 * 1024  # Soft lower limit (512k)
 CHUNK_MAX = 2048 * 1024  # Hard upper limit (2M)
 DEFAULT_TYPE_SIZE = 128  # Type size case when it is variable
 PRIMES = [29, 31, 37, 41, 43, 47, 53, 59, 61, 67]  # for chunk partitioning
+CHUNK_FRAME_HEADER = struct.Struct("<IIQ")  # index, status, and byte count of a chunk frame
 
 
 def getChunkSize(layout, type_size):
@@ -336,6 +338,36 @@ def getChunkId(dset_id, point, layout):
     return chunk_id
 
 
+def getChunkIdsForPoints(dset_id, points, layout):
+    """Return a dict of chunk id to the array of indices of the points
+    that fall within that chunk.  points is an array of shape (num_points,)
+    for 1d datasets or (num_points, rank) otherwise.  Chunk ids are in
+    chunk index order and indices are in increasing order for each chunk.
+    """
+    rank = len(layout)
+    num_points = len(points)
+    if num_points == 0:
+        return {}
+    coords = np.asarray(points).reshape((num_points, rank)).astype(np.uint64, copy=False)
+    chunk_coords = coords // np.asarray(layout, dtype=np.uint64)
+
+    # sort the points by chunk coordinate (lexsort is stable and uses the
+    # last key as the primary key)
+    order = np.lexsort(chunk_coords.T[::-1])
+    sorted_coords = chunk_coords[order]
+    is_new_chunk = np.any(sorted_coords[1:] != sorted_coords[:-1], axis=1)
+    boundaries = np.flatnonzero(is_new_chunk) + 1
+    starts = [0, ] + boundaries.tolist()
+
+    prefix = "c-" + dset_id[2:] + "_"
+    chunk_points = {}
+    for start, indices in zip(starts, np.split(order, boundaries)):
+        chunk_index = sorted_coords[start].tolist()
+        chunk_id = prefix + "_".join(map(str, chunk_index))
+        chunk_points[chunk_id] = indices
+    return chunk_points
+
+
 def getDatasetId(chunk_id):
     """Get dataset id given a chunk id"""
     n = chunk_id.find("-") + 1
@@ -859,6 +891,25 @@ def chunkWriteSelection(chunk_arr=None, slices=None, data=None):
     return updated
 
 
+def _getChunkRelativeIndex(points, chunk_coord, dims):
+    """
+    Return a tuple of index arrays for the given points (in dataset
+    coordinates) that can be used to index the chunk array.
+    Raises IndexError if any of the points are not in the chunk.
+    """
+    rank = len(dims)
+    num_points = len(points)
+    coords = np.asarray(points).reshape((num_points, rank)).astype(np.int64)
+    coords -= np.asarray(chunk_coord, dtype=np.int64)
+    invalid = np.any((coords < 0) | (coords >= np.asarray(dims)), axis=1)
+    if np.any(invalid):
+        i = int(np.flatnonzero(invalid)[0])
+        msg = f"point {points[i]} is not within the chunk"
+        log.warn(msg)
+        raise IndexError(msg)
+    return tuple(coords.T)
+
+
 def chunkReadPoints(chunk_id=None,
                     chunk_layout=None,
                     chunk_arr=None,
@@ -904,24 +955,18 @@ def chunkReadPoints(chunk_id=None,
 
     log.debug(f"got {num_points} points")
 
-    output_arr = np.zeros((num_points,), dtype=select_dt)
-
     chunk_coord = getChunkCoordinate(chunk_id, chunk_layout)
-
-    for i in range(num_points):
-        # TBD: there's likely a better way to do this that
-        # doesn't require iterating through each point...
-        point = point_arr[i, :]
-        tr_point = getChunkRelativePoint(chunk_coord, point)
-        val = chunk_arr[tuple(tr_point)]
-        if len(select_dt) < len(dset_dtype):
-            # just update the relevant fields
-            subfield_val = []
-            for (x, field) in zip(val, dset_dtype.names):
-                if field in select_dt.names:
-                    subfield_val.append(x)
-            val = tuple(subfield_val)
-        output_arr[i] = val
+    index = _getChunkRelativeIndex(point_arr, chunk_coord, dims)
+
+    # gather all the points with one fancy indexing operation
+    values = chunk_arr[index]
+    if len(select_dt) < len(dset_dtype):
+        # just return the relevant fields
+        output_arr = np.zeros((num_points,), dtype=select_dt)
+        for field in select_dt.names:
+            output_arr[field] = values[field]
+    else:
+        output_arr = values
     return output_arr
 
 
@@ -974,41 +1019,17 @@ def chunkWritePoints(chunk_id=None,
             msg = "unexpected dtype for point array"
             raise ValueError(msg)
 
-    num_points = len(point_arr)
-
     chunk_coord = getChunkCoordinate(chunk_id, chunk_layout)
-
-    for i in range(num_points):
-        elem = point_arr[i]
-        log.debug(f"non-relative coordinate: {elem}")
-        if rank == 1:
-            coord = int(elem[0])
-            coord = coord - chunk_coord[0]  # adjust to chunk relative
-            if coord < 0 or coord >= dims[0]:
-                msg = f"chunkWritePoints - invalid index: {int(elem[0])}"
-                log.warn(msg)
-                raise IndexError(msg)
-        else:
-            coord = elem[0]  # index to update
-            for dim in range(rank):
-                # adjust to chunk relative
-                coord[dim] = int(coord[dim]) - chunk_coord[dim]
-            coord = tuple(coord)  # need to convert to a tuple
-        log.debug(f"relative coordinate: {coord}")
-
-        val = elem[1]  # value
-        if len(select_dt) < len(dset_dtype):
-            # get the element from the chunk
-            chunk_val = list(chunk_arr[coord])
-            # and just update the relevant fields
-            index = 0
-            for (x, field) in zip(val, dset_dtype.names):
-                if field in select_dt.names:
-                    chunk_val[index] = x
-                index += 1
-            val = tuple(chunk_val)  # this will get written back
-
-        chunk_arr[coord] = val  # update the point
+    index = _getChunkRelativeIndex(point_arr[comp_dtype.names[0]], chunk_coord, dims)
+
+    # scatter all the values with one fancy indexing operation
+    values = point_arr[comp_dtype.names[1]]
+    if len(select_dt) < len(dset_dtype):
+        # just update the relevant fields
+        for field in select_dt.names:
+            chunk_arr[field][index] = values[field]
+    else:
+        chunk_arr[index] = values
 
 
 def _getWhereFieldName(query):
@@ -1429,3 +1450,26 @@ def chunkQuery(
     log.debug(f"chunkQuery returning {len(rsp_arr)} rows")
 
     return rsp_arr
+
+
+def packChunkFrameHeader(index, status, nbytes):
+    """Return the header for a chunk frame in a batch response.  The header is
+    followed by nbytes of chunk data"""
+    return CHUNK_FRAME_HEADER.pack(index, status, nbytes)
+
+
+def unpackChunkFrames(data):
+    """Iterate over the frames in a batch response, yielding tuples of
+    (index, status, data) for each frame"""
+    view = memoryview(data)
+    header_size = CHUNK_FRAME_HEADER.size
+    offset = 0
+    while offset < len(view):
+        if offset + header_size > len(view):
+            raise ValueError("unpackChunkFrames - truncated frame header")
+        index, status, nbytes = CHUNK_FRAME_HEADER.unpack_from(view, offset)
+        offset += header_size
+        if offset + nbytes > len(view):
+            raise ValueError("unpackChunkFrames - truncated frame data")
+        yield index, status, view[offset:(offset + nbytes)]
+        offset += nbytes
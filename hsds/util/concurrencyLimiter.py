@@ -0,0 +1,154 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# concurrencyLimiter.py
+#
+# AIMD limit on the number of inflight requests to a node
+#
+import asyncio
+import time
+from collections import deque
+
+from .. import hsds_logger as log
+
+SHORT_LATENCY_WEIGHT = 0.2  # weight of new samples for the short term latency average
+LONG_LATENCY_WEIGHT = 0.02  # weight of new samples for the long term latency average
+
+
+class ConcurrencyLimiter(object):
+    """Limit the number of concurrent requests to a node using additive
+    increase/multiplicative decrease.  The limit is increased by about one
+    for each round of successful requests and cut by the backoff factor when
+    a request returns 503 (callers report timeouts as 503) or the short term
+    latency average rises above latency_threshold times the long term average.
+    """
+
+    def __init__(
+        self,
+        name="ConcurrencyLimiter",
+        initial_limit=16,
+        min_limit=1,
+        max_limit=64,
+        backoff=0.5,
+        latency_threshold=2.0,
+    ):
+        self._name = name
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._backoff = backoff
+        self._latency_threshold = latency_threshold
+        self._inflight = 0
+        self._waiters = deque()
+        self._latency_short = None
+        self._latency_long = None
+        self._last_decrease = 0.0
+        self._request_count = 0
+        self._overload_count = 0
+        self._decrease_count = 0
+
+    def _wake(self):
+        # hand out free slots to waiting tasks
+        while self._waiters and self._inflight < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._inflight += 1
+                fut.set_result(None)
+
+    def _increase(self):
+        self._limit = min(self._limit + 1.0 / self._limit, float(self._max_limit))
+
+    def _decrease(self):
+        # requests that were sent before the last decrease will see the same
+        # overload, so only back off once per average request time
+        now = time.time()
+        interval = self._latency_short if self._latency_short else 0.0
+        if now - self._last_decrease < interval:
+            return
+        limit = max(self._limit * self._backoff, float(self._min_limit))
+        if limit < self._limit:
+            msg = f"{self._name} - reducing limit from {self.limit} to {int(limit)}"
+            log.info(msg)
+            self._decrease_count += 1
+        self._limit = limit
+        self._last_decrease = now
+
+    async def acquire(self):
+        """Wait until a request can be sent"""
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            return
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+            elif fut.done() and not fut.cancelled():
+                # got a slot but won't be using it
+                self._inflight -= 1
+                self._wake()
+            raise
+
+    def release(self, status_code=200, elapsed=None):
+        """Update the limit based on the outcome of a request.
+        elapsed is the request time in seconds, or None if it shouldn't be
+        used for latency tracking (e.g. batched requests)"""
+        self._inflight -= 1
+        self._request_count += 1
+        if status_code == 503:
+            self._overload_count += 1
+            self._decrease()
+        elif status_code in (200, 201):
+            congested = False
+            if elapsed is not None:
+                if self._latency_short is None:
+                    self._latency_short = elapsed
+                    self._latency_long = elapsed
+                else:
+                    self._latency_short += (elapsed - self._latency_short) * SHORT_LATENCY_WEIGHT
+                    self._latency_long += (elapsed - self._latency_long) * LONG_LATENCY_WEIGHT
+                    if self._latency_short > self._latency_long * self._latency_threshold:
+                        congested = True
+            if congested:
+                self._decrease()
+            else:
+                self._increase()
+        self._wake()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def getStats(self):
+        """Return dict of current state for the info request"""
+        stats = {}
+        stats["limit"] = self.limit
+        stats["inflight"] = self._inflight
+        stats["waiting"] = len(self._waiters)
+        stats["request_count"] = self._request_count
+        stats["overload_count"] = self._overload_count
+        stats["decrease_count"] = self._decrease_count
+        if self._latency_short is not None:
+            stats["latency_short"] = round(self._latency_short, 4)
+            stats["latency_long"] = round(self._latency_long, 4)
+        return stats
@@ -0,0 +1,282 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# diskCache.py
+#
+# LRU cache of raw storage bytes kept on local disk
+#
+import asyncio
+import hashlib
+import os
+import os.path as pp
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # no file locking on Windows
+
+from .. import hsds_logger as log
+
+TMP_SUFFIX = ".tmp"
+LOCK_FILE = ".lock"
+MAX_INVALIDATE_HISTORY = 10000
+
+
+def _readFile(filepath):
+    with open(filepath, "rb") as f:
+        return f.read()
+
+
+def _writeFile(filepath, data):
+    dirpath = pp.dirname(filepath)
+    if not pp.isdir(dirpath):
+        os.makedirs(dirpath, exist_ok=True)
+    tmp_filepath = f"{filepath}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+    with open(tmp_filepath, "wb") as f:
+        f.write(data)
+    os.replace(tmp_filepath, filepath)
+
+
+def _removeFile(filepath):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+
+def removeStaleCacheDirs(parent_dir, prefix):
+    """Remove sub-directories of parent_dir starting with prefix that aren't
+    locked by a running DiskCache (i.e. left over from a previous process)"""
+    if fcntl is None:
+        log.info("removeStaleCacheDirs - file locking not supported")
+        return
+    if not pp.isdir(parent_dir):
+        return
+    for name in os.listdir(parent_dir):
+        dirpath = pp.join(parent_dir, name)
+        if not name.startswith(prefix) or not pp.isdir(dirpath):
+            continue
+        lock_path = pp.join(dirpath, LOCK_FILE)
+        if pp.isfile(lock_path):
+            with open(lock_path, "a") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    log.debug(f"removeStaleCacheDirs - {dirpath} is in use")
+                    continue
+        log.info(f"removeStaleCacheDirs - removing {dirpath}")
+        shutil.rmtree(dirpath, ignore_errors=True)
+
+
+class DiskCache(object):
+    """LRU cache of storage byte ranges kept as files in a local directory.
+    Items are keyed by (bucket, key, offset, length).  All items for a
+    storage object can be removed with invalidate.  Items older than
+    expire_time seconds are not returned, since the object may have been
+    updated by another DN.  The directory is locked while the cache is in
+    use, see removeStaleCacheDirs.
+    """
+
+    def __init__(
+        self,
+        dirpath,
+        size_target=1024 * 1024 * 1024,
+        expire_time=None,
+        name="DiskCache",
+    ):
+        self._dirpath = dirpath
+        self._size_target = size_target
+        self._expire_time = expire_time
+        self._name = name
+        self._size = 0
+        self._items = OrderedDict()  # map of item key to (file size, time), in LRU order
+        self._obj_items = {}  # map of (bucket, key) to set of item keys
+        # generation counter for invalidations.  Used to avoid adding
+        # data to the cache that was read before the object was updated
+        self._generation = 0
+        self._invalidated = OrderedDict()  # map of (bucket, key) to generation
+        self._pruned_generation = 0
+        self._hit_count = 0
+        self._miss_count = 0
+        self._evict_count = 0
+        self._expire_count = 0
+        self._invalidate_count = 0
+
+        # anything left over from a previous run may be stale
+        if pp.isdir(dirpath):
+            log.info(f"{self._name} - removing existing files in {dirpath}")
+            shutil.rmtree(dirpath, ignore_errors=True)
+        os.makedirs(dirpath, exist_ok=True)
+        self._lock_file = open(pp.join(dirpath, LOCK_FILE), "w")
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _getFilePath(self, item_key):
+        digest = hashlib.sha1(repr(item_key).encode("utf8")).hexdigest()
+        return pp.join(self._dirpath, digest[:2], digest)
+
+    def _removeItem(self, item_key):
+        nbytes, _ = self._items.pop(item_key)
+        self._size -= nbytes
+        obj_key = item_key[:2]
+        obj_items = self._obj_items[obj_key]
+        obj_items.discard(item_key)
+        if not obj_items:
+            del self._obj_items[obj_key]
+        _removeFile(self._getFilePath(item_key))
+
+    def _reduceCache(self):
+        # remove least recently used items till we are under the target size
+        while self._size > self._size_target and self._items:
+            item_key = next(iter(self._items))
+            log.debug(f"{self._name} - evicting {item_key}")
+            self._removeItem(item_key)
+            self._evict_count += 1
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item_key):
+        return item_key in self._items
+
+    @property
+    def generation(self):
+        """Invalidation counter - pass to put to avoid caching stale data"""
+        return self._generation
+
+    async def get(self, bucket, key, offset=0, length=-1):
+        """Return the cached bytes for the given range or None if not found"""
+        item_key = (bucket, key, offset, length)
+        if item_key not in self._items:
+            self._miss_count += 1
+            return None
+        _, put_time = self._items[item_key]
+        if self._expire_time and time.time() - put_time > self._expire_time:
+            log.debug(f"{self._name} - {item_key} expired")
+            self._removeItem(item_key)
+            self._expire_count += 1
+            self._miss_count += 1
+            return None
+        self._items.move_to_end(item_key)
+        filepath = self._getFilePath(item_key)
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, _readFile, filepath)
+        except OSError as oe:
+            # evicted or invalidated while we were reading
+            log.debug(f"{self._name} - unable to read {filepath}: {oe}")
+            self._miss_count += 1
+            return None
+        self._hit_count += 1
+        return data
+
+    async def put(self, bucket, key, data, offset=0, length=-1, generation=None):
+        """Add the given bytes to the cache.  If generation is set, the data
+        won't be cached if the object has been invalidated since then"""
+        obj_key = (bucket, key)
+        if generation is not None:
+            if obj_key in self._invalidated:
+                if self._invalidated[obj_key] > generation:
+                    log.debug(f"{self._name} - {obj_key} was updated, not caching")
+                    return
+            elif self._pruned_generation > generation:
+                # invalidate history has been trimmed, can't tell if it was updated
+                return
+        nbytes = len(data)
+        if nbytes > self._size_target:
+            return
+        item_key = (bucket, key, offset, length)
+        filepath = self._getFilePath(item_key)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, _writeFile, filepath, data)
+        except OSError as oe:
+            log.warn(f"{self._name} - unable to write {filepath}: {oe}")
+            return
+        if generation is not None and self._invalidated.get(obj_key, 0) > generation:
+            # invalidated while we were writing the file
+            if item_key not in self._items:
+                _removeFile(filepath)
+            return
+        if item_key in self._items:
+            self._size -= self._items[item_key][0]
+        self._items[item_key] = (nbytes, time.time())
+        self._items.move_to_end(item_key)
+        self._size += nbytes
+        if obj_key not in self._obj_items:
+            self._obj_items[obj_key] = set()
+        self._obj_items[obj_key].add(item_key)
+        self._reduceCache()
+
+    def invalidate(self, bucket, key):
+        """Remove any cached ranges for the given storage object"""
+        obj_key = (bucket, key)
+        self._generation += 1
+        self._invalidated[obj_key] = self._generation
+        self._invalidated.move_to_end(obj_key)
+        while len(self._invalidated) > MAX_INVALIDATE_HISTORY:
+            _, generation = self._invalidated.popitem(last=False)
+            self._pruned_generation = generation
+        if obj_key not in self._obj_items:
+            return
+        log.debug(f"{self._name} - invalidating {obj_key}")
+        for item_key in list(self._obj_items[obj_key]):
+            self._removeItem(item_key)
+            self._invalidate_count += 1
+
+    def clearCache(self):
+        for item_key in list(self._items):
+            self._removeItem(item_key)
+
+    def close(self):
+        """Remove all cached items and the cache directory"""
+        self._items.clear()
+        self._obj_items.clear()
+        self._size = 0
+        shutil.rmtree(self._dirpath, ignore_errors=True)
+        self._lock_file.close()
+
+    @property
+    def cacheUtilizationPercent(self):
+        return int((self._size / self._size_target) * 100.0)
+
+    @property
+    def sizeUsed(self):
+        return self._size
+
+    @property
+    def sizeTarget(self):
+        return self._size_target
+
+    @property
+    def hitCount(self):
+        return self._hit_count
+
+    @property
+    def missCount(self):
+        return self._miss_count
+
+    @property
+    def evictCount(self):
+        return self._evict_count
+
+    @property
+    def expireCount(self):
+        return self._expire_count
+
+    @property
+    def invalidateCount(self):
+        return self._invalidate_count
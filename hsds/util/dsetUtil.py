@@ -14,6 +14,7 @@ from aiohttp.web_exceptions import HTTPBadRequest, HTTPInternalServerError
 import math
 
 from .. import hsds_logger as log
+from .. import config
 
 """
 Filters that are known to HSDS.
@@ -128,6 +129,11 @@ def getCompressionFilter(filters):
         filter_class = filter["class"]
         if filter_class in COMPRESSION_FILTER_IDS:
             return filter
+        if filter_class == "H5Z_FILTER_USER" and "name" not in filter and "id" in filter:
+            # registered filter identified just by id, e.g. 32015 for zstd
+            filter_item = getFilterItem(filter["id"])
+            if filter_item and filter_item["name"] in COMPRESSION_FILTER_NAMES:
+                return filter
         if all(
             (
                 filter_class == "H5Z_FILTER_USER",
@@ -191,14 +197,21 @@ def getFilterOps(app, dset_id, filters, dtype=None, chunk_shape=None):
         if compressionFilter["class"] == "H5Z_FILTER_DEFLATE":
             filter_ops["compressor"] = "zlib"  # blosc compressor
         else:
+            filter_item = None
+            if "name" not in compressionFilter and "id" in compressionFilter:
+                filter_item = getFilterItem(compressionFilter["id"])
             if "name" in compressionFilter:
                 filter_ops["compressor"] = compressionFilter["name"]
+            elif filter_item:
+                filter_ops["compressor"] = filter_item["name"]
             else:
                 filter_ops["compressor"] = "lz4"  # default to lz4
-        if "level" not in compressionFilter:
-            filter_ops["level"] = 5  # medium level
-        else:
+        if "level" in compressionFilter:
             filter_ops["level"] = int(compressionFilter["level"])
+        elif filter_ops["compressor"] == "zstd":
+            filter_ops["level"] = int(config.get("zstd_level", default=3))
+        else:
+            filter_ops["level"] = 5  # medium level
 
     if filter_ops:
         # save the chunk shape and dtype
@@ -1,8 +1,11 @@
 import asyncio
 import hashlib
-from os import mkdir, rmdir, listdir, stat, remove, walk
+import mmap
+import uuid
+from os import mkdir, rmdir, listdir, stat, remove, walk, fstat, replace
 import os.path as pp
 from asyncio import CancelledError
+from functools import partial
 from inspect import iscoroutinefunction
 import time
 import aiofiles
@@ -11,6 +14,33 @@ from aiohttp.web_exceptions import HTTPBadRequest
 from .. import hsds_logger as log
 from .. import config
 
+# suffix for partially written files, renamed to the final key once complete
+TMP_SUFFIX = ".hsdstmp"
+
+
+def mmapRead(filepath, offset=0, length=-1):
+    """Return a memoryview for the given byte range of filepath.
+    The file is mapped copy-on-write, so the returned buffer is writable
+    without affecting the file, and no data is copied until pages are
+    accessed."""
+    with open(filepath, "rb") as f:
+        file_size = fstat(f.fileno()).st_size
+        if offset >= file_size:
+            return b""
+        if length > 0:
+            end = min(offset + length, file_size)
+        else:
+            end = file_size
+        # mmap offset needs to be a multiple of the allocation granularity
+        map_offset = offset - (offset % mmap.ALLOCATIONGRANULARITY)
+        kwargs = {"length": end - map_offset, "offset": map_offset, "access": mmap.ACCESS_COPY}
+        mm = mmap.mmap(f.fileno(), **kwargs)
+    if hasattr(mm, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        # start reading pages in now
+        mm.madvise(mmap.MADV_WILLNEED)
+    start = offset - map_offset
+    return memoryview(mm)[start:end - map_offset]
+
 
 class FileClient:
     """
@@ -31,6 +61,7 @@ class FileClient:
             log.error("FileClient init: root dir most have absolute path")
             raise HTTPInternalServerError()
         self._root_dir = pp.normpath(root_dir)
+        self._use_mmap = config.get("posix_mmap_reads", default=False)
 
     def _validateBucket(self, bucket):
         if not bucket:
@@ -142,13 +173,20 @@ class FileClient:
         loop = asyncio.get_event_loop()
 
         try:
-            async with aiofiles.open(filepath, loop=loop, mode="rb") as f:
-                if offset:
-                    await f.seek(offset)
-                if length > 0:
-                    data = await f.read(length)
-                else:
-                    data = await f.read()
+            if self._use_mmap:
+                # return a memoryview of the file rather than a copy.
+                # run in a thread so that any blocking on the file
+                # doesn't hold up the event loop
+                kwargs = {"offset": offset, "length": length}
+                data = await loop.run_in_executor(None, partial(mmapRead, filepath, **kwargs))
+            else:
+                async with aiofiles.open(filepath, loop=loop, mode="rb") as f:
+                    if offset:
+                        await f.seek(offset)
+                    if length > 0:
+                        data = await f.read(length)
+                    else:
+                        data = await f.read()
             finish_time = time.time()
             msg = f"fileClient.get_object({key} bucket={bucket}) "
             msg += f"start={start_time:.4f} finish={finish_time:.4f} "
@@ -175,8 +213,26 @@ class FileClient:
             raise HTTPInternalServerError()
         return data
 
-    async def put_object(self, key, data, bucket=None):
+    async def _replace_file(self, filepath, data):
+        """Write data to a temporary file and rename it to filepath.
+        The temporary file is removed if the write doesn't complete."""
+        loop = asyncio.get_event_loop()
+        tmp_filepath = f"{filepath}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+        log.debug(f"open({tmp_filepath}, 'wb')")
+        try:
+            async with aiofiles.open(tmp_filepath, loop=loop, mode="wb") as f:
+                await f.write(data)
+            replace(tmp_filepath, filepath)
+        except BaseException:
+            # IOError or cancelled, don't leave the partial file behind
+            if pp.isfile(tmp_filepath):
+                log.warn(f"fileClient - removing incomplete file: {tmp_filepath}")
+                remove(tmp_filepath)
+            raise
+
+    async def put_object(self, key, data, bucket=None, multipart=None):
         """Write data to given key.
+        multipart is ignored for posix storage.
         Returns client specific dict on success
         """
         self._validateBucket(bucket)
@@ -211,9 +267,14 @@ class FileClient:
                         mkdir(dirpath)
                     else:
                         log.debug(f"isdir {dirpath} found")
-            log.debug(f"open({filepath}, 'wb')")
-            async with aiofiles.open(filepath, loop=loop, mode="wb") as f:
-                await f.write(data)
+            if self._use_mmap:
+                # write to a temporary file and then rename, so that memory
+                # mapped readers never see a truncated or partial file
+                await self._replace_file(filepath, data)
+            else:
+                log.debug(f"open({filepath}, 'wb')")
+                async with aiofiles.open(filepath, loop=loop, mode="wb") as f:
+                    await f.write(data)
             finish_time = time.time()
             msg = f"fileClient.put_object({key} bucket={bucket}) "
             msg += f"start={start_time:.4f} finish={finish_time:.4f} "
@@ -362,6 +423,8 @@ class FileClient:
                 for filename in filelist:
                     if suffix and not filename.endswith(suffix):
                         continue
+                    if filename.endswith(TMP_SUFFIX):
+                        continue  # write in progress
                     nlen = len(basedir)
                     filepath = pp.join(root[nlen:], filename)
                     files.append(filepath)
@@ -13,23 +13,36 @@
 # httpUtil:
 # http-related helper functions
 #
-from asyncio import CancelledError, TimeoutError
+import asyncio
+from asyncio import CancelledError, TimeoutError, IncompleteReadError
+from functools import partial
+import hashlib
 import os
 import socket
+import time
 import numpy as np
-from aiohttp.web import json_response
+import numcodecs as codecs
+from aiohttp.web import json_response, Response
 import simplejson
 from aiohttp import ClientSession, UnixConnector, TCPConnector
 from aiohttp.web_exceptions import HTTPForbidden, HTTPNotFound, HTTPConflict
 from aiohttp.web_exceptions import HTTPGone, HTTPInternalServerError
 from aiohttp.web_exceptions import HTTPRequestEntityTooLarge
 from aiohttp.web_exceptions import HTTPServiceUnavailable, HTTPBadRequest
-from aiohttp.client_exceptions import ClientError
+from aiohttp.web_exceptions import HTTPUnsupportedMediaType
+from aiohttp.client_exceptions import ClientError, ServerTimeoutError
 from hsds.util.idUtil import isValidUuid
 
 from .. import hsds_logger as log
 from .. import config
 
+# content encodings supported for value requests.  x-hsds-lz4 is an lz4 block
+# with a 4 byte little endian size prefix, not the lz4 frame format
+CONTENT_ENCODINGS = ("zstd", "x-hsds-lz4")
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"  # start of a zstd frame
+AUTO_DECODED_ENCODINGS = ("gzip", "deflate", "br")  # request bodies decoded by aiohttp
+COMPRESSION_PROBE_SIZE = 64 * 1024  # bytes to test compress before compressing large data
+
 
 def isOK(http_response):
     """return True for successful http_status codes"""
@@ -280,9 +293,38 @@ async def request_read(request, count=None) -> bytes:
     return bytes(body)
 
 
-async def http_get(app, url, params=None, client=None):
+async def _read_into(rsp, out):
+    """Read a binary response body directly into the writable buffer out.
+    Returns the number of bytes read"""
+    nbytes = 0
+    async for data in rsp.content.iter_any():
+        if nbytes + len(data) > len(out):
+            msg = f"response for {rsp.url} is larger than expected size: {len(out)}"
+            log.error(msg)
+            raise HTTPInternalServerError()
+        out[nbytes:(nbytes + len(data))] = data
+        nbytes += len(data)
+    return nbytes
+
+
+async def stream_read_into(stream, out):
+    """Read exactly len(out) bytes from the response stream into the
+    writable buffer out.  Raises IncompleteReadError if the stream ends first"""
+    nbytes = 0
+    while nbytes < len(out):
+        data = await stream.read(len(out) - nbytes)
+        if not data:
+            raise IncompleteReadError(bytes(out[:nbytes]), len(out))
+        out[nbytes:(nbytes + len(data))] = data
+        nbytes += len(data)
+    return nbytes
+
+
+async def http_get(app, url, params=None, client=None, out=None):
     """
     Helper function  - async HTTP GET
+    If out is set to a writable memoryview, a binary response is read
+    directly into it and the number of bytes read is returned
     """
     log.info(f"http_get('{url}')")
     if client is None:
@@ -299,7 +341,10 @@ async def http_get(app, url, params=None, client=None):
                 # 200, so read the response
                 if isBinaryResponse(rsp):
                     # return binary data
-                    retval = await rsp.read()  # read response as bytes
+                    if out is not None:
+                        retval = await _read_into(rsp, out)
+                    else:
+                        retval = await rsp.read()  # read response as bytes
                 else:
                     retval = await rsp.json()
             elif status_code == 400:
@@ -321,6 +366,10 @@ async def http_get(app, url, params=None, client=None):
                 log.error(f"request to {url} failed with code: {status_code}")
                 raise HTTPInternalServerError()
 
+    except ServerTimeoutError as ste:
+        # a ClientError, but report timeouts as 503 like other timeouts
+        log.warn(f"ServerTimeoutError for http_get({url}): {ste}")
+        raise HTTPServiceUnavailable()
     except ClientError as ce:
         log.warn(f"ClientError: {ce}")
         raise HTTPInternalServerError()
@@ -337,9 +386,13 @@ async def http_get(app, url, params=None, client=None):
     return retval
 
 
-async def http_post(app, url, data=None, params=None, client=None):
+async def http_post(app, url, data=None, params=None, client=None, out=None, reader=None):
     """
     Helper function  - async HTTP POST
+    If out is set to a writable memoryview, a binary response is read
+    directly into it and the number of bytes read is returned.
+    If reader is set, it is awaited with the response object to read a
+    binary response incrementally, and its return value is returned
     """
     if not url:
         log.error("http_post with no url")
@@ -396,12 +449,22 @@ async def http_post(app, url, data=None, params=None, client=None):
                 raise HTTPInternalServerError()
             if isBinaryResponse(rsp):
                 # return binary data
-                retval = await (rsp.read())
-                log.debug(f"http_post({url}) returning {len(retval)} bytes")
+                if reader is not None:
+                    retval = await reader(rsp)
+                elif out is not None:
+                    retval = await _read_into(rsp, out)
+                    log.debug(f"http_post({url}) read {retval} bytes")
+                else:
+                    retval = await (rsp.read())
+                    log.debug(f"http_post({url}) returning {len(retval)} bytes")
             else:
                 retval = await rsp.json()
                 log.debug(f"http_post({url}) response: {retval}")
 
+    except ServerTimeoutError as ste:
+        # a ClientError, but report timeouts as 503 like other timeouts
+        log.warn(f"ServerTimeoutError for http_post({url}): {ste}")
+        raise HTTPServiceUnavailable()
     except ClientError as ce:
         log.warn(f"ClientError for http_post({url}): {ce} ")
         raise HTTPInternalServerError()
@@ -465,6 +528,10 @@ async def http_put(app, url, data=None, params=None, client=None):
             else:
                 retval = await rsp.json()
                 log.debug(f"http_put({url}) response: {rsp_json}")
+    except ServerTimeoutError as ste:
+        # a ClientError, but report timeouts as 503 like other timeouts
+        log.warn(f"ServerTimeoutError for http_put({url}): {ste}")
+        raise HTTPServiceUnavailable()
     except ClientError as ce:
         log.warn(f"ClientError for http_put({url}): {ce} ")
         raise HTTPInternalServerError()
@@ -516,6 +583,10 @@ async def http_delete(app, url, data=None, params=None, client=None):
 
             # rsp_json = await rsp.json()
             # log.debug(f"http_delete({url}) response: {rsp_json}")
+    except ServerTimeoutError as ste:
+        # a ClientError, but report timeouts as 503 like other timeouts
+        log.warn(f"ServerTimeoutError for http_delete({url}): {ste}")
+        raise HTTPServiceUnavailable()
     except ClientError as ce:
         log.warn(f"ClientError for http_delete({url}): {ce} ")
         raise HTTPInternalServerError()
@@ -558,6 +629,56 @@ async def jsonResponse(resp, data, status=200, ignore_nan=False, body_only=False
         return json_response(text=text, headers=headers, status=status)
 
 
+def getETag(data):
+    """
+    Return a (weak) entity tag for the given response body.  Weak since
+    the same tag is used whatever content encoding is applied.
+    """
+    m = hashlib.new("md5")
+    m.update(data)
+    return f'W/"{m.hexdigest()}"'
+
+
+def getObjectETag(request, obj_id, last_modified, *args):
+    """
+    Return a (weak) entity tag for a metadata response.  Based on the
+    object id and lastModified time (which the DN updates for link and
+    attribute changes), the request query which determines what the
+    response includes, and any other values the response depends on.
+    """
+    items = [obj_id, last_modified, request.rel_url.query_string]
+    items.extend(args)
+    return getETag(repr(items).encode("utf-8"))
+
+
+def isNotModified(request, etag):
+    """
+    Return True if the If-None-Match header of the request matches the
+    given entity tag (using weak comparison)
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    value = etag
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    for item in if_none_match:
+        if item.value == "*" or item.value == value:
+            log.debug(f"If-None-Match matched etag: {etag}")
+            return True
+    return False
+
+
+def notModifiedResponse(etag):
+    """
+    Return a 304 response for a conditional GET that matched etag
+    """
+    resp = Response(status=304)
+    resp.headers["ETag"] = etag
+    return resp
+
+
 def respJsonAssemble(obj_json, params, id):
     """
     Populate response fields based on object type
@@ -673,19 +794,21 @@ def getHref(request, uri, query=None, domain=None):
 
 def getAcceptType(request):
     """
-    Get requested content type.  Returns either "binary" if the accept
-    header is octet stream, otherwise json.
+    Get requested content type.  Returns "binary" if the accept
+    header is octet stream, "arrow" for an Arrow IPC stream, otherwise json.
     Currently does not support q fields.
     """
     accept_type = "json"  # default to JSON
     if "accept" in request.headers:
         accept = request.headers["accept"]
-        # treat everything as json unless octet-stream is given
-        if accept != "application/octet-stream":
+        # treat everything as json unless octet-stream or arrow is given
+        if accept == "application/octet-stream":
+            accept_type = "binary"
+        elif accept == "application/vnd.apache.arrow.stream":
+            accept_type = "arrow"
+        else:
             msg = f"Ignoring accept value: {accept}"
             log.debug(msg)
-        else:
-            accept_type = "binary"
     return accept_type
 
 
@@ -721,6 +844,274 @@ def getContentType(request):
     return request_type
 
 
+def isClientDisconnected(request):
+    """
+    Return True if the client connection for the request has been closed
+    """
+    transport = request.transport
+    if transport is None or transport.is_closing():
+        return True
+    return False
+
+
+def getRequestDeadline(request):
+    """
+    Return the time (in seconds since the epoch) after which the client
+    won't be waiting for a response, based on the X-Request-Timeout header
+    (in seconds).  Returns None if the header is not set
+    """
+    if "X-Request-Timeout" not in request.headers:
+        return None
+    timeout = request.headers["X-Request-Timeout"]
+    try:
+        timeout = float(timeout)
+    except ValueError:
+        timeout = 0
+    if timeout <= 0:
+        msg = f"Invalid X-Request-Timeout header: {request.headers['X-Request-Timeout']}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    return time.time() + timeout
+
+
+async def _watch_request(request, task, deadline=None, interval=0.5):
+    """Cancel task if the client disconnects or the deadline passes"""
+    while not task.done():
+        if isClientDisconnected(request):
+            log.info(f"client disconnected, cancelling {request.method} {request.path}")
+            task.cancel()
+            break
+        if deadline and time.time() > deadline:
+            log.info(f"deadline expired, cancelling {request.method} {request.path}")
+            task.cancel()
+            break
+        await asyncio.sleep(interval)
+
+
+def cancelOnDisconnect(request, deadline=None):
+    """
+    Cancel the current request handler if the client goes away or the
+    given deadline passes, so that any work for the request (e.g.
+    ChunkCrawler tasks, requests to other nodes) gets stopped.
+    """
+    interval = float(config.get("request_cancel_interval", default=0.5))
+    if interval <= 0:
+        return  # disabled
+    task = asyncio.current_task()
+    watcher = asyncio.create_task(_watch_request(request, task, deadline, interval))
+    # keep a reference for the life of the request
+    request["cancel_watcher"] = watcher
+    # stop polling as soon as the handler is done
+    task.add_done_callback(lambda t: watcher.cancel())
+
+
+def _getEnabledEncodings():
+    """
+    Return list of content encodings enabled for responses in order of preference
+    """
+    encodings = config.get("http_content_encodings", default="zstd,x-hsds-lz4")
+    if not encodings:
+        return []
+    if isinstance(encodings, str):
+        encodings = encodings.split(",")
+    encodings = [x.strip().lower() for x in encodings]
+    return [x for x in encodings if x in CONTENT_ENCODINGS]
+
+
+def getAcceptEncoding(request):
+    """
+    Return the content encoding to use for a value response based on the
+    Accept-Encoding header, or None if the response should not be encoded.
+    Encodings with a higher q value are preferred, then the order given
+    by the http_content_encodings config.
+    """
+    if "Accept-Encoding" not in request.headers:
+        return None
+    enabled = _getEnabledEncodings()
+    if not enabled:
+        return None
+    accepted = {}  # map of encoding to q value
+    for item in request.headers["Accept-Encoding"].split(","):
+        fields = item.strip().split(";")
+        encoding = fields[0].strip().lower()
+        q = 1.0
+        for field in fields[1:]:
+            field = field.strip()
+            if field.startswith("q="):
+                try:
+                    q = float(field[2:])
+                except ValueError:
+                    q = 0.0
+        if encoding == "*":
+            for name in enabled:
+                if name not in accepted:
+                    accepted[name] = q
+        else:
+            accepted[encoding] = q
+    best = None
+    best_q = 0.0
+    for encoding in enabled:
+        q = accepted.get(encoding, 0.0)
+        if q > best_q:
+            best = encoding
+            best_q = q
+    return best
+
+
+def getContentEncoding(request):
+    """
+    Return the content encoding of the request body if it needs to be
+    decoded with decodeContent, otherwise None.
+    Raises HTTPUnsupportedMediaType for unknown encodings.
+    """
+    if "Content-Encoding" not in request.headers:
+        return None
+    encoding = request.headers["Content-Encoding"].strip().lower()
+    if not encoding or encoding == "identity" or encoding in AUTO_DECODED_ENCODINGS:
+        return None
+    if encoding not in CONTENT_ENCODINGS:
+        msg = f"Unsupported Content-Encoding: {encoding}"
+        log.warn(msg)
+        raise HTTPUnsupportedMediaType(reason=msg)
+    return encoding
+
+
+def _encodeContent(data, encoding, level=1):
+    """ compress data with the given content encoding """
+    if encoding == "zstd":
+        # standard zstd frame
+        return codecs.Zstd(level=level).encode(data)
+    if encoding == "x-hsds-lz4":
+        # lz4 block with a 4 byte little endian uncompressed size prefix
+        return codecs.LZ4().encode(data)
+    raise ValueError(f"unexpected encoding: {encoding}")
+
+
+def _compressContent(data, encoding, level=1, max_ratio=0.9):
+    """ compress data with the given content encoding, return None if
+    the data doesn't compress to less than max_ratio of its size """
+    nbytes = len(data)
+    if nbytes > 4 * COMPRESSION_PROBE_SIZE:
+        # check that a sample compresses before doing all the data
+        probe = memoryview(data)[:COMPRESSION_PROBE_SIZE]
+        if len(_encodeContent(probe, encoding, level=level)) > max_ratio * len(probe):
+            return None
+    cdata = _encodeContent(data, encoding, level=level)
+    if len(cdata) > max_ratio * nbytes:
+        return None
+    return cdata
+
+
+def _decodeContent(data, encoding):
+    """ uncompress data with the given content encoding """
+    if encoding == "zstd":
+        return codecs.Zstd().decode(data)
+    if encoding == "x-hsds-lz4":
+        return codecs.LZ4().decode(data)
+    raise ValueError(f"unexpected encoding: {encoding}")
+
+
+def getDecodedSize(data, encoding):
+    """ return the uncompressed size of data with the given content encoding
+    as given by the frame header or size prefix, or None if it is not known """
+    if encoding == "x-hsds-lz4":
+        if len(data) < 4:
+            return None
+        return int.from_bytes(data[:4], "little")
+    if encoding != "zstd":
+        return None
+    # see the zstd frame header format in RFC 8878
+    if len(data) < 6 or bytes(data[:4]) != ZSTD_MAGIC:
+        return None
+    descriptor = data[4]
+    fcs_flag = descriptor >> 6
+    single_segment = (descriptor >> 5) & 1
+    dict_id_size = (0, 1, 2, 4)[descriptor & 3]
+    if fcs_flag == 0:
+        fcs_size = 1 if single_segment else 0
+    else:
+        fcs_size = (1, 2, 4, 8)[fcs_flag]
+    if fcs_size == 0:
+        return None  # content size not in header
+    offset = 5 + dict_id_size
+    if not single_segment:
+        offset += 1  # window descriptor
+    if len(data) < offset + fcs_size:
+        return None
+    nbytes = int.from_bytes(data[offset:offset + fcs_size], "little")
+    if fcs_size == 2:
+        nbytes += 256
+    return nbytes
+
+
+async def encodeContent(data, encoding, force=False):
+    """
+    Compress response data with the given content encoding.  Returns None if
+    the data is too small to be worth compressing or doesn't compress well,
+    unless force is set.
+    The compression is run in an executor so the event loop is not blocked.
+    """
+    min_size = int(config.get("http_compression_min_size", default=4096))
+    if len(data) < min_size and not force:
+        log.debug(f"encodeContent - {len(data)} bytes, not compressing")
+        return None
+    level = int(config.get("http_compression_level", default=1))
+    max_ratio = float(config.get("http_compression_max_ratio", default=0.9))
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+    if force:
+        func = partial(_encodeContent, data, encoding, level=level)
+    else:
+        func = partial(_compressContent, data, encoding, level=level, max_ratio=max_ratio)
+    try:
+        cdata = await loop.run_in_executor(None, func)
+    except Exception as e:
+        log.error(f"encodeContent - {encoding} got exception {type(e)}: {e}")
+        if force:
+            raise HTTPInternalServerError()
+        return None
+    elapsed = time.time() - start_time
+    if cdata is None:
+        msg = f"encodeContent - {len(data)} bytes not compressible with {encoding}, "
+        msg += f"{elapsed:.3f}s elapsed"
+        log.debug(msg)
+    else:
+        msg = f"encodeContent - {len(data)} bytes to {len(cdata)} bytes with "
+        msg += f"{encoding}, {elapsed:.3f}s elapsed"
+        log.debug(msg)
+    return cdata
+
+
+async def decodeContent(data, encoding):
+    """
+    Uncompress request data with the given content encoding.
+    Raises HTTPBadRequest if the data can't be decoded or
+    HTTPRequestEntityTooLarge if it is larger than max_request_size.
+    """
+    max_request_size = int(config.get("max_request_size"))
+    # check the size in the header before allocating the output
+    nbytes = getDecodedSize(data, encoding)
+    if nbytes is None:
+        msg = f"Unable to determine decoded size of {encoding} request body"
+        if encoding == "zstd":
+            msg += ", the frame content size is required"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if nbytes >= max_request_size:
+        raise HTTPRequestEntityTooLarge(max_size=max_request_size, actual_size=nbytes)
+    loop = asyncio.get_running_loop()
+    try:
+        udata = await loop.run_in_executor(None, _decodeContent, data, encoding)
+    except Exception as e:
+        msg = f"Unable to decode {encoding} request body: {e}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if len(udata) >= max_request_size:
+        raise HTTPRequestEntityTooLarge(max_size=max_request_size, actual_size=len(udata))
+    log.debug(f"decodeContent - {len(data)} {encoding} bytes to {len(udata)} bytes")
+    return bytes(udata)
+
+
 def isBinaryResponse(rsp):
     """
     Return True if response is binary data
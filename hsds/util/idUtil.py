@@ -17,10 +17,15 @@
 import os.path
 import hashlib
 import uuid
+from functools import lru_cache
 from aiohttp.web_exceptions import HTTPServiceUnavailable
 from .. import hsds_logger as log
+from .. import config
 
 
+PARTITIONERS = ("modulo", "jump", "rendezvous")
+UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+
 S3_URI = "s3://"
 FILE_URI = "file://"
 AZURE_URI = "blob.core.windows.net/"  # preceded with "https://"
@@ -478,11 +483,80 @@ def getUuidFromId(id):
     return id[2:]
 
 
-def getObjPartition(id, count):
-    """Get the id of the dn node that should be handling the given obj id"""
-    hash_code = getIdHash(id)
-    hash_value = int(hash_code, 16)
-    number = hash_value % count
+def _getHash64(key):
+    """Return 64-bit integer hash of the given string"""
+    m = hashlib.new("md5")
+    m.update(key.encode("utf8"))
+    return int(m.hexdigest()[:16], 16)
+
+
+@lru_cache(maxsize=1024)
+def _getNodeHash(node):
+    """Cached hash value for a DN url"""
+    return _getHash64(node)
+
+
+def _mix64(value):
+    """splitmix64 finalizer - scramble the bits of a 64-bit int"""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & UINT64_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & UINT64_MASK
+    return value ^ (value >> 31)
+
+
+def jumpHash(key, count):
+    """Jump consistent hash (Lamping & Veach).  Maps the 64-bit key to a
+    bucket in range(count) such that only 1/count of keys move when
+    a bucket is added"""
+    b = -1
+    j = 0
+    while j < count:
+        b = j
+        key = (key * 2862933555777941757 + 1) & UINT64_MASK
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def rendezvousHash(key, nodes):
+    """Highest random weight hash.  Returns the index of the node in nodes
+    with the highest weight for the 64-bit key.  Only keys owned by a node that
+    is added or removed get moved, independent of the order of nodes"""
+    max_weight = -1
+    number = -1
+    for i in range(len(nodes)):
+        weight = _mix64(key ^ _getNodeHash(nodes[i]))
+        if weight > max_weight:
+            max_weight = weight
+            number = i
+    return number
+
+
+def getObjPartition(id, count, nodes=None, partitioner=None):
+    """Get the id of the dn node that should be handling the given obj id.
+    The dn_partitioner config determines how ids are assigned:
+        modulo: hash of the id modulo the node count
+        jump: jump consistent hash of the id (ids stay on the same node as long
+            as new DNs sort after the existing ones)
+        rendezvous: highest random weight of the id and the DN urls given by nodes
+    """
+    if partitioner is None:
+        partitioner = config.get("dn_partitioner", default="modulo")
+    if partitioner == "jump":
+        number = jumpHash(_getHash64(id), count)
+    elif partitioner == "rendezvous":
+        if nodes is None or len(nodes) != count:
+            msg = "getObjPartition - expected list of nodes for rendezvous partitioning"
+            log.error(msg)
+            raise ValueError(msg)
+        number = rendezvousHash(_getHash64(id), nodes)
+    elif partitioner == "modulo":
+        hash_code = getIdHash(id)
+        hash_value = int(hash_code, 16)
+        number = hash_value % count
+    else:
+        msg = f"getObjPartition - unexpected partitioner: {partitioner}, "
+        msg += f"expected one of: {PARTITIONERS}"
+        log.error(msg)
+        raise ValueError(msg)
     return number
 
 
@@ -515,7 +589,7 @@ def validateInPartition(app, obj_id):
     msg = f"obj_id: {obj_id}, node_count: {node_count}, "
     msg += f"node_number: {node_number}"
     log.debug(msg)
-    partition_number = getObjPartition(obj_id, node_count)
+    partition_number = getObjPartition(obj_id, node_count, nodes=app["dn_urls"])
     if partition_number != node_number:
         # The request shouldn't have come to this node'
         msg = f"wrong node for 'id':{obj_id}, expected node {node_number} "
@@ -534,7 +608,7 @@ def getDataNodeUrl(app, obj_id):
         msg = "Service not ready"
         log.warn(msg)
         raise HTTPServiceUnavailable()
-    dn_number = getObjPartition(obj_id, dn_node_count)
+    dn_number = getObjPartition(obj_id, dn_node_count, nodes=dn_urls)
     url = dn_urls[dn_number]
     log.debug(f"got dn_url: {url} for obj_id: {obj_id}")
     return url
@@ -9,8 +9,11 @@
 # distribution tree.  If you do not have access to this file, you may        #
 # request a copy from help@hdfgroup.org.                                     #
 ##############################################################################
+import asyncio
 import numpy
 import time
+from collections import OrderedDict
+import numcodecs
 
 from .. import hsds_logger as log
 
@@ -37,9 +40,25 @@ class Node(object):
 class LruCache(object):
     """LRU cache for Numpy arrays that are read/written from S3
     If name is "ChunkCache", chunk items are assumed by be ndarrays
+    If compressed_target is set, ndarrays that get evicted are kept in a
+    second tier in compressed form (up to compressed_target bytes) and
+    moved back to the main tier when accessed.  Arrays of at least
+    inline_threshold bytes are compressed in the default executor, use
+    restore to decompress them there as well.
+    If evict_callback is set, it is called with the key of any node
+    that is removed from the main tier.
     """
 
-    def __init__(self, mem_target=32 * 1024 * 1024, name="LruCache", expire_time=None):
+    def __init__(
+        self,
+        mem_target=32 * 1024 * 1024,
+        name="LruCache",
+        expire_time=None,
+        compressed_target=0,
+        compressor="lz4",
+        inline_threshold=65536,
+        evict_callback=None,
+    ):
         self._hash = {}
         self._lru_head = None
         self._lru_tail = None
@@ -49,6 +68,18 @@ class LruCache(object):
         self._expire_time = expire_time
         self._name = name
         self._dirty_set = set()
+        self._hit_count = 0
+        self._miss_count = 0
+        # compressed tier - map of key to (compressed bytes, dtype, shape, last_access)
+        self._compressed = OrderedDict()
+        self._compressed_size = 0
+        self._compressed_target = compressed_target
+        self._compressor = compressor
+        self._inline_threshold = inline_threshold
+        self._evict_callback = evict_callback
+        self._compress_pending = {}  # map of key to future for compression in the executor
+        self._compressed_hit_count = 0
+        self._compressed_add_count = 0
 
     def _delNode(self, key):
         # remove from LRU
@@ -98,6 +129,131 @@ class LruCache(object):
         self._lru_head = node
         return node
 
+    def _compressedAdd(self, node):
+        """save data for an evicted node to the compressed tier"""
+        data = node._data
+        if not isinstance(data, numpy.ndarray) or data.dtype.hasobject:
+            return  # only fixed size types can be compressed
+        if not data.flags["C_CONTIGUOUS"]:
+            data = numpy.ascontiguousarray(data)
+        blosc = numcodecs.Blosc(cname=self._compressor, shuffle=numcodecs.Blosc.SHUFFLE)
+        key = node._id
+        loop = None
+        if node._mem_size >= self._inline_threshold:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass  # no event loop, compress inline
+        if loop is None:
+            try:
+                cdata = blosc.encode(data)
+            except Exception as e:
+                log.warn(f"LRU {self._name} unable to compress node {key}: {e}")
+                return
+            self._compressedSave(key, cdata, data, node._last_access)
+            return
+
+        future = loop.run_in_executor(None, blosc.encode, data)
+        self._compress_pending[key] = future
+
+        def compress_done(future):
+            if self._compress_pending.get(key) is not future:
+                return  # key was updated or deleted while being compressed
+            del self._compress_pending[key]
+            if future.cancelled() or future.exception() is not None:
+                log.warn(f"LRU {self._name} unable to compress node {key}")
+                return
+            self._compressedSave(key, future.result(), data, node._last_access)
+
+        future.add_done_callback(compress_done)
+
+    def _compressedSave(self, key, cdata, data, last_access):
+        """add compressed bytes for key to the compressed tier"""
+        if len(cdata) >= data.nbytes:
+            return  # incompressible, no point in keeping it
+        if len(cdata) > self._compressed_target:
+            return
+        if key in self._hash:
+            return  # key was added back while being compressed
+        self._compressed[key] = (cdata, data.dtype, data.shape, last_access)
+        self._compressed_size += len(cdata)
+        self._compressed_add_count += 1
+        msg = f"LRU {self._name} compressed node: {key} from {data.nbytes} "
+        msg += f"to {len(cdata)} bytes"
+        log.debug(msg)
+        while self._compressed_size > self._compressed_target:
+            # remove least recently used items
+            _, item = self._compressed.popitem(last=False)
+            self._compressed_size -= len(item[0])
+
+    def _compressedRemove(self, key):
+        """remove key from the compressed tier, returning the item if found"""
+        # any compression in progress is now out of date
+        self._compress_pending.pop(key, None)
+        if key not in self._compressed:
+            return None
+        item = self._compressed.pop(key)
+        self._compressed_size -= len(item[0])
+        return item
+
+    def _isCompressedExpired(self, key):
+        """return True if the compressed item for key has expired"""
+        if not self._expire_time:
+            return False
+        last_access = self._compressed[key][3]
+        return time.time() - last_access > self._expire_time
+
+    def _decompress(self, item):
+        """return ndarray for the given compressed tier item"""
+        cdata, dtype, shape, _ = item
+        arr = numpy.empty(shape, dtype=dtype)
+        blosc = numcodecs.Blosc(cname=self._compressor)
+        blosc.decode(cdata, out=arr)
+        return arr
+
+    def _promote(self, key):
+        """move item from the compressed tier back to the main tier.
+        Returns True if the key was found"""
+        if key not in self._compressed:
+            return False
+        if self._isCompressedExpired(key):
+            log.debug(f"LRU {self._name} compressed node {key} expired")
+            self._compressedRemove(key)
+            return False
+        item = self._compressedRemove(key)
+        log.debug(f"LRU {self._name} restoring compressed node: {key}")
+        self._compressed_hit_count += 1
+        self[key] = self._decompress(item)
+        return True
+
+    async def restore(self, key):
+        """move item for key from the compressed tier back to the main tier
+        (if found there), decompressing large items in the default executor"""
+        if key in self._hash or key not in self._compressed:
+            return
+        item = self._compressed[key]
+        if len(item[0]) < self._inline_threshold:
+            self._promote(key)
+            return
+        loop = asyncio.get_running_loop()
+        arr = await loop.run_in_executor(None, self._decompress, item)
+        if self._compressed.get(key) is not item:
+            return  # updated or removed while decompressing
+        if self._isCompressedExpired(key):
+            self._compressedRemove(key)
+            return
+        self._compressedRemove(key)
+        log.debug(f"LRU {self._name} restored compressed node: {key}")
+        self._compressed_hit_count += 1
+        self[key] = arr
+
+    def isCompressed(self, key):
+        """Return True if key is in the compressed tier.  Use restore
+        to move it back to the main tier"""
+        if key not in self._compressed:
+            return False
+        return not self._isCompressedExpired(key)
+
     def _hasKey(self, key, ignore_expire=False):
         """check if key is present node"""
         if key not in self._hash:
@@ -119,11 +275,15 @@ class LruCache(object):
             return True
 
     def __delitem__(self, key):
+        if self._compressedRemove(key) is not None and key not in self._hash:
+            return  # was only in the compressed tier
         node = self._delNode(key)  # remove from LRU
         del self._hash[key]  # remove from hash
         # remove from LRU list
 
         self._mem_size -= node._mem_size
+        if self._evict_callback is not None:
+            self._evict_callback(key)
         if key in self._dirty_set:
             log.warning(f"LRU {self._name} removing dirty node: {key}")
             self._dirty_set.remove(key)
@@ -143,16 +303,22 @@ class LruCache(object):
             node = node._next
 
     def __contains__(self, key):
-        """Test if key is in the cache"""
-        return self._hasKey(key)
+        """Test if key is in the cache.  Keys that are only in the
+        compressed tier are not included, see isCompressed"""
+        found = self._hasKey(key)
+        if not found:
+            self._miss_count += 1
+        return found
 
     def __getitem__(self, key):
         """Return numpy array from cache"""
         # doing a getitem has the side effect of moving this node
         # up in the LRU list
-        if not self._hasKey(key):
+        if not self._hasKey(key) and not self._promote(key):
+            self._miss_count += 1
             raise KeyError(key)
         node = self._moveToFront(key)
+        self._hit_count += 1
         return node._data
 
     def __setitem__(self, key, data):
@@ -169,6 +335,9 @@ class LruCache(object):
         else:
             raise TypeError("Unexpected type for LRUCache")
 
+        # any compressed copy is now out of date
+        self._compressedRemove(key)
+
         if key in self._hash:
             # key is already in the LRU - update mem size, data and
             # move to front
@@ -233,6 +402,8 @@ class LruCache(object):
             if not node._isdirty:
                 log.debug(f"LRU {self._name} removing node: {node._id}")
                 self.__delitem__(node._id)
+                if self._compressed_target > 0:
+                    self._compressedAdd(node)
                 if self._mem_size <= self._mem_target:
                     msg = f"LRU {self._name} mem_size reduced below target"
                     log.debug(msg)
@@ -262,6 +433,9 @@ class LruCache(object):
             self.__delitem__(node._id)
             node = next_node
         self._dirty_size = 0
+        self._compressed.clear()
+        self._compressed_size = 0
+        self._compress_pending.clear()
         # done clearCache
 
     def consistencyCheck(self):
@@ -376,6 +550,34 @@ class LruCache(object):
         s += "\n"
         return s
 
+    @property
+    def hitCount(self):
+        return self._hit_count
+
+    @property
+    def missCount(self):
+        return self._miss_count
+
+    @property
+    def compressedCount(self):
+        return len(self._compressed)
+
+    @property
+    def compressedHitCount(self):
+        return self._compressed_hit_count
+
+    @property
+    def compressedAddCount(self):
+        return self._compressed_add_count
+
+    @property
+    def compressedMemUsed(self):
+        return self._compressed_size
+
+    @property
+    def compressedMemTarget(self):
+        return self._compressed_target
+
     @property
     def cacheUtilizationPercent(self):
         return int((self._mem_size / self._mem_target) * 100.0)
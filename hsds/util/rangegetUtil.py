@@ -52,6 +52,34 @@ def getHyperChunkIndex(i, factors):
     return tuple(index)
 
 
+def getHyperChunkIndices(factors):
+    """ return an array of the indices of all the hyperchunks based on the
+        chunk factors.  Row i will be the same as getHyperChunkIndex(i, factors)
+    """
+    count = int(np.prod(factors))
+    indices = np.unravel_index(np.arange(count), factors)
+    return np.stack(indices, axis=-1)
+
+
+def setHyperChunks(chunk_arr, hyper_dims, indices, hyper_chunks):
+    """ copy the hyperchunks into chunk_arr in one operation.
+        indices is an array of the hyperchunk index for each hyperchunk,
+        hyper_chunks is an array of shape (count, *hyper_dims) """
+
+    rank = len(hyper_dims)
+    factors = [chunk_arr.shape[i] // hyper_dims[i] for i in range(rank)]
+    # view chunk_arr with shape (f0, h0, f1, h1, ...) and then re-order
+    # to (f0, f1, ..., h0, h1, ...) so each hyperchunk is addressed by its index
+    interleaved = []
+    for i in range(rank):
+        interleaved.extend((factors[i], hyper_dims[i]))
+    view = chunk_arr.reshape(interleaved)
+    axes = list(range(0, 2 * rank, 2)) + list(range(1, 2 * rank, 2))
+    view = view.transpose(axes)
+    indices = np.asarray(indices)
+    view[tuple(indices[:, i] for i in range(rank))] = hyper_chunks
+
+
 def _chunk_end(c):
     """ return end of byte range for given chunk or chunk list """
     end = None
@@ -80,10 +108,11 @@ def _chunk_dist(chunk_left, chunk_right):
     return dist
 
 
-def _find_min_pair(h5chunks, max_gap=None):
+def _find_min_pair(h5chunks, max_gap=None, max_size=None):
     """ Given a list of chunk_map entries which are sorted by offset,
         return the indicies of the two chunks nearest to each other in the file.
-        If max_gap is set, chunks must be within max_gap bytes
+        If max_gap is set, chunks must be within max_gap bytes.
+        If max_size is set, the combined byte range must not be larger than max_size.
     """
     num_chunks = len(h5chunks)
 
@@ -97,6 +126,8 @@ def _find_min_pair(h5chunks, max_gap=None):
         c1 = h5chunks[i - 1]
         c2 = h5chunks[i]
         d = _chunk_dist(c1, c2)
+        if max_size and _chunk_end(c2) - _chunk_start(c1) > max_size:
+            continue
         if d == 0:
             # short-circuit search and just return this pair
             return (i - 1, i)
@@ -108,15 +139,17 @@ def _find_min_pair(h5chunks, max_gap=None):
     return min_pair
 
 
-def chunkMunge(h5chunks, max_gap=1024):
+def chunkMunge(h5chunks, max_gap=1024, max_size=None):
     """ given a list of ChunkLocations,
          return list of list of chunk items where
-         items in the list our within max_gap of each other """
+         items in the list our within max_gap of each other.
+         If max_size is set, the byte range covered by each
+         list won't be larger than max_size (unless a single chunk is larger). """
 
     # sort chunk locations by offset
     munged = sorted(h5chunks, key=attrgetter('offset'))
     while True:
-        min_pair = _find_min_pair(munged, max_gap=max_gap)
+        min_pair = _find_min_pair(munged, max_gap=max_gap, max_size=max_size)
         if min_pair is None:
             # no min_pair, so we are done
             break
@@ -157,3 +190,28 @@ def chunkMunge(h5chunks, max_gap=1024):
         munged = mungier
 
     return munged
+
+
+def estimateRangeGetGap(timings, min_samples=10):
+    """ Given a list of (nbytes, elapsed) tuples for recent storage reads,
+        fit elapsed = latency + nbytes / throughput and return the number
+        of bytes that could be read in the time of one request (latency * throughput).
+        Gaps smaller than this are cheaper to read than to issue another request for.
+        Returns None if there isn't enough data for an estimate. """
+
+    if len(timings) < min_samples:
+        return None
+    arr = np.array(timings, dtype=np.float64)
+    nbytes = arr[:, 0]
+    elapsed = arr[:, 1]
+    if np.ptp(nbytes) == 0:
+        # all the same size, can't tell latency from throughput
+        return None
+    slope, latency = np.polyfit(nbytes, elapsed, 1)
+    if slope <= 0:
+        # no measurable per byte cost
+        return None
+    if latency <= 0:
+        return 0
+    # latency is in seconds, slope is seconds per byte
+    return int(latency / slope)
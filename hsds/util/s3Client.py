@@ -29,6 +29,7 @@ from .. import config
 
 S3_URI = "s3://"
 S3_INVALID_ACCESS_CODES = ("AccessDenied", "InvalidAccessKeyId", "401", "403", 401, 403)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # smallest part size allowed for multipart uploads
 
 
 class S3Client:
@@ -276,9 +277,123 @@ class S3Client:
         uri = f"s3://{bucket}/{key}"
         return uri
 
+    async def _get_range(self, _client, bucket, key, offset=0, length=-1):
+        """Do a single get request for the given key and (optional) range.
+        Returns a tuple of the data and the total size of the object"""
+        kwargs = {"Bucket": bucket, "Key": key}
+        if length > 0:
+            kwargs["Range"] = f"bytes={offset}-{offset + length - 1}"
+        resp = await _client.get_object(**kwargs)
+        try:
+            data = await resp["Body"].read()
+        finally:
+            resp["Body"].close()
+        object_size = None
+        content_range = resp.get("ContentRange")
+        if content_range:
+            # e.g. "bytes 0-1023/146515"
+            total = content_range.split("/")[-1]
+            if total.isdigit():
+                object_size = int(total)
+        elif length <= 0:
+            object_size = len(data)
+        return data, object_size
+
+    async def _read_part(self, _client, bucket, key, buffer, offset=0, pos=0, length=0):
+        """Read byte range [offset + pos, offset + pos + length) of the object
+        into buffer[pos:pos + length].  Returns the number of bytes read"""
+        start = offset + pos
+        kwargs = {"Bucket": bucket, "Key": key, "Range": f"bytes={start}-{start + length - 1}"}
+        try:
+            resp = await _client.get_object(**kwargs)
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] == "InvalidRange":
+                # range is past the end of the object
+                return 0
+            raise
+        nbytes = 0
+        try:
+            async for chunk in resp["Body"].iter_chunks():
+                n = min(len(chunk), length - nbytes)
+                buffer[pos + nbytes:pos + nbytes + n] = chunk[:n]
+                nbytes += n
+        finally:
+            resp["Body"].close()
+        return nbytes
+
+    async def _get_parts(self, _client, bucket, key, offset=0, length=-1, split_size=0):
+        """Read the object (or byte range of the object) using concurrent
+        range gets, assembling the parts into one bytearray"""
+        part_count = int(config.get("s3_parallel_get_count", default=4))
+        max_pool_connections = self._aio_config.max_pool_connections
+        if max_pool_connections and part_count > max_pool_connections:
+            # no point in having more requests than connections
+            part_count = max_pool_connections
+        part_count = max(part_count, 1)
+
+        pos = 0
+        if length <= 0:
+            # get the first part - this will tell us the object size
+            try:
+                kwargs = {"offset": offset, "length": split_size}
+                data, object_size = await self._get_range(_client, bucket, key, **kwargs)
+            except ClientError as ce:
+                if ce.response["Error"]["Code"] == "InvalidRange":
+                    # zero length object, or offset beyond the object
+                    return b""
+                raise
+            if object_size is None or offset + len(data) >= object_size:
+                # got everything in one request
+                return data
+            length = object_size - offset
+            buffer = bytearray(length)
+            buffer[:len(data)] = data
+            pos = len(data)
+        else:
+            buffer = bytearray(length)
+
+        part_size = -(-(length - pos) // part_count)  # round up
+        part_starts = []
+        tasks = []
+        while pos < length:
+            n = min(part_size, length - pos)
+            kwargs = {"offset": offset, "pos": pos, "length": n}
+            tasks.append(self._read_part(_client, bucket, key, buffer, **kwargs))
+            part_starts.append((pos, n))
+            pos += n
+        msg = f"s3Client.get_object({bucket}/{key}) - reading {length} bytes "
+        msg += f"with {len(tasks)} range requests"
+        log.debug(msg)
+        results = await asyncio.gather(*tasks)
+
+        # if the object is shorter than the requested range, return
+        # just the bytes that were found
+        for (part_start, part_length), nbytes in zip(part_starts, results):
+            if nbytes < part_length:
+                log.info(f"s3Client.get_object - got {part_start + nbytes} of {length} bytes")
+                del buffer[part_start + nbytes:]
+                break
+        return buffer
+
+    async def _get_data(self, _client, bucket, key, offset=0, length=-1, split_size=0):
+        """Read the object (or byte range of the object), using concurrent
+        range gets for ranges larger than split_size or for whole object
+        reads of chunks (whose size isn't known in advance)"""
+        if length <= 0 and key.endswith(".json"):
+            # metadata objects are small, use a plain get
+            split_size = 0
+        if split_size > 0 and (length <= 0 or length > split_size):
+            kwargs = {"offset": offset, "length": length, "split_size": split_size}
+            data = await self._get_parts(_client, bucket, key, **kwargs)
+        else:
+            kwargs = {"offset": offset, "length": length}
+            data, _ = await self._get_range(_client, bucket, key, **kwargs)
+        return data
+
     async def get_object(self, key, bucket=None, offset=0, length=-1):
         """Return data for object at given key.
         If Range is set, return the given byte range.
+        Large objects or ranges are read with concurrent range gets.
         """
 
         range = ""
@@ -296,16 +411,14 @@ class S3Client:
             range = f"bytes={offset}-{offset + length - 1}"
             log.info(f"storage range request: {range}")
         log.debug(f"s3Client.get_object({bucket}/{key}) range: {range} start: {start_time}")
+        split_size = int(config.get("s3_parallel_get_threshold", default=0))
         session = self._app["session"]
         self._renewToken()
         kwargs = self._get_client_kwargs()
         async with session.create_client("s3", **kwargs) as _client:
             try:
-                kwargs = {"Bucket": bucket, "Key": key}
-                if range:
-                    kwargs["Range"] = range
-                resp = await _client.get_object(**kwargs)
-                data = await resp["Body"].read()
+                kwargs = {"offset": offset, "length": length, "split_size": split_size}
+                data = await self._get_data(_client, bucket, key, **kwargs)
                 finish_time = time.time()
                 if offset > 0:
                     range_key = f"{key}[{offset}:{offset + length}]"
@@ -316,8 +429,6 @@ class S3Client:
                 msg += f"elapsed={finish_time - start_time:.4f} "
                 msg += f"bytes={len(data)}"
                 log.info(msg)
-
-                resp["Body"].close()
             except ClientError as ce:
                 # key does not exist?
                 # check for not found status
@@ -352,8 +463,51 @@ class S3Client:
                 raise HTTPInternalServerError()
         return data
 
-    async def put_object(self, key, data, bucket=None):
+    async def _put_multipart(self, _client, bucket, key, data, part_size):
+        """Upload data as a multipart upload with concurrent part requests.
+        Returns the ETag of the completed object"""
+        max_concurrency = int(config.get("multipart_upload_concurrency", default=4))
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        kwargs = {"Bucket": bucket, "Key": key}
+        rsp = await _client.create_multipart_upload(**kwargs)
+        upload_id = rsp["UploadId"]
+
+        async def upload_part(part_number, start):
+            body = bytes(data[start:start + part_size])
+            kwargs = {"Bucket": bucket, "Key": key, "UploadId": upload_id}
+            kwargs["PartNumber"] = part_number
+            kwargs["Body"] = body
+            async with semaphore:
+                rsp = await _client.upload_part(**kwargs)
+            return {"ETag": rsp["ETag"], "PartNumber": part_number}
+
+        tasks = []
+        for i, start in enumerate(range(0, len(data), part_size)):
+            tasks.append(upload_part(i + 1, start))
+        msg = f"s3Client.put_object({bucket}/{key}) - multipart upload with "
+        msg += f"{len(tasks)} parts, upload_id: {upload_id}"
+        log.debug(msg)
+        try:
+            parts = await asyncio.gather(*tasks)
+            kwargs = {"Bucket": bucket, "Key": key, "UploadId": upload_id}
+            kwargs["MultipartUpload"] = {"Parts": parts}
+            rsp = await _client.complete_multipart_upload(**kwargs)
+        except BaseException:
+            # don't leave the uploaded parts lying around - including when
+            # the request is cancelled
+            log.warn(f"s3Client.put_object({bucket}/{key}) - aborting multipart upload")
+            try:
+                kwargs = {"Bucket": bucket, "Key": key, "UploadId": upload_id}
+                await _client.abort_multipart_upload(**kwargs)
+            except Exception as e:
+                log.warn(f"s3Client - abort_multipart_upload for {key} failed: {e}")
+            raise
+        return rsp["ETag"]
+
+    async def put_object(self, key, data, bucket=None, multipart=None):
         """Write data to given key.
+        If multipart is True, or multipart is None and the data is larger
+        than multipart_upload_threshold, upload with a multipart upload.
         Returns client specific dict on success
         """
         if not bucket:
@@ -364,6 +518,15 @@ class S3Client:
         if bucket.startswith(S3_URI):
             bucket = bucket[len(S3_URI):]
 
+        if multipart is None:
+            threshold = int(config.get("multipart_upload_threshold", default=0))
+            multipart = threshold > 0 and len(data) > threshold
+        if multipart:
+            part_size = int(config.get("multipart_upload_part_size", default=8 * 1024 * 1024))
+            part_size = max(part_size, S3_MIN_PART_SIZE)
+            if len(data) <= part_size:
+                multipart = False  # just one part, so do a regular put
+
         start_time = time.time()
         log.debug(f"s3Client.put_object({bucket}/{key} start: {start_time}")
         session = self._app["session"]
@@ -371,8 +534,12 @@ class S3Client:
         kwargs = self._get_client_kwargs()
         async with session.create_client("s3", **kwargs) as _client:
             try:
-                kwargs = {"Bucket": bucket, "Key": key, "Body": data}
-                rsp = await _client.put_object(**kwargs)
+                if multipart:
+                    etag = await self._put_multipart(_client, bucket, key, data, part_size)
+                else:
+                    kwargs = {"Bucket": bucket, "Key": key, "Body": data}
+                    rsp = await _client.put_object(**kwargs)
+                    etag = rsp["ETag"]
                 finish_time = time.time()
                 msg = f"s3Client.put_object({key} bucket={bucket}) "
                 msg += f"start={start_time:.4f} finish={finish_time:.4f} "
@@ -380,7 +547,7 @@ class S3Client:
                 msg += f"bytes={len(data)}"
                 log.info(msg)
                 s3_rsp = {
-                    "etag": rsp["ETag"],
+                    "etag": etag,
                     "size": len(data),
                     "lastModified": int(finish_time),
                 }
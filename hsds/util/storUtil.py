@@ -14,17 +14,22 @@
 # storage access functions.
 # Abstracts S3 API vs Azure vs Posix storage access
 #
+import asyncio
 import json
 import time
 import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 import numpy as np
 import numcodecs as codecs
 import bitshuffle
 from json import JSONDecodeError
-from aiohttp.web_exceptions import HTTPInternalServerError
+from aiohttp.web_exceptions import HTTPInternalServerError, HTTPException
 
 from .. import hsds_logger as log
 from .s3Client import S3Client
+from .rangegetUtil import estimateRangeGetGap, setHyperChunks
 
 try:
     from .azureBlobClient import AzureBlobClient
@@ -47,6 +52,8 @@ from .. import config
 
 BYTE_SHUFFLE = 1
 BIT_SHUFFLE = 2
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"  # start of a zstd frame
+NATIVE_COMPRESSORS = ("zstd", "lz4")  # compressors that can be used without blosc
 
 
 def getCompressors():
@@ -176,6 +183,64 @@ def _unshuffle(codec, data, dtype=None, chunk_shape=None):
     return arr.tobytes()
 
 
+def _lz4_compress(data, block_size=0):
+    """ lz4 compress using the HDF5 lz4 filter (32004) format:
+        8 byte total size, 4 byte block size, then for each block a 4 byte
+        compressed size followed by the compressed block (all big endian).
+        Blocks that don't compress are stored as is. """
+    nbytes = len(data)
+    if nbytes == 0:
+        # just the header, with no blocks
+        return bytes(12)
+    if not block_size or block_size > nbytes:
+        block_size = nbytes
+    lz4 = codecs.LZ4()
+    buffer = bytearray(nbytes.to_bytes(8, "big"))
+    buffer.extend(block_size.to_bytes(4, "big"))
+    data = memoryview(data).cast("B")
+    for start in range(0, nbytes, block_size):
+        block = data[start:start + block_size]
+        cblock = lz4.encode(block)[4:]  # strip numcodecs size header
+        if len(cblock) >= len(block):
+            cblock = block  # store uncompressed
+        buffer.extend(len(cblock).to_bytes(4, "big"))
+        buffer.extend(cblock)
+    return bytes(buffer)
+
+
+def _lz4_decompress(data):
+    """ decompress data in the HDF5 lz4 filter (32004) format """
+    data = memoryview(data).cast("B")
+    if len(data) < 12:
+        raise ValueError("not enough bytes for lz4 header")
+    nbytes = int.from_bytes(data[:8], "big")
+    block_size = int.from_bytes(data[8:12], "big")
+    if nbytes == 0:
+        return bytearray()
+    if block_size == 0:
+        raise ValueError("invalid lz4 block size")
+    lz4 = codecs.LZ4()
+    buffer = bytearray(nbytes)
+    pos = 12
+    for start in range(0, nbytes, block_size):
+        block_nbytes = min(block_size, nbytes - start)
+        cblock_nbytes = int.from_bytes(data[pos:pos + 4], "big")
+        pos += 4
+        if pos + cblock_nbytes > len(data):
+            raise ValueError("lz4 block extends past end of data")
+        cblock = data[pos:pos + cblock_nbytes]
+        pos += cblock_nbytes
+        if cblock_nbytes == block_nbytes:
+            block = cblock  # stored uncompressed
+        else:
+            # numcodecs expects the uncompressed size as a little endian prefix
+            block = lz4.decode(block_nbytes.to_bytes(4, "little") + cblock)
+            if len(block) != block_nbytes:
+                raise ValueError("unexpected lz4 block size")
+        buffer[start:start + block_nbytes] = block
+    return buffer
+
+
 def _uncompress(data, compressor=None, shuffle=0, level=None, dtype=None, chunk_shape=None):
     """ Uncompress the provided data using compessor and/or shuffle """
     msg = f"_uncompress(compressor={compressor}, shuffle={shuffle})"
@@ -187,9 +252,13 @@ def _uncompress(data, compressor=None, shuffle=0, level=None, dtype=None, chunk_
         if compressor in ("gzip", "deflate"):
             # blosc referes to this as zlib
             compressor = "zlib"
-        # first check if this was compressed with blosc
-        # returns typesize, isshuffle, and memcopied
-        blosc_metainfo = codecs.blosc.cbuffer_metainfo(data)
+        if compressor == "zstd" and bytes(data[:4]) == ZSTD_MAGIC:
+            # zstd frame without blosc, e.g. HDF5 filter 32015
+            blosc_metainfo = (0, )
+        else:
+            # first check if this was compressed with blosc
+            # returns typesize, isshuffle, and memcopied
+            blosc_metainfo = codecs.blosc.cbuffer_metainfo(data)
         if blosc_metainfo[0] > 0:
             log.info(f"blosc compressed data for {len(data)} bytes")
             try:
@@ -215,6 +284,24 @@ def _uncompress(data, compressor=None, shuffle=0, level=None, dtype=None, chunk_
                 log.info(f"zlib_err: {zlib_error}")
                 log.error("unable to uncompress data with zlib")
                 raise HTTPInternalServerError()
+        elif compressor == "zstd":
+            log.info(f"using zstd to decompress {len(data)} bytes")
+            try:
+                udata = codecs.Zstd().decode(data)
+                log.info(f"uncompressed to {len(udata)} bytes")
+                data = udata
+            except Exception as e:
+                log.error(f"unable to uncompress data with zstd: {e}")
+                raise HTTPInternalServerError()
+        elif compressor == "lz4":
+            log.info(f"using lz4 to decompress {len(data)} bytes")
+            try:
+                udata = _lz4_decompress(data)
+                log.info(f"uncompressed to {len(udata)} bytes")
+                data = udata
+            except Exception as e:
+                log.error(f"unable to uncompress data with lz4: {e}")
+                raise HTTPInternalServerError()
         else:
             msg = f"don't know how to decompress data in {compressor} "
             log.error(msg)
@@ -248,7 +335,26 @@ def _compress(data, compressor=None, level=5, shuffle=0, dtype=None, chunk_shape
             log.error(f"got exception using bitshuffle: {e}")
         shuffle = 0  # don't do any blosc shuffling
 
-    if compressor:
+    cdata = None
+    if compressor in NATIVE_COMPRESSORS and config.get("native_codecs", default=False):
+        # compress without blosc, using the same format as the HDF5 filters.
+        # Both formats are read regardless of this setting
+        try:
+            if shuffle == BYTE_SHUFFLE:
+                sdata = _shuffle(shuffle, data, dtype=dtype, chunk_shape=chunk_shape)
+            else:
+                sdata = data
+            if compressor == "zstd":
+                cdata = codecs.Zstd(level=level).encode(sdata)
+            else:
+                block_size = int(config.get("lz4_block_size", default=0))
+                cdata = _lz4_compress(sdata, block_size=block_size)
+            msg = f"compressed from {len(data)} bytes to {len(cdata)} bytes "
+            msg += f"using {compressor} with level: {level}"
+            log.info(msg)
+        except Exception as e:
+            log.error(f"got exception using {compressor} encoding: {e}")
+    elif compressor:
         if compressor in ("gzip", "deflate"):
             # blosc referes to this as zlib
             compressor = "zlib"
@@ -277,6 +383,139 @@ def _compress(data, compressor=None, level=5, shuffle=0, dtype=None, chunk_shape
     return data
 
 
+def _getCodecName(compressor=None, shuffle=0):
+    """ return name used for codec stats """
+    names = []
+    if shuffle == BYTE_SHUFFLE:
+        names.append("shuffle")
+    elif shuffle == BIT_SHUFFLE:
+        names.append("bitshuffle")
+    if compressor:
+        if compressor in ("gzip", "deflate"):
+            compressor = "zlib"
+        names.append(compressor)
+    if not names:
+        return None
+    return "+".join(names)
+
+
+def _codec_stats_increment(app, codec, op, nbytes=0, elapsed=0.0, offloaded=False):
+    """ update codec timing counters """
+    if "codec_stats" not in app:
+        app["codec_stats"] = {}
+    codec_stats = app["codec_stats"]
+    if codec not in codec_stats:
+        stats = {}
+        for name in ("compress", "uncompress"):
+            stats[f"{name}_count"] = 0
+            stats[f"{name}_bytes"] = 0
+            stats[f"{name}_time"] = 0.0
+        stats["executor_count"] = 0
+        codec_stats[codec] = stats
+    stats = codec_stats[codec]
+    stats[f"{op}_count"] += 1
+    stats[f"{op}_bytes"] += nbytes
+    stats[f"{op}_time"] += elapsed
+    if offloaded:
+        stats["executor_count"] += 1
+
+
+def _getCodecExecutor(app):
+    """ return executor to use for compression/decompression
+    or None if codecs should be run inline """
+    if "codec_executor" in app:
+        return app["codec_executor"]
+
+    executor_type = config.get("codec_executor", default="thread")
+    max_workers = int(config.get("codec_max_workers", default=4))
+    if not executor_type or executor_type == "none" or max_workers <= 0:
+        log.info("codec executor not enabled, running codecs inline")
+        executor = None
+    elif executor_type == "thread":
+        log.info(f"creating codec ThreadPoolExecutor with {max_workers} workers")
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    elif executor_type == "process":
+        log.info(f"creating codec ProcessPoolExecutor with {max_workers} workers")
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        log.warn(f"unexpected codec_executor value: {executor_type}, running codecs inline")
+        executor = None
+    app["codec_executor"] = executor
+    return executor
+
+
+async def _runCodec(app, op, data, **filter_ops):
+    """ run compression (op == "compress") or decompression
+    (op == "uncompress") for the given data.
+    Small payloads are processed inline, larger ones are sent to the
+    codec executor so that the event loop is not blocked """
+
+    if op == "compress":
+        func = _compress
+    elif op == "uncompress":
+        func = _uncompress
+    else:
+        log.error(f"_runCodec - unexpected op: {op}")
+        raise HTTPInternalServerError()
+
+    codec = _getCodecName(filter_ops.get("compressor"), filter_ops.get("shuffle", 0))
+    if codec is None:
+        # nothing to do
+        return func(data, **filter_ops)
+
+    inline_threshold = int(config.get("codec_inline_threshold", default=65536))
+    executor = None
+    if len(data) >= inline_threshold:
+        executor = _getCodecExecutor(app)
+
+    start_time = time.time()
+    if executor is None:
+        result = func(data, **filter_ops)
+    else:
+        if "codec_semaphore" not in app:
+            max_queue = int(config.get("codec_max_queue", default=64))
+            app["codec_semaphore"] = asyncio.Semaphore(max(max_queue, 1))
+        codec_semaphore = app["codec_semaphore"]
+        if isinstance(executor, ProcessPoolExecutor) and not isinstance(data, bytes):
+            # memoryviews (e.g. from mmap reads) can't be pickled to the worker process
+            data = bytes(data)
+        loop = asyncio.get_running_loop()
+        async with codec_semaphore:
+            try:
+                result = await loop.run_in_executor(executor, partial(func, data, **filter_ops))
+            except HTTPException:
+                raise
+            except Exception as e:
+                log.error(f"_runCodec - {op} with {codec} got exception {type(e)}: {e}")
+                raise HTTPInternalServerError()
+    elapsed = time.time() - start_time
+    kwargs = {"nbytes": len(data), "elapsed": elapsed, "offloaded": executor is not None}
+    _codec_stats_increment(app, codec, op, **kwargs)
+    return result
+
+
+async def compressBytes(app, data, **filter_ops):
+    """ compress data using the given filter ops """
+    return await _runCodec(app, "compress", data, **filter_ops)
+
+
+async def uncompressBytes(app, data, **filter_ops):
+    """ uncompress data using the given filter ops """
+    return await _runCodec(app, "uncompress", data, **filter_ops)
+
+
+def releaseCodecExecutor(app):
+    """ shutdown the codec executor (if any)
+    (Used for cleanup on application exit)
+    """
+    executor = app.get("codec_executor")
+    if executor is not None:
+        log.debug("releasing codec executor")
+        executor.shutdown(wait=False)
+    if "codec_executor" in app:
+        del app["codec_executor"]
+
+
 def _getStorageDriverName(app, bucket=None):
     """Return name of storage driver that is being used"""
     driver = None
@@ -420,6 +659,9 @@ async def getStorJSONObj(app, key, bucket=None):
     log.info(f"getStorJSONObj({bucket})/{key}")
 
     data = await client.get_object(key, bucket=bucket)
+    if isinstance(data, memoryview):
+        # memory mapped read
+        data = data.tobytes()
 
     try:
         json_dict = json.loads(data.decode("utf8"))
@@ -436,6 +678,108 @@ async def getStorJSONObj(app, key, bucket=None):
     return json_dict
 
 
+def _read_stats_increment(app, counter, inc=1):
+    """Increment the indicated storage read coalescing counter"""
+    if "read_coalesce_stats" not in app:
+        app["read_coalesce_stats"] = {"read_count": 0, "hit_count": 0, "coalesce_count": 0}
+    app["read_coalesce_stats"][counter] += inc
+
+
+async def _getTimedObject(app, client, bucket=None, key=None, offset=0, length=-1):
+    """Read from storage, saving the time taken"""
+    start_time = time.time()
+    data = await client.get_object(bucket=bucket, key=key, offset=offset, length=length)
+    if data:
+        _stor_timing_update(app, bucket, len(data), time.time() - start_time)
+    return data
+
+
+def _stor_timing_update(app, bucket, nbytes, elapsed):
+    """Save the time taken for a storage read"""
+    if "stor_timings" not in app:
+        app["stor_timings"] = {}
+    stor_timings = app["stor_timings"]
+    driver = _getStorageDriverName(app, bucket=bucket)
+    if driver not in stor_timings:
+        sample_count = int(config.get("rangeget_timing_samples", default=100))
+        stor_timings[driver] = deque(maxlen=sample_count)
+    stor_timings[driver].append((nbytes, elapsed))
+
+
+def getRangeGetGap(app, bucket=None):
+    """Return the max gap in bytes between two range gets that should
+    be combined into one request.  If adaptive_rangeget_gap is set, this
+    is based on the latency and throughput of recent storage reads,
+    otherwise it's the max_rangeget_gap config"""
+    max_gap = int(config.get("max_rangeget_gap", default=1024))
+    if not config.get("adaptive_rangeget_gap", default=False):
+        return max_gap
+    if "stor_timings" not in app:
+        return max_gap
+    driver = _getStorageDriverName(app, bucket=bucket)
+    if driver not in app["stor_timings"]:
+        return max_gap
+    timings = list(app["stor_timings"][driver])
+    gap = estimateRangeGetGap(timings)
+    if gap is None:
+        return max_gap  # not enough data yet
+    gap_limit = int(config.get("max_adaptive_rangeget_gap", default=4 * 1024 * 1024))
+    gap = min(gap, gap_limit)
+    log.debug(f"getRangeGetGap - using gap of {gap} bytes for {driver}")
+    return gap
+
+
+async def _getStorObject(app, client, bucket, key, offset=0, length=-1):
+    """Read the given object (or byte range) from storage.
+    Concurrent reads of the same (bucket, key, offset, length) will share
+    one storage request."""
+    kwargs = {"bucket": bucket, "key": key, "offset": offset, "length": length}
+    if not config.get("stor_read_coalesce", default=True):
+        data = await _getTimedObject(app, client, **kwargs)
+        return data
+
+    if "pending_stor_reads" not in app:
+        app["pending_stor_reads"] = {}
+    pending_reads = app["pending_stor_reads"]
+    read_key = (bucket, key, offset, length)
+
+    if read_key in pending_reads:
+        pending_read = pending_reads[read_key]
+        pending_read["hit_count"] += 1
+        _read_stats_increment(app, "hit_count")
+        log.debug(f"getStorBytes - waiting on in-flight read for {bucket}/{key}")
+        # shield so that a cancelled caller doesn't cancel the read for the others
+        data = await asyncio.shield(pending_read["task"])
+        if data is not None and not isinstance(data, bytes):
+            # mutable buffer - give each caller their own copy
+            data = bytearray(data)
+        return data
+
+    _read_stats_increment(app, "read_count")
+    task = asyncio.ensure_future(_getTimedObject(app, client, **kwargs))
+    pending_read = {"task": task, "hit_count": 0}
+    pending_reads[read_key] = pending_read
+
+    def read_done(task):
+        if pending_reads.get(read_key) is pending_read:
+            del pending_reads[read_key]
+        if pending_read["hit_count"] > 0:
+            _read_stats_increment(app, "coalesce_count")
+        if not task.cancelled():
+            task.exception()  # retrieve the exception so it doesn't get logged as unhandled
+
+    task.add_done_callback(read_done)
+    data = await asyncio.shield(task)
+    return data
+
+
+def _invalidateDiskCache(app, bucket, key):
+    """Remove any items for the given object from the disk cache"""
+    if "disk_cache" in app:
+        disk_cache = app["disk_cache"]
+        disk_cache.invalidate(bucket, key)
+
+
 async def getStorBytes(app,
                        key,
                        filter_ops=None,
@@ -444,8 +788,11 @@ async def getStorBytes(app,
                        chunk_locations=None,
                        h5_size=None,
                        bucket=None,
+                       use_cache=False,
                        ):
-    """Get object identified by key and read as bytes"""
+    """Get object identified by key and read as bytes.
+    If use_cache is set, the storage bytes will be read from (or saved to)
+    the disk cache if one has been configured."""
 
     client = _getStorageClient(app, bucket=bucket)
     if not bucket:
@@ -459,8 +806,20 @@ async def getStorBytes(app,
     msg = f"getStorBytes({bucket}/{key}, offset={offset}, length: {length})"
     log.info(msg)
 
-    kwargs = {"bucket": bucket, "key": key, "offset": offset, "length": length}
-    data = await client.get_object(**kwargs)
+    disk_cache = None
+    data = None
+    if use_cache and "disk_cache" in app:
+        disk_cache = app["disk_cache"]
+        data = await disk_cache.get(bucket, key, offset=offset, length=length)
+        if data is not None:
+            log.debug(f"getStorBytes - {bucket}/{key} found in disk cache")
+    if data is None:
+        if disk_cache is not None:
+            generation = disk_cache.generation
+        data = await _getStorObject(app, client, bucket, key, offset=offset, length=length)
+        if disk_cache is not None and data:
+            kwargs = {"offset": offset, "length": length, "generation": generation}
+            await disk_cache.put(bucket, key, data, **kwargs)
     if data is None or len(data) == 0:
         log.info(f"no data found for {key}")
         return data
@@ -475,7 +834,8 @@ async def getStorBytes(app,
         if not h5_size:
             log.error("getStorBytes - h5_size not set")
             raise HTTPInternalServerError()
-        chunk_bytes = []
+        h5_locations = []
+        h5_items = []
 
         for chunk_location in chunk_locations:
             log.debug(f"getStoreBytes - processing chunk_location: {chunk_location}")
@@ -485,11 +845,16 @@ async def getStorBytes(app,
                 continue
             m = n + chunk_location.length
             log.debug(f"getStorBytes - extracting chunk from data[{n}:{m}]")
-            h5_bytes = data[n:m]
+            h5_locations.append(chunk_location)
+            h5_items.append(data[n:m])
 
-            if filter_ops:
-                h5_bytes = _uncompress(h5_bytes, **filter_ops)
+        if filter_ops:
+            # uncompress the h5 chunks concurrently using the codec executor
+            tasks = [uncompressBytes(app, h5_bytes, **filter_ops) for h5_bytes in h5_items]
+            h5_items = await asyncio.gather(*tasks)
 
+        chunk_bytes = []
+        for chunk_location, h5_bytes in zip(h5_locations, h5_items):
             if len(h5_bytes) != h5_size:
                 msg = f"expected chunk index: {chunk_location.index} to have size: "
                 msg += f"{h5_size} but got: {len(h5_bytes)}"
@@ -501,7 +866,7 @@ async def getStorBytes(app,
         return chunk_bytes
     elif filter_ops:
         # uncompress and return
-        data = _uncompress(data, **filter_ops)
+        data = await uncompressBytes(app, data, **filter_ops)
         return data
     else:
         return data
@@ -513,7 +878,8 @@ async def getHyperChunks(app,
                          hyper_dims=None,
                          filter_ops=None,
                          chunk_locations=None,
-                         bucket=None
+                         bucket=None,
+                         use_cache=False
                          ):
 
     min_offset = None
@@ -530,6 +896,7 @@ async def getHyperChunks(app,
     item_length = max_offset - min_offset
     log.debug(f"getHyperChunks - item_length: {item_length}")
     kwargs = {"offset": min_offset, "length": item_length, "bucket": bucket}
+    kwargs["use_cache"] = use_cache
     data = await getStorBytes(app, key, **kwargs)
     if not data:
         log.warn(f"get_chunk_bytes {key} returned no data")
@@ -538,7 +905,8 @@ async def getHyperChunks(app,
     if len(data) < item_length:
         log.warn(f"getHyperChunks, requested: {item_length}, but got: {len(data)} bytes")
 
-    # slot in the data
+    # extract the h5 chunk bytes
+    h5_items = []
     for item in chunk_locations:
         chunk_offset = item.offset - min_offset
         if chunk_offset + item.length > len(data):
@@ -548,26 +916,43 @@ async def getHyperChunks(app,
             h5_bytes[:chunk_size] = data[chunk_offset:chunk_offset + chunk_size]
         else:
             h5_bytes = data[chunk_offset:chunk_offset + item.length]
-        if filter_ops:
-            h5_bytes = _uncompress(h5_bytes, **filter_ops)
-        hyper_chunk = np.frombuffer(h5_bytes, dtype=chunk_arr.dtype)
-        hyper_chunk = hyper_chunk.reshape(hyper_dims)
-        hyper_index = item.index
-        slices = []
-        for i in range(rank):
-            extent = hyper_dims[i]
-            index = hyper_index[i]
-            start = extent * index
-            end = start + extent
-            s = slice(start, end, 1)
-            slices.append(s)
-        slices = tuple(slices)  # need tuple to use as numpy index
-        chunk_arr[slices] = hyper_chunk[...]
-    log.debug(f"read {len(chunk_locations)} hyperchunks")
-
-
-async def putStorBytes(app, key, data, filter_ops=None, bucket=None):
-    """Store byte string as S3 object with given key"""
+        h5_items.append(h5_bytes)
+
+    if filter_ops:
+        # uncompress the h5 chunks concurrently using the codec executor
+        tasks = [uncompressBytes(app, h5_bytes, **filter_ops) for h5_bytes in h5_items]
+        h5_items = await asyncio.gather(*tasks)
+
+    # slot in the data
+    hyper_indices = []
+    hyper_items = []
+    for item, h5_bytes in zip(chunk_locations, h5_items):
+        if len(h5_bytes) != h5_size:
+            msg = f"expected chunk index: {item.index} to have size: "
+            msg += f"{h5_size} but got: {len(h5_bytes)}"
+            log.warning(msg)
+            continue
+        hyper_indices.append(item.index)
+        hyper_items.append(h5_bytes)
+    if not hyper_items:
+        return
+    hyper_shape = [len(hyper_items), ]
+    hyper_shape.extend(hyper_dims)
+    # copy each item into its slot rather than joining them first
+    hyper_chunks = np.empty(hyper_shape, dtype=chunk_arr.dtype)
+    hyper_bytes = hyper_chunks.reshape(-1).view(np.uint8)
+    for i, h5_bytes in enumerate(hyper_items):
+        hyper_bytes[i * h5_size:(i + 1) * h5_size] = np.frombuffer(h5_bytes, dtype=np.uint8)
+    hyper_indices = np.array(hyper_indices, dtype=np.int64).reshape((-1, rank))
+    setHyperChunks(chunk_arr, hyper_dims, hyper_indices, hyper_chunks)
+    log.debug(f"read {len(hyper_items)} hyperchunks")
+
+
+async def putStorBytes(app, key, data, filter_ops=None, bucket=None, multipart=None):
+    """Store byte string as S3 object with given key.
+    If multipart is True, use a multipart upload (for S3 or Azure storage),
+    if False, use a single put.  If None, multipart is used when the size
+    exceeds the multipart_upload_threshold config"""
 
     client = _getStorageClient(app, bucket=bucket)
     if not bucket:
@@ -578,9 +963,10 @@ async def putStorBytes(app, key, data, filter_ops=None, bucket=None):
     log.info(f"putStorBytes({bucket}/{key}), {len(data)}")
 
     if filter_ops:
-        data = _compress(data, **filter_ops)
+        data = await compressBytes(app, data, **filter_ops)
 
-    rsp = await client.put_object(key, data, bucket=bucket)
+    rsp = await client.put_object(key, data, bucket=bucket, multipart=multipart)
+    _invalidateDiskCache(app, bucket, key)
 
     return rsp
 
@@ -598,6 +984,7 @@ async def putStorJSONObj(app, key, json_obj, bucket=None):
     data = data.encode("utf8")
 
     rsp = await client.put_object(key, data, bucket=bucket)
+    _invalidateDiskCache(app, bucket, key)
 
     return rsp
 
@@ -613,6 +1000,7 @@ async def deleteStorObj(app, key, bucket=None):
     log.info(f"deleteStorObj({key})")
 
     await client.delete_object(key, bucket=bucket)
+    _invalidateDiskCache(app, bucket, key)
 
     log.debug("deleteStorObj complete")
 
@@ -0,0 +1,189 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# valueCache.py
+#
+# LRU cache of serialized dataset value responses for the SN
+#
+import time
+from collections import OrderedDict
+
+from .httpUtil import getETag
+from .. import hsds_logger as log
+
+MAX_INVALIDATE_HISTORY = 10000
+
+
+class ValueCache(object):
+    """LRU cache of value response bodies kept in memory.
+    Items are keyed by (dset_id, selection key) where the selection key
+    captures everything else that affects the response body.  All items
+    for a dataset can be removed with invalidate.  Items older than
+    expire_time seconds are not returned, since writes done through other
+    SNs won't be seen by this cache.
+    """
+
+    def __init__(
+        self,
+        mem_target=128 * 1024 * 1024,
+        max_item_size=8 * 1024 * 1024,
+        expire_time=None,
+        name="ValueCache",
+    ):
+        self._mem_target = mem_target
+        self._max_item_size = max_item_size
+        self._expire_time = expire_time
+        self._name = name
+        self._mem_size = 0
+        self._items = OrderedDict()  # map of item key to (data, etag, time), in LRU order
+        self._dset_items = {}  # map of dset_id to set of item keys
+        # generation counter for invalidations.  Used to avoid adding
+        # responses that were read before the dataset was updated
+        self._generation = 0
+        self._invalidated = OrderedDict()  # map of dset_id to generation
+        self._pruned_generation = 0
+        self._hit_count = 0
+        self._miss_count = 0
+        self._evict_count = 0
+        self._expire_count = 0
+        self._invalidate_count = 0
+
+    def _removeItem(self, item_key):
+        data, _, _ = self._items.pop(item_key)
+        self._mem_size -= len(data)
+        dset_id = item_key[0]
+        dset_items = self._dset_items[dset_id]
+        dset_items.discard(item_key)
+        if not dset_items:
+            del self._dset_items[dset_id]
+
+    def _reduceCache(self):
+        # remove least recently used items till we are under the target size
+        while self._mem_size > self._mem_target and self._items:
+            item_key = next(iter(self._items))
+            log.debug(f"{self._name} - evicting {item_key[0]}")
+            self._removeItem(item_key)
+            self._evict_count += 1
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item_key):
+        return item_key in self._items
+
+    @property
+    def generation(self):
+        """Invalidation counter - pass to put to avoid caching stale data"""
+        return self._generation
+
+    def get(self, dset_id, sel_key):
+        """Return tuple of response bytes and etag for the given selection,
+        or None if not found"""
+        item_key = (dset_id, sel_key)
+        if item_key not in self._items:
+            self._miss_count += 1
+            return None
+        data, etag, put_time = self._items[item_key]
+        if self._expire_time and time.time() - put_time > self._expire_time:
+            log.debug(f"{self._name} - {dset_id} item expired")
+            self._removeItem(item_key)
+            self._expire_count += 1
+            self._miss_count += 1
+            return None
+        self._items.move_to_end(item_key)
+        self._hit_count += 1
+        return data, etag
+
+    def put(self, dset_id, sel_key, data, generation=None, etag=None):
+        """Add the given response bytes to the cache and return its etag.
+        If generation is set, the data won't be cached if the dataset has
+        been invalidated since then.  The etag is computed if not given"""
+        if etag is None:
+            etag = getETag(data)
+        if generation is not None:
+            if dset_id in self._invalidated:
+                if self._invalidated[dset_id] > generation:
+                    log.debug(f"{self._name} - {dset_id} was updated, not caching")
+                    return etag
+            elif self._pruned_generation > generation:
+                # invalidate history has been trimmed, can't tell if it was updated
+                return etag
+        nbytes = len(data)
+        if nbytes > self._max_item_size or nbytes > self._mem_target:
+            log.debug(f"{self._name} - {nbytes} bytes too large to cache")
+            return etag
+        item_key = (dset_id, sel_key)
+        if item_key in self._items:
+            self._removeItem(item_key)
+        self._items[item_key] = (data, etag, time.time())
+        self._mem_size += nbytes
+        if dset_id not in self._dset_items:
+            self._dset_items[dset_id] = set()
+        self._dset_items[dset_id].add(item_key)
+        self._reduceCache()
+        return etag
+
+    def invalidate(self, dset_id):
+        """Remove any cached responses for the given dataset"""
+        self._generation += 1
+        self._invalidated[dset_id] = self._generation
+        self._invalidated.move_to_end(dset_id)
+        while len(self._invalidated) > MAX_INVALIDATE_HISTORY:
+            _, generation = self._invalidated.popitem(last=False)
+            self._pruned_generation = generation
+        if dset_id not in self._dset_items:
+            return
+        log.debug(f"{self._name} - invalidating {dset_id}")
+        for item_key in list(self._dset_items[dset_id]):
+            self._removeItem(item_key)
+            self._invalidate_count += 1
+
+    def clearCache(self):
+        self._items.clear()
+        self._dset_items.clear()
+        self._mem_size = 0
+
+    @property
+    def cacheUtilizationPercent(self):
+        return int((self._mem_size / self._mem_target) * 100.0)
+
+    @property
+    def memUsed(self):
+        return self._mem_size
+
+    @property
+    def memTarget(self):
+        return self._mem_target
+
+    @property
+    def maxItemSize(self):
+        return self._max_item_size
+
+    @property
+    def hitCount(self):
+        return self._hit_count
+
+    @property
+    def missCount(self):
+        return self._miss_count
+
+    @property
+    def evictCount(self):
+        return self._evict_count
+
+    @property
+    def expireCount(self):
+        return self._expire_count
+
+    @property
+    def invalidateCount(self):
+        return self._invalidate_count
@@ -15,9 +15,12 @@ import sys
 
 PYTHON_CMD = "python"  # change to "python3" if "python" invokes python version 2.x
 
-unit_tests = ('array_util_test', 'chunk_util_test', 'compression_test', 'domain_util_test',
-              'dset_util_test', 'hdf5_dtype_test', 'id_util_test', 'lru_cache_test',
-              'shuffle_test', 'rangeget_util_test')
+unit_tests = ('array_util_test', 'arrow_util_test', 'chunk_crawl_test', 'chunk_dn_test',
+              'chunk_sn_test', 'chunk_util_test', 'compression_test', 'concurrency_limiter_test',
+              'disk_cache_test', 'domain_util_test', 'dset_util_test', 'file_client_test',
+              'hdf5_dtype_test', 'http_util_test', 'id_util_test', 'lru_cache_test',
+              's3_client_test', 'shuffle_test', 'rangeget_util_test', 'stor_util_test',
+              'value_cache_test')
 
 integ_tests = ('uptest', 'setup_test', 'domain_test', 'group_test',
                'link_test', 'attr_test', 'datatype_test', 'dataset_test',
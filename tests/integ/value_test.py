@@ -11,6 +11,7 @@
 ##############################################################################
 import unittest
 import json
+import struct
 import numpy as np
 import helper
 import config
@@ -4096,6 +4097,118 @@ class ValueTest(unittest.TestCase):
         self.assertEqual(shape["class"], "H5S_SIMPLE")
         self.assertEqual(shape["dims"], [num_nested_arrays])
 
+    def testMultiDatasetRead(self):
+        # Test POST /datasets/value to read from multiple datasets in one request
+        print("testMultiDatasetRead", self.base_domain)
+        headers = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_rsp = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_rsp["accept"] = "application/octet-stream"
+
+        # create two datasets with different types
+        dset_ids = []
+        for i, type_name in enumerate(("H5T_STD_I32LE", "H5T_IEEE_F64LE")):
+            data = {"type": type_name, "shape": 20, "creationProperties": {"fillValue": i}}
+            req = self.endpoint + "/datasets"
+            rsp = self.session.post(req, data=json.dumps(data), headers=headers)
+            self.assertEqual(rsp.status_code, 201)
+            rspJson = json.loads(rsp.text)
+            dset_ids.append(rspJson["id"])
+
+        # write values to the first dataset
+        req = self.endpoint + "/datasets/" + dset_ids[0] + "/value"
+        payload = {"value": list(range(20))}
+        rsp = self.session.put(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+
+        items = [{"id": dset_ids[0], "select": "[5:10]"}, {"id": dset_ids[1]}]
+        req = self.endpoint + "/datasets/value"
+        rsp = self.session.post(req, data=json.dumps({"items": items}), headers=headers_bin_rsp)
+        self.assertEqual(rsp.status_code, 200)
+        self.assertEqual(rsp.headers["Content-Type"], "application/octet-stream")
+
+        # response is a frame for each item: index, status, and nbytes followed by the data
+        frames = []
+        data = rsp.content
+        offset = 0
+        while offset < len(data):
+            index, status, nbytes = struct.unpack_from("<IIQ", data, offset)
+            offset += 16
+            frames.append((index, status, data[offset:offset + nbytes]))
+            offset += nbytes
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0][0], 0)
+        self.assertEqual(frames[0][1], 200)
+        arr = np.frombuffer(frames[0][2], dtype="<i4")
+        self.assertEqual(arr.tolist(), [5, 6, 7, 8, 9])
+        self.assertEqual(frames[1][0], 1)
+        self.assertEqual(frames[1][1], 200)
+        arr = np.frombuffer(frames[1][2], dtype="<f8")
+        self.assertEqual(arr.tolist(), [1.0, ] * 20)
+
+        # binary response is required
+        rsp = self.session.post(req, data=json.dumps({"items": items}), headers=headers)
+        self.assertEqual(rsp.status_code, 400)
+
+        # datasets can't be repeated
+        items = [{"id": dset_ids[0]}, {"id": dset_ids[0]}]
+        rsp = self.session.post(req, data=json.dumps({"items": items}), headers=headers_bin_rsp)
+        self.assertEqual(rsp.status_code, 400)
+
+    def testMultiDatasetWrite(self):
+        # Test PUT /datasets/value to write to multiple datasets in one request
+        print("testMultiDatasetWrite", self.base_domain)
+        headers = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req["Content-Type"] = "application/octet-stream"
+
+        # create two datasets with different types
+        dset_ids = []
+        for type_name in ("H5T_STD_I32LE", "H5T_IEEE_F64LE"):
+            data = {"type": type_name, "shape": 20}
+            req = self.endpoint + "/datasets"
+            rsp = self.session.post(req, data=json.dumps(data), headers=headers)
+            self.assertEqual(rsp.status_code, 201)
+            rspJson = json.loads(rsp.text)
+            dset_ids.append(rspJson["id"])
+
+        # first frame has the item descriptions, followed by a data frame for each item
+        items = [{"id": dset_ids[0], "select": "[5:10]"}, {"id": dset_ids[1]}]
+        frames = [json.dumps({"items": items}).encode("utf-8"), ]
+        frames.append(np.arange(5, dtype="<i4").tobytes())
+        frames.append(np.full((20,), 1.5, dtype="<f8").tobytes())
+        body = bytearray()
+        for frame_number, data in enumerate(frames):
+            # data frames use the item index, the description frame index is ignored
+            index = max(frame_number - 1, 0)
+            body += struct.pack("<IIQ", index, 0, len(data))
+            body += data
+
+        req = self.endpoint + "/datasets/value"
+        rsp = self.session.put(req, data=bytes(body), headers=headers_bin_req)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        self.assertEqual(len(rspJson["items"]), 2)
+        for dset_id, rsp_item in zip(dset_ids, rspJson["items"]):
+            self.assertEqual(rsp_item["id"], dset_id)
+            self.assertEqual(rsp_item["status"], 200)
+
+        # read back the values
+        req = self.endpoint + "/datasets/" + dset_ids[0] + "/value"
+        rsp = self.session.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        expected = [0, ] * 5 + list(range(5)) + [0, ] * 10
+        self.assertEqual(json.loads(rsp.text)["value"], expected)
+        req = self.endpoint + "/datasets/" + dset_ids[1] + "/value"
+        rsp = self.session.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        self.assertEqual(json.loads(rsp.text)["value"], [1.5, ] * 20)
+
+        # missing data frame for the second item
+        req = self.endpoint + "/datasets/value"
+        body = body[:-(16 + len(frames[2]))]
+        rsp = self.session.put(req, data=bytes(body), headers=headers_bin_req)
+        self.assertEqual(rsp.status_code, 400)
+
 
 if __name__ == "__main__":
     # setup test files
@@ -0,0 +1,91 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import time
+import numpy as np
+import sys
+
+from hsds.util.rangegetUtil import (
+    getHyperChunkFactors,
+    getHyperChunkIndex,
+    getHyperChunkIndices,
+    setHyperChunks,
+)
+
+""" Time placement of hyperchunks into an HSDS chunk, comparing a per
+hyperchunk loop with the vectorized getHyperChunkIndices/setHyperChunks.
+
+usage: python hyperchunk_placement.py [chunk_extent] [hyper_extent]
+
+e.g. a 2d 1024x1024 float32 chunk made up of 16x16 hdf5 chunks:
+
+    $ python hyperchunk_placement.py 1024 16
+
+Got the following result with python 3.11 for 1024x1024 chunks with 4x4
+hdf5 chunks (65536 hyperchunks):
+
+    getHyperChunkIndex loop - elapsed: 0.9027
+    slice assignment loop - elapsed: 0.3078
+    getHyperChunkIndices - elapsed: 0.0024
+    setHyperChunks - elapsed: 0.0149
+"""
+
+if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+    sys.exit(f"usage: python {sys.argv[0]} [chunk_extent] [hyper_extent]")
+chunk_extent = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+hyper_extent = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+chunk_dims = (chunk_extent, chunk_extent)
+hyper_dims = (hyper_extent, hyper_extent)
+dt = np.dtype("float32")
+factors = getHyperChunkFactors(chunk_dims, hyper_dims)
+count = int(np.prod(factors))
+print(f"chunk_dims: {chunk_dims} hyper_dims: {hyper_dims} hyperchunk count: {count}")
+
+# decoded hyperchunk bytes as they would come back from storage
+h5_size = int(np.prod(hyper_dims)) * dt.itemsize
+h5_items = [np.full(hyper_dims, i, dtype=dt).tobytes() for i in range(count)]
+
+# loop version
+then = time.time()
+indices = [getHyperChunkIndex(i, factors) for i in range(count)]
+now = time.time()
+print(f"getHyperChunkIndex loop - elapsed: {(now - then):6.4f}")
+
+then = time.time()
+expected = np.zeros(chunk_dims, dtype=dt)
+for hyper_index, h5_bytes in zip(indices, h5_items):
+    hyper_chunk = np.frombuffer(h5_bytes, dtype=dt).reshape(hyper_dims)
+    slices = []
+    for i in range(len(hyper_dims)):
+        start = hyper_dims[i] * hyper_index[i]
+        slices.append(slice(start, start + hyper_dims[i], 1))
+    expected[tuple(slices)] = hyper_chunk[...]
+now = time.time()
+print(f"slice assignment loop - elapsed: {(now - then):6.4f}")
+
+# vectorized version
+then = time.time()
+hyper_indices = getHyperChunkIndices(factors)
+now = time.time()
+print(f"getHyperChunkIndices - elapsed: {(now - then):6.4f}")
+
+then = time.time()
+chunk_arr = np.zeros(chunk_dims, dtype=dt)
+hyper_chunks = np.frombuffer(b"".join(h5_items), dtype=dt)
+hyper_chunks = hyper_chunks.reshape((count,) + hyper_dims)
+setHyperChunks(chunk_arr, hyper_dims, hyper_indices, hyper_chunks)
+now = time.time()
+print(f"setHyperChunks - elapsed: {(now - then):6.4f}")
+
+if not np.array_equal(chunk_arr, expected):
+    sys.exit("arrays don't match!")
+print("ok")
@@ -0,0 +1,80 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import sys
+import numpy as np
+
+sys.path.append("../..")
+from hsds.util.arrowUtil import pyarrow, ARROW_EOS, isArrowType, getArrowSchemaBytes
+from hsds.util.arrowUtil import arrayToArrowBatch, arrayToArrowStream, getArrowSchema
+from hsds.util.hdf5dtype import special_dtype
+
+
+@unittest.skipUnless(pyarrow is not None, "pyarrow not installed")
+class ArrowUtilTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ArrowUtilTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testIsArrowType(self):
+        self.assertFalse(isArrowType(np.dtype("f4")))
+        dt = np.dtype([("symbol", "S4"), ("open", "i4"), ("close", "f8")])
+        self.assertTrue(isArrowType(dt))
+        dt = np.dtype([("name", special_dtype(vlen=str)), ("value", "(2,3)f4")])
+        self.assertTrue(isArrowType(dt))
+        # nested compound types are not supported
+        dt = np.dtype([("a", "i4"), ("b", [("x", "i4"), ("y", "i4")])])
+        self.assertFalse(isArrowType(dt))
+
+    def testArrowStream(self):
+        dt = np.dtype([("symbol", "S4"), ("open", "i4"), ("close", "f8"), ("v", "(2,)u2")])
+        arr = np.zeros((3,), dtype=dt)
+        arr["symbol"] = [b"AAPL", b"EBAY", b"GOOG"]
+        arr["open"] = [3054, 3023, 2973]
+        arr["close"] = [29.33, 30.88, 30.11]
+        arr["v"] = [[1, 2], [3, 4], [5, 6]]
+
+        table = pyarrow.ipc.open_stream(arrayToArrowStream(arr)).read_all()
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column_names, ["symbol", "open", "close", "v"])
+        self.assertEqual(table.column("symbol").to_pylist(), [b"AAPL", b"EBAY", b"GOOG"])
+        self.assertEqual(table.column("open").to_pylist(), [3054, 3023, 2973])
+        self.assertEqual(table.column("close").to_pylist(), [29.33, 30.88, 30.11])
+        self.assertEqual(table.column("v").to_pylist(), [[1, 2], [3, 4], [5, 6]])
+
+        # stream built from one batch per page
+        schema = getArrowSchema(dt)
+        self.assertEqual(getArrowSchemaBytes(dt, schema=schema), getArrowSchemaBytes(dt))
+        pages = [getArrowSchemaBytes(dt), ]
+        pages.append(arrayToArrowBatch(arr[:2], schema=schema))
+        pages.append(arrayToArrowBatch(arr[2:], schema=schema))
+        pages.append(ARROW_EOS)
+        reader = pyarrow.ipc.open_stream(b"".join(pages))
+        batches = list(reader)
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches[0].num_rows, 2)
+        self.assertEqual(batches[1].column(1).to_pylist(), [2973])
+
+    def testVlenStrings(self):
+        dt = np.dtype([("name", special_dtype(vlen=str)), ("value", "i8")])
+        arr = np.zeros((2, 2), dtype=dt)
+        arr["name"] = [["a", b"b"], ["cd", ""]]
+        arr["value"] = [[1, 2], [3, 4]]
+        table = pyarrow.ipc.open_stream(arrayToArrowStream(arr)).read_all()
+        self.assertEqual(table.column("name").to_pylist(), ["a", "b", "cd", ""])
+        self.assertEqual(table.column("value").to_pylist(), [1, 2, 3, 4])
+
+
+if __name__ == "__main__":
+    # setup test files
+
+    unittest.main()
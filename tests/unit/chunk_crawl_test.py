@@ -0,0 +1,326 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import unittest
+import sys
+from unittest.mock import patch, Mock
+import numpy as np
+from aiohttp.client_exceptions import ServerTimeoutError
+from aiohttp.streams import StreamReader
+from aiohttp.web_exceptions import HTTPInternalServerError
+
+sys.path.append("../..")
+from hsds.chunk_crawl import ChunkCrawler, getDataNodeLimiter
+from hsds.chunk_crawl import read_chunk_batch, read_chunk_hyperslab
+from hsds.util.httpUtil import _read_into
+from hsds.util.arrayUtil import arrayToBytes
+from hsds.util.hdf5dtype import createDataType
+from hsds.util.idUtil import getDataNodeUrl
+from hsds.util.chunkUtil import packChunkFrameHeader
+import hsds.config as config
+
+DSET_ID = "d-0568d8c5-a77e8f2f-f2a8-1b4b5c-1b7d07"
+
+
+def getApp(dn_count=2):
+    dn_urls = [f"http://dn{i}:6101" for i in range(dn_count)]
+    return {"dn_urls": dn_urls, "node_state": "READY"}
+
+
+def getDsetJson(type_json=None, dims=None, chunk_dims=None):
+    if type_json is None:
+        type_json = {"class": "H5T_INTEGER", "base": "H5T_STD_I32LE"}
+    if dims is None:
+        dims = [100, ]
+    if chunk_dims is None:
+        chunk_dims = [10, ]
+    layout = {"class": "H5D_CHUNKED", "dims": chunk_dims}
+    dset_json = {"id": DSET_ID, "layout": layout, "type": type_json}
+    dset_json["shape"] = {"class": "H5S_SIMPLE", "dims": dims}
+    return dset_json
+
+
+def getChunkIds(count):
+    return [f"c-{DSET_ID[2:]}_{i}" for i in range(count)]
+
+
+def getChunkMap(chunk_ids):
+    # each chunk is read into the next 10 elements of the target array
+    chunk_map = {}
+    for i, chunk_id in enumerate(chunk_ids):
+        chunk_info = {"chunk_sel": (slice(0, 10, 1), )}
+        chunk_info["data_sel"] = (slice(i * 10, (i + 1) * 10, 1), )
+        chunk_map[chunk_id] = chunk_info
+    return chunk_map
+
+
+def postFrames(frames):
+    """Return replacement for http_post that gives the reader the
+    given response body"""
+    async def http_post(app, url, data=None, params=None, client=None, reader=None):
+        stream = asyncio.StreamReader()
+        stream.feed_data(bytes(frames))
+        stream.feed_eof()
+        rsp = Mock()
+        rsp.content = stream
+        return await reader(rsp)
+    return http_post
+
+
+def getBody(body, requests):
+    """Return replacement for http_get that responds with the given body,
+    read into out like httpUtil.http_get when it's set.  The out buffer
+    for each request is appended to requests"""
+    async def http_get(app, url, params=None, client=None, out=None):
+        requests.append(out)
+        if out is None:
+            return body
+        rsp = Mock()
+        rsp.content = StreamReader(Mock(), 2 ** 16, loop=asyncio.get_running_loop())
+        # deliver the body in a few pieces
+        for i in range(0, len(body), 16):
+            rsp.content.feed_data(body[i:(i + 16)])
+        rsp.content.feed_eof()
+        return await _read_into(rsp, out)
+    return http_get
+
+
+def readChunk(app, chunk_id, dset_json, arr, chunk_map, body):
+    """Run read_chunk_hyperslab with a DN response of body and return
+    the list of out buffers passed to http_get"""
+    requests = []
+    loop = asyncio.new_event_loop()
+    try:
+        with patch("hsds.chunk_crawl.http_get", new=getBody(body, requests)):
+            kwargs = {"chunk_map": chunk_map, "bucket": "hsdstest"}
+            coro = read_chunk_hyperslab(app, chunk_id, dset_json, arr, **kwargs)
+            loop.run_until_complete(coro)
+    finally:
+        loop.close()
+    return requests
+
+
+def runCrawl(app, crawler):
+    async def crawl():
+        try:
+            await crawler.crawl()
+        finally:
+            for client in app.get("cc_clients", {}).values():
+                await client.close()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(crawl())
+    loop.close()
+
+
+class ChunkCrawlTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ChunkCrawlTest, self).__init__(*args, **kwargs)
+        # main
+
+    def setUp(self):
+        # keep the retries short
+        self._max_retries = config.get("dn_max_retries")
+        config.cfg["dn_max_retries"] = 2
+
+    def tearDown(self):
+        if self._max_retries is None:
+            del config.cfg["dn_max_retries"]
+        else:
+            config.cfg["dn_max_retries"] = self._max_retries
+
+    def testTimeoutBackoff(self):
+        for exception in (asyncio.TimeoutError, ServerTimeoutError):
+            app = getApp()
+            chunk_id = getChunkIds(1)[0]
+            kwargs = {"dset_json": getDsetJson(), "action": "read_chunk_hyperslab"}
+            kwargs["arr"] = np.zeros((10, ), dtype="i4")
+            crawler = ChunkCrawler(app, [chunk_id, ], **kwargs)
+            limiter = getDataNodeLimiter(app, getDataNodeUrl(app, chunk_id))
+            initial_limit = limiter.limit
+
+            async def read_timeout(*args, **kwargs):
+                raise exception()
+
+            with patch("hsds.chunk_crawl.read_chunk_hyperslab", new=read_timeout):
+                runCrawl(app, crawler)
+            # timeouts are treated as overload, so the limit backs off
+            self.assertEqual(crawler.get_status(), 503)
+            self.assertTrue(limiter.limit < initial_limit)
+            self.assertEqual(limiter.getStats()["overload_count"], 2)
+            self.assertEqual(limiter.inflight, 0)
+
+    def testBatches(self):
+        app = getApp(dn_count=3)
+        chunk_ids = getChunkIds(10)
+        dset_json = getDsetJson()
+        kwargs = {"dset_json": dset_json, "action": "read_chunk_hyperslab"}
+        kwargs["arr"] = np.zeros((100, ), dtype="i4")
+        kwargs["chunk_map"] = getChunkMap(chunk_ids)
+        config.cfg["chunk_batch_size"] = 2
+        try:
+            crawler = ChunkCrawler(app, chunk_ids, **kwargs)
+        finally:
+            del config.cfg["chunk_batch_size"]
+        items = []
+        while not crawler._q.empty():
+            items.append(crawler._q.get_nowait())
+        # each batch is for one DN and no larger than the batch size
+        queued = []
+        for item in items:
+            if isinstance(item, list):
+                self.assertEqual(len(item), 2)
+                dn_urls = set([getDataNodeUrl(app, chunk_id) for chunk_id in item])
+                self.assertEqual(len(dn_urls), 1)
+                queued.extend(item)
+            else:
+                queued.append(item)  # single chunk for a DN
+        self.assertEqual(sorted(queued), sorted(chunk_ids))
+        self.assertTrue(len(items) < len(chunk_ids))
+
+        # queries and point selections aren't batched
+        crawler = ChunkCrawler(app, chunk_ids, query="a > 1", **kwargs)
+        self.assertEqual(crawler._q.qsize(), len(chunk_ids))
+
+    def testBatchFallback(self):
+        app = getApp(dn_count=1)
+        chunk_ids = getChunkIds(3)
+        kwargs = {"dset_json": getDsetJson(), "action": "read_chunk_hyperslab"}
+        kwargs["arr"] = np.zeros((30, ), dtype="i4")
+        kwargs["chunk_map"] = getChunkMap(chunk_ids)
+        crawler = ChunkCrawler(app, chunk_ids, **kwargs)
+        self.assertEqual(crawler._q.qsize(), 1)
+        chunk_reads = []
+
+        async def read_batch(app, batch_ids, dset_items, **kwargs):
+            # no frame for the last chunk, and an error for the second
+            return {batch_ids[0]: 200, batch_ids[1]: 500}
+
+        async def read_chunk(app, chunk_id, *args, **kwargs):
+            chunk_reads.append(chunk_id)
+
+        with patch("hsds.chunk_crawl.read_chunk_batch", new=read_batch):
+            with patch("hsds.chunk_crawl.read_chunk_hyperslab", new=read_chunk):
+                runCrawl(app, crawler)
+        # chunks that weren't returned are read individually
+        self.assertEqual(chunk_reads, chunk_ids[1:])
+        self.assertEqual(crawler.get_status(), 200)
+
+    def testReadChunkBatch(self):
+        app = getApp(dn_count=1)
+        chunk_ids = getChunkIds(5)
+        chunk_map = getChunkMap(chunk_ids)
+        dt = np.dtype("<i4")
+        arr = np.zeros((50, ), dtype=dt)
+        dset_item = {"dset_json": getDsetJson(), "arr": arr, "select_dtype": dt}
+        frames = bytearray()
+        # frames are in the order the DN read the chunks
+        data = np.arange(10, dtype=dt).tobytes()
+        frames.extend(packChunkFrameHeader(2, 200, len(data)))
+        frames.extend(data)
+        frames.extend(packChunkFrameHeader(0, 404, 0))
+        frames.extend(packChunkFrameHeader(1, 500, 4))
+        frames.extend(b"oops")
+        # frame with the wrong number of bytes is skipped
+        frames.extend(packChunkFrameHeader(3, 200, 8))
+        frames.extend(data[:8])
+        # truncated frame
+        frames.extend(packChunkFrameHeader(4, 200, len(data)))
+        frames.extend(data[:20])
+
+        kwargs = {"chunk_map": chunk_map, "bucket": "hsdstest"}
+        dset_items = [dset_item, ] * len(chunk_ids)
+        loop = asyncio.new_event_loop()
+        with patch("hsds.chunk_crawl.http_post", new=postFrames(frames)):
+            coro = read_chunk_batch(app, chunk_ids, dset_items, **kwargs)
+            status_map = loop.run_until_complete(coro)
+        loop.close()
+        expected = {chunk_ids[0]: 200, chunk_ids[1]: 500, chunk_ids[2]: 200}
+        self.assertEqual(status_map, expected)
+        self.assertTrue(np.array_equal(arr[20:30], np.arange(10)))
+        self.assertTrue(np.array_equal(arr[:20], np.zeros(20)))
+
+    def testReadChunkInto(self):
+        # data_sel is a contiguous region of the target array
+        app = getApp(dn_count=1)
+        chunk_id = getChunkIds(3)[2]
+        arr = np.zeros((100, ), dtype="<i4")
+        chunk_map = {chunk_id: {"chunk_sel": (slice(0, 10, 1), )}}
+        chunk_map[chunk_id]["data_sel"] = (slice(20, 30, 1), )
+        data = np.arange(10, dtype="<i4")
+        requests = readChunk(app, chunk_id, getDsetJson(), arr, chunk_map, data.tobytes())
+        self.assertEqual(len(requests), 1)
+        out = requests[0]
+        # response was read into np_arr rather than a temporary buffer
+        self.assertEqual(out.nbytes, data.nbytes)
+        self.assertTrue(np.shares_memory(np.asarray(out), arr))
+        self.assertTrue(np.array_equal(arr[20:30], data))
+        self.assertEqual(np.count_nonzero(arr[:20]), 0)
+        self.assertEqual(np.count_nonzero(arr[30:]), 0)
+
+        # rows of a 2d array are contiguous too
+        dset_json = getDsetJson(dims=[10, 10], chunk_dims=[2, 10])
+        chunk_id = f"c-{DSET_ID[2:]}_1_0"
+        arr = np.zeros((10, 10), dtype="<i4")
+        chunk_map = {chunk_id: {"chunk_sel": (slice(0, 2, 1), slice(0, 10, 1))}}
+        chunk_map[chunk_id]["data_sel"] = (slice(2, 4, 1), slice(0, 10, 1))
+        data = np.arange(20, dtype="<i4").reshape((2, 10))
+        requests = readChunk(app, chunk_id, dset_json, arr, chunk_map, data.tobytes())
+        self.assertTrue(requests[0] is not None)
+        self.assertTrue(np.array_equal(arr[2:4, :], data))
+
+    def testReadChunkNonContiguous(self):
+        # columns of a 2d array aren't contiguous, so the response is
+        # copied from a view of the response bytes
+        app = getApp(dn_count=1)
+        dset_json = getDsetJson(dims=[10, 10], chunk_dims=[10, 5])
+        chunk_id = f"c-{DSET_ID[2:]}_0_1"
+        arr = np.zeros((10, 10), dtype="<i4")
+        chunk_map = {chunk_id: {"chunk_sel": (slice(0, 10, 1), slice(0, 5, 1))}}
+        chunk_map[chunk_id]["data_sel"] = (slice(0, 10, 1), slice(5, 10, 1))
+        data = np.arange(50, dtype="<i4").reshape((10, 5))
+        requests = readChunk(app, chunk_id, dset_json, arr, chunk_map, data.tobytes())
+        self.assertEqual(requests, [None, ])
+        self.assertTrue(np.array_equal(arr[:, 5:], data))
+        self.assertEqual(np.count_nonzero(arr[:, :5]), 0)
+
+    def testReadChunkVlen(self):
+        # variable length types are never read in place
+        app = getApp(dn_count=1)
+        type_json = {"class": "H5T_STRING", "charSet": "H5T_CSET_UTF8"}
+        type_json["length"] = "H5T_VARIABLE"
+        dt = createDataType(type_json)
+        chunk_id = getChunkIds(2)[1]
+        arr = np.zeros((20, ), dtype=dt)
+        chunk_map = {chunk_id: {"chunk_sel": (slice(0, 10, 1), )}}
+        chunk_map[chunk_id]["data_sel"] = (slice(10, 20, 1), )
+        data = np.array([f"str_{i}" * i for i in range(1, 11)], dtype=dt)
+        dset_json = getDsetJson(type_json=type_json, dims=[20, ])
+        requests = readChunk(app, chunk_id, dset_json, arr, chunk_map, arrayToBytes(data))
+        self.assertEqual(requests, [None, ])
+        self.assertEqual(list(arr[10:]), list(data))
+
+    def testReadChunkBadSize(self):
+        app = getApp(dn_count=1)
+        chunk_id = getChunkIds(1)[0]
+        chunk_map = {chunk_id: {"chunk_sel": (slice(0, 10, 1), )}}
+        chunk_map[chunk_id]["data_sel"] = (slice(0, 10, 1), )
+        data = np.arange(10, dtype="<i4").tobytes()
+        for body in (data[:-4], data + b"\0\0\0\0", b""):
+            arr = np.zeros((100, ), dtype="<i4")
+            with self.assertRaises(HTTPInternalServerError):
+                readChunk(app, chunk_id, getDsetJson(), arr, chunk_map, body)
+
+
+if __name__ == "__main__":
+    # setup test files
+    unittest.main()
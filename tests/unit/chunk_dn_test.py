@@ -0,0 +1,250 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import json
+import unittest
+import sys
+from unittest.mock import patch, AsyncMock, Mock
+import numpy as np
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.append("../..")
+from hsds.chunk_dn import PUT_Chunk, POST_Chunks
+from hsds.util.chunkUtil import unpackChunkFrames
+from hsds.util.lruCache import LruCache
+
+DSET_ID = "d-8c785f1c-995311e6-9bc2-0242ac-110005"
+CHUNK_ID = "c-8c785f1c-995311e6-9bc2-0242ac-110005_0"
+
+
+def getApp():
+    app = {"node_type": "dn", "node_state": "READY", "max_task_count": 0}
+    app.update({"id": "dn-1", "dn_ids": ["dn-1", ], "dn_urls": ["http://dn0", ]})
+    app["chunk_cache"] = LruCache(mem_target=4 * 1024 * 1024, name="ChunkCache")
+    app["pending_s3_read"] = {}
+    return app
+
+
+def getDsetJson():
+    dset_json = {"id": DSET_ID}
+    dset_json["type"] = {"class": "H5T_INTEGER", "base": "H5T_STD_I32LE", "size": 4}
+    dset_json["shape"] = {"class": "H5S_SIMPLE", "dims": [100, ]}
+    dset_json["layout"] = {"class": "H5D_CHUNKED", "dims": [10, ]}
+    return dset_json
+
+
+class DataNodeMock:
+    """Stand in for the datanode_lib and request body functions used by
+    PUT_Chunk.  Records the storage reads and chunk saves"""
+
+    def __init__(self, app, body):
+        self.app = app
+        self.body = body
+        self.get_count = 0
+        self.saved = {}
+        self.on_read = None  # called while the request body is read
+        self.missing = None  # chunk ids that get_chunk doesn't find
+
+    async def get_metadata_obj(self, app, obj_id, bucket=None):
+        return getDsetJson()
+
+    async def get_chunk(self, app, chunk_id, dset_json, bucket=None, chunk_init=False):
+        self.get_count += 1
+        chunk_cache = app["chunk_cache"]
+        if chunk_id in chunk_cache:
+            return chunk_cache[chunk_id]
+        if self.missing and chunk_id in self.missing:
+            return None
+        chunk_arr = np.zeros((10, ), dtype="<i4")
+        chunk_cache[chunk_id] = chunk_arr
+        return chunk_arr
+
+    def save_chunk(self, app, chunk_id, dset_json, chunk_arr, bucket=None):
+        self.saved[chunk_id] = chunk_arr.copy()
+
+    async def request_read(self, request, count=None):
+        if self.on_read:
+            self.on_read()
+        return self.body
+
+    def _run(self, coro):
+        patches = [
+            patch("hsds.chunk_dn.get_metadata_obj", new=self.get_metadata_obj),
+            patch("hsds.chunk_dn.get_chunk", new=self.get_chunk),
+            patch("hsds.chunk_dn.save_chunk", new=self.save_chunk),
+            patch("hsds.chunk_dn.request_read", new=self.request_read),
+            patch("hsds.chunk_dn.chunk_prefetch", new=Mock()),
+        ]
+        for p in patches:
+            p.start()
+        loop = asyncio.new_event_loop()
+        try:
+            rsp = loop.run_until_complete(coro)
+            loop.run_until_complete(asyncio.sleep(0))  # let the disconnect watcher exit
+            return rsp
+        finally:
+            loop.close()
+            for p in patches:
+                p.stop()
+
+    def put_chunk(self, query):
+        headers = {"Content-Length": str(len(self.body))}
+        url = f"/chunks/{CHUNK_ID}?bucket=hsdstest&{query}"
+        kwargs = {"headers": headers, "match_info": {"id": CHUNK_ID}, "app": self.app}
+        payload = Mock()  # body is returned by request_read
+        payload.at_eof.return_value = False
+        request = make_mocked_request("PUT", url, payload=payload, **kwargs)
+        return self._run(PUT_Chunk(request))
+
+    def post_chunks(self, items):
+        """Run POST_Chunks for the given chunk items and return the
+        response and its list of (index, status, data) frames"""
+        payload = Mock()
+        payload.at_eof.return_value = False
+        payload.readany = AsyncMock(side_effect=[json.dumps({"chunks": items}).encode(), b""])
+        transport = Mock()
+        transport.is_closing.return_value = False  # client still connected
+        writer = Mock()
+        body = bytearray()
+
+        async def write(data):
+            body.extend(data)
+
+        writer.write = write
+        writer.write_headers = AsyncMock()
+        writer.write_eof = AsyncMock()
+        writer.drain = AsyncMock()
+        kwargs = {"app": self.app, "payload": payload, "transport": transport}
+        request = make_mocked_request("POST", "/chunks?bucket=hsdstest", writer=writer, **kwargs)
+        # the app is a plain dict, so skip the on_response_prepare signal
+        with patch("aiohttp.web_request.Request._prepare_hook", new=AsyncMock()):
+            resp = self._run(POST_Chunks(request))
+        frames = [(index, status, bytes(data)) for index, status, data in unpackChunkFrames(body)]
+        return resp, frames
+
+
+class ChunkDnTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ChunkDnTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testPutChunkOverwrite(self):
+        # selection covering the whole chunk doesn't read the chunk
+        arr = np.arange(10, dtype="<i4")
+        mock = DataNodeMock(getApp(), arr.tobytes())
+        resp = mock.put_chunk("select=[0:10]")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.get_count, 0)
+        self.assertTrue(np.array_equal(mock.saved[CHUNK_ID], arr))
+
+        # no select param is the entire chunk too
+        mock = DataNodeMock(getApp(), arr.tobytes())
+        resp = mock.put_chunk("")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.get_count, 0)
+
+    def testPutChunkFillValue(self):
+        # all fill value data for a chunk that doesn't exist isn't saved
+        arr = np.zeros((10, ), dtype="<i4")
+        mock = DataNodeMock(getApp(), arr.tobytes())
+        resp = mock.put_chunk("select=[0:10]")
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(mock.get_count, 1)
+        self.assertEqual(mock.saved, {})
+
+        # but will overwrite an existing chunk
+        app = getApp()
+        app["chunk_cache"][CHUNK_ID] = np.ones((10, ), dtype="<i4")
+        mock = DataNodeMock(app, arr.tobytes())
+        resp = mock.put_chunk("select=[0:10]")
+        self.assertEqual(resp.status, 201)
+        self.assertTrue(np.array_equal(mock.saved[CHUNK_ID], arr))
+
+    def testPutChunkBroadcast(self):
+        # one element broadcast to the whole chunk
+        arr = np.array([42, ], dtype="<i4")
+        mock = DataNodeMock(getApp(), arr.tobytes())
+        resp = mock.put_chunk("select=[0:10]&element_count=1")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.get_count, 0)
+        self.assertTrue(np.array_equal(mock.saved[CHUNK_ID], np.full((10, ), 42)))
+
+    def testPutChunkPartial(self):
+        # partial selection is a read-modify-write of the chunk
+        app = getApp()
+        app["chunk_cache"][CHUNK_ID] = np.ones((10, ), dtype="<i4")
+        arr = np.arange(5, dtype="<i4")
+        mock = DataNodeMock(app, arr.tobytes())
+        resp = mock.put_chunk("select=[2:7]")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.get_count, 1)
+        expected = np.ones((10, ), dtype="<i4")
+        expected[2:7] = arr
+        self.assertTrue(np.array_equal(mock.saved[CHUNK_ID], expected))
+
+    def testPutChunkCachedDuringRead(self):
+        # chunk read into the cache while the body is being read gets
+        # updated rather than replaced
+        app = getApp()
+        arr = np.arange(10, dtype="<i4")
+        mock = DataNodeMock(app, arr.tobytes())
+        cached_arr = np.ones((10, ), dtype="<i4")
+
+        def add_to_cache():
+            app["chunk_cache"][CHUNK_ID] = cached_arr
+
+        mock.on_read = add_to_cache
+        resp = mock.put_chunk("select=[0:10]")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.get_count, 1)
+        # the cached array was updated in place
+        self.assertTrue(app["chunk_cache"][CHUNK_ID] is cached_arr)
+        self.assertTrue(np.array_equal(cached_arr, arr))
+
+        # same if a storage read is in progress
+        app = getApp()
+        mock = DataNodeMock(app, arr.tobytes())
+        mock.on_read = lambda: app["pending_s3_read"].update({CHUNK_ID: 0})
+        resp = mock.put_chunk("select=[0:10]")
+        self.assertEqual(resp.status, 201)
+        self.assertEqual(mock.get_count, 1)
+
+    def testPostChunks(self):
+        app = getApp()
+        chunk_ids = [f"{CHUNK_ID[:-2]}_{i}" for i in range(3)]
+        for i, chunk_id in enumerate(chunk_ids):
+            app["chunk_cache"][chunk_id] = np.arange(10, dtype="<i4") + i * 10
+        missing_id = f"{CHUNK_ID[:-2]}_5"
+        items = [{"id": chunk_id, "select": "[2:5]"} for chunk_id in chunk_ids]
+        items.append({"id": missing_id, "select": "[0:10]"})
+        items.append({"id": "bogus", "select": "[0:10]"})
+        items.append({"id": chunk_ids[0], "select": "[0:20]"})  # out of range
+        mock = DataNodeMock(app, None)
+        mock.missing = [missing_id, ]
+        resp, frames = mock.post_chunks(items)
+        self.assertEqual(resp.status, 200)
+        # one frame per item, in the order the reads complete
+        self.assertEqual(sorted([frame[0] for frame in frames]), list(range(len(items))))
+        frame_map = {frame[0]: frame[1:] for frame in frames}
+        for i in range(len(chunk_ids)):
+            status, data = frame_map[i]
+            self.assertEqual(status, 200)
+            arr = np.frombuffer(data, dtype="<i4")
+            self.assertTrue(np.array_equal(arr, np.arange(2, 5) + i * 10))
+        self.assertEqual(frame_map[3], (404, b""))
+        self.assertEqual(frame_map[4], (400, b""))
+        self.assertEqual(frame_map[5], (400, b""))
+
+
+if __name__ == "__main__":
+    # setup test files
+    unittest.main()
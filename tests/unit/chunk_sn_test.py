@@ -0,0 +1,173 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import unittest
+import sys
+from unittest.mock import patch, AsyncMock, Mock
+import numpy as np
+from aiohttp.web import StreamResponse
+from aiohttp.web_exceptions import HTTPInternalServerError
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.append("../..")
+from hsds.chunk_sn import _getPageData, _streamPageData
+from hsds.util.dsetUtil import getSelectionPagination
+
+DSET_ID = "d-8c785f1c-995311e6-9bc2-0242ac-110005"
+
+
+class SelectionMock:
+    """Stand in for dset_lib.getSelectionData that returns the page
+    selection of arr.  Records the pages read and cancelled"""
+
+    def __init__(self, arr, delays=None, fail_page=None):
+        self.arr = arr
+        self.delays = delays
+        self.fail_page = fail_page
+        self.pages = []
+        self.cancelled = []
+
+    async def getSelectionData(self, app, dset_id, dset_json, slices=None, **kwargs):
+        page_number = len(self.pages)
+        self.pages.append(slices)
+        try:
+            if self.delays:
+                await asyncio.sleep(self.delays[page_number])
+            else:
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled.append(page_number)
+            raise
+        if page_number == self.fail_page:
+            raise HTTPInternalServerError()
+        return self.arr[slices]
+
+
+def getPages(arr, page_rows):
+    slices = (slice(0, arr.shape[0], 1), )
+    max_request_size = page_rows * arr.dtype.itemsize
+    return getSelectionPagination(slices, arr.shape, arr.dtype.itemsize, max_request_size)
+
+
+def streamPages(sel_mock, pages, fail_write=None):
+    """Run _streamPageData and return the response body and number of
+    bytes streamed.  If fail_write is set, that write to the client
+    raises an error"""
+    body = bytearray()
+    writes = []
+
+    async def write(data):
+        writes.append(len(data))
+        if len(writes) == fail_write:
+            raise ConnectionResetError("client went away")
+        body.extend(data)
+
+    writer = Mock()
+    writer.write = write
+    writer.write_headers = AsyncMock()
+    writer.write_eof = AsyncMock()
+    writer.drain = AsyncMock()
+    request = make_mocked_request("GET", f"/datasets/{DSET_ID}/value", app={}, writer=writer)
+    resp = StreamResponse()
+    resp.headers["Content-Type"] = "application/octet-stream"
+
+    async def stream():
+        nbytes = await _streamPageData(request, resp, DSET_ID, {}, pages)
+        await asyncio.sleep(0.1)  # let the page task see any cancel
+        return nbytes
+
+    loop = asyncio.new_event_loop()
+    try:
+        # the app is a plain dict, so skip the on_response_prepare signal
+        with patch("aiohttp.web_request.Request._prepare_hook", new=AsyncMock()):
+            with patch("hsds.chunk_sn.getSelectionData", new=sel_mock.getSelectionData):
+                nbytes = loop.run_until_complete(stream())
+    finally:
+        loop.close()
+    writer.write_eof.assert_called_once()
+    return bytes(body), nbytes
+
+
+class ChunkSnTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ChunkSnTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testGetPageData(self):
+        arr = np.arange(100, dtype="<i4")
+        pages = getPages(arr, 20)
+        self.assertTrue(len(pages) > 2)
+        # later pages are read faster, but are still queued in order
+        delays = [0.01 * (len(pages) - i) for i in range(len(pages))]
+        sel_mock = SelectionMock(arr, delays=delays)
+        page_queue = asyncio.Queue()
+        loop = asyncio.new_event_loop()
+        with patch("hsds.chunk_sn.getSelectionData", new=sel_mock.getSelectionData):
+            loop.run_until_complete(_getPageData({}, DSET_ID, {}, pages, page_queue))
+        loop.close()
+        items = [page_queue.get_nowait() for _ in range(page_queue.qsize())]
+        self.assertEqual(len(items), len(pages) + 1)
+        for page, item in zip(pages, items):
+            self.assertEqual(item, arr[page].tobytes())
+        self.assertTrue(items[-1] is None)
+
+    def testGetPageDataError(self):
+        arr = np.arange(100, dtype="<i4")
+        pages = getPages(arr, 20)
+        sel_mock = SelectionMock(arr, fail_page=2)
+        page_queue = asyncio.Queue()
+        loop = asyncio.new_event_loop()
+        with patch("hsds.chunk_sn.getSelectionData", new=sel_mock.getSelectionData):
+            loop.run_until_complete(_getPageData({}, DSET_ID, {}, pages, page_queue))
+        loop.close()
+        items = [page_queue.get_nowait() for _ in range(page_queue.qsize())]
+        # the pages before the error, then the exception
+        self.assertEqual(len(items), 3)
+        self.assertEqual(items[0], arr[pages[0]].tobytes())
+        self.assertEqual(items[1], arr[pages[1]].tobytes())
+        self.assertTrue(isinstance(items[2], HTTPInternalServerError))
+        self.assertEqual(len(sel_mock.pages), 3)  # no reads after the error
+
+    def testStreamPages(self):
+        arr = np.arange(1000, dtype="<i4")
+        pages = getPages(arr, 64)
+        self.assertTrue(len(pages) > 10)
+        sel_mock = SelectionMock(arr)
+        body, nbytes = streamPages(sel_mock, pages)
+        # the pages were written in order
+        self.assertEqual(body, arr.tobytes())
+        self.assertEqual(nbytes, arr.nbytes)
+        self.assertEqual(sel_mock.pages, list(pages))
+
+    def testStreamPagesError(self):
+        arr = np.arange(100, dtype="<i4")
+        pages = getPages(arr, 20)
+        sel_mock = SelectionMock(arr, fail_page=3)
+        body, nbytes = streamPages(sel_mock, pages)
+        # the pages before the error are sent, then the response is ended
+        self.assertEqual(body, arr[:pages[2][0].stop].tobytes())
+        self.assertEqual(nbytes, len(body))
+
+    def testStreamPagesWriteFailure(self):
+        arr = np.arange(100, dtype="<i4")
+        pages = getPages(arr, 10)
+        sel_mock = SelectionMock(arr, delays=[0.01, ] * len(pages))
+        body, nbytes = streamPages(sel_mock, pages, fail_write=2)
+        self.assertEqual(body, arr[pages[0]].tobytes())
+        # the page reads are cancelled rather than run to completion
+        self.assertEqual(len(sel_mock.cancelled), 1)
+        self.assertTrue(len(sel_mock.pages) < len(pages))
+
+
+if __name__ == "__main__":
+    # setup test files
+    unittest.main()
@@ -27,6 +27,7 @@ from hsds.util.chunkUtil import (
     getNumChunks,
     getChunkIds,
     getChunkId,
+    getChunkIdsForPoints,
     getPartitionKey,
     getChunkPartition,
     getChunkIndex,
@@ -41,6 +42,8 @@ from hsds.util.chunkUtil import (
     _getEvalStr,
     _getWhereFieldName,
     _getWhereElements,
+    packChunkFrameHeader,
+    unpackChunkFrames,
 )
 
 
@@ -1278,6 +1281,34 @@ class ChunkUtilTest(unittest.TestCase):
         self.assertEqual(chunk_id[2:-4], dset_id[2:])
         self.assertEqual(len(chunk_id), 2 + 36 + 4)
 
+    def testGetChunkIdsForPoints(self):
+        dset_id = "d-12345678-1234-1234-1234-1234567890ab"
+
+        layout = (10,)
+        points = np.array([23, 5, 27, 99, 0, 21], dtype=np.uint64)
+        chunk_points = getChunkIdsForPoints(dset_id, points, layout)
+        chunk_ids = list(chunk_points.keys())
+        self.assertEqual(len(chunk_ids), 3)
+        self.assertTrue(chunk_ids[0].endswith("_0"))
+        self.assertTrue(chunk_ids[1].endswith("_2"))
+        self.assertTrue(chunk_ids[2].endswith("_9"))
+        self.assertEqual(chunk_points[chunk_ids[0]].tolist(), [1, 4])
+        self.assertEqual(chunk_points[chunk_ids[1]].tolist(), [0, 2, 5])
+        self.assertEqual(chunk_points[chunk_ids[2]].tolist(), [3])
+
+        # compare with getChunkId for a random set of 2d points
+        layout = (10, 20)
+        points = np.random.randint(0, 200, size=(1000, 2)).astype(np.uint64)
+        chunk_points = getChunkIdsForPoints(dset_id, points, layout)
+        point_count = 0
+        for chunk_id, indices in chunk_points.items():
+            point_count += len(indices)
+            for index in indices:
+                self.assertEqual(getChunkId(dset_id, points[index], layout), chunk_id)
+        self.assertEqual(point_count, 1000)
+
+        self.assertEqual(getChunkIdsForPoints(dset_id, points[:0], layout), {})
+
     def testDimQuery(self):
         request = {"dim_0": 23, "dim_1": 54, "dim_2": 2}
         dims = []
@@ -1789,6 +1820,32 @@ class ChunkUtilTest(unittest.TestCase):
             self.assertEqual(item[1], b"AAPL")
             self.assertEqual(item[3], 999)
 
+    def testChunkFrames(self):
+        arr = np.arange(20, dtype="i4")
+        data = arr.tobytes()
+        frames = bytearray()
+        frames += packChunkFrameHeader(1, 200, len(data))
+        frames += data
+        frames += packChunkFrameHeader(0, 404, 0)
+        frames += packChunkFrameHeader(2, 200, 8)
+        frames += data[:8]
+        items = list(unpackChunkFrames(bytes(frames)))
+        self.assertEqual(len(items), 3)
+        index, status, frame = items[0]
+        self.assertEqual(index, 1)
+        self.assertEqual(status, 200)
+        self.assertTrue(np.array_equal(np.frombuffer(frame, dtype="i4"), arr))
+        self.assertEqual(items[1][:2], (0, 404))
+        self.assertEqual(len(items[1][2]), 0)
+        self.assertEqual(items[2][:2], (2, 200))
+        self.assertEqual(bytes(items[2][2]), data[:8])
+        self.assertEqual(list(unpackChunkFrames(b"")), [])
+
+        # truncated frames should raise an error
+        for n in (4, len(frames) - 1):
+            with self.assertRaises(ValueError):
+                list(unpackChunkFrames(bytes(frames[:n])))
+
 
 if __name__ == "__main__":
 
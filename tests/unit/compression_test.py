@@ -9,13 +9,24 @@
 # distribution tree.  If you do not have access to this file, you may        #
 # request a copy from help@hdfgroup.org.                                     #
 ##############################################################################
+import asyncio
 import unittest
 import sys
 import numpy as np
 import zlib
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.append("../..")
 from hsds.util.storUtil import _compress, _uncompress, getCompressors, BIT_SHUFFLE, BYTE_SHUFFLE
+from hsds.util.storUtil import compressBytes, uncompressBytes, releaseCodecExecutor
+from hsds.util.storUtil import _lz4_compress, ZSTD_MAGIC
+from hsds.util.httpUtil import getAcceptEncoding, getContentEncoding
+from hsds.util.httpUtil import encodeContent, decodeContent
+import numcodecs as codecs
+import hsds.config as config
+from aiohttp.test_utils import make_mocked_request
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPUnsupportedMediaType
+from aiohttp.web_exceptions import HTTPRequestEntityTooLarge
 
 
 class CompressionUtilTest(unittest.TestCase):
@@ -52,6 +63,73 @@ class CompressionUtilTest(unittest.TestCase):
             data_copy = _uncompress(cdata, **kwargs)
             self.assertEqual(data, data_copy)
 
+    def testNativeCodecs(self):
+        shape = (100_000, )
+        dt = np.dtype("<i4")
+        arr = np.random.randint(0, 200, shape, dtype=dt)
+        data = arr.tobytes()
+        kwargs = {"dtype": dt, "chunk_shape": shape}
+
+        # blosc is used unless native_codecs is enabled
+        kwargs["compressor"] = "zstd"
+        kwargs["level"] = 3
+        self.assertFalse(config.get("native_codecs"))
+        cdata = _compress(data, **kwargs)
+        self.assertNotEqual(cdata[:4], ZSTD_MAGIC)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
+        config.cfg["native_codecs"] = True
+        try:
+            self.native_codecs_test(data, dt, kwargs)
+        finally:
+            config.cfg["native_codecs"] = False
+
+    def native_codecs_test(self, data, dt, kwargs):
+        # with native_codecs, zstd chunks are plain zstd frames
+        cdata = _compress(data, **kwargs)
+        self.assertEqual(cdata[:4], ZSTD_MAGIC)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
+        # zstd frame as written by the HDF5 zstd filter (32015)
+        cdata = codecs.Zstd(level=1).encode(data)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
+        # shuffle then zstd
+        kwargs["shuffle"] = BYTE_SHUFFLE
+        shuffled = codecs.Shuffle(dt.itemsize).encode(data).tobytes()
+        cdata = codecs.Zstd(level=1).encode(shuffled)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+        cdata = _compress(data, **kwargs)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+        kwargs["shuffle"] = 0
+
+        # blosc wrapped zstd written by earlier versions
+        cdata = codecs.Blosc(cname="zstd", clevel=5, shuffle=0).encode(data)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
+        # lz4 in the HDF5 lz4 filter (32004) format, with multiple blocks
+        kwargs["compressor"] = "lz4"
+        cdata = _lz4_compress(data, block_size=65536)
+        self.assertEqual(int.from_bytes(cdata[:8], "big"), len(data))
+        self.assertEqual(int.from_bytes(cdata[8:12], "big"), 65536)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
+        # block that doesn't compress is stored as is
+        random_data = np.random.bytes(1000)
+        cdata = _lz4_compress(random_data)
+        self.assertEqual(int.from_bytes(cdata[12:16], "big"), 1000)
+        self.assertEqual(cdata[16:], random_data)
+        self.assertEqual(_uncompress(cdata, **kwargs), random_data)
+
+        # empty input
+        cdata = _lz4_compress(b"")
+        self.assertEqual(cdata, bytes(12))
+        self.assertEqual(_uncompress(cdata, **kwargs), b"")
+
+        # blosc wrapped lz4 written by earlier versions
+        cdata = codecs.Blosc(cname="lz4", clevel=5, shuffle=0).encode(data)
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
     def testBitShuffle(self):
         shape = (1_000_000, )
         dt = np.dtype("<i4")
@@ -79,6 +157,129 @@ class CompressionUtilTest(unittest.TestCase):
         data_copy = _uncompress(cdata, **kwargs)
         self.assertEqual(data, data_copy)
 
+    async def codec_executor_test(self, app):
+        shape = (1_000_000, )
+        dt = np.dtype("<i4")
+        arr = np.random.randint(0, 200, shape, dtype=dt)
+        data = arr.tobytes()
+
+        kwargs = {"dtype": dt, "chunk_shape": shape, "compressor": "gzip", "shuffle": BYTE_SHUFFLE}
+        cdata = await compressBytes(app, data, **kwargs)
+        self.assertTrue(len(cdata) < len(data))
+        # should be the same as running the codec inline
+        self.assertEqual(_uncompress(cdata, **kwargs), data)
+
+        # run several decodes concurrently
+        tasks = [uncompressBytes(app, cdata, **kwargs) for _ in range(4)]
+        results = await asyncio.gather(*tasks)
+        for data_copy in results:
+            self.assertEqual(data, data_copy)
+
+        # small payloads are processed inline
+        small_data = data[:100]
+        small_cdata = await compressBytes(app, small_data, **kwargs)
+        data_copy = await uncompressBytes(app, small_cdata, **kwargs)
+        self.assertEqual(small_data, data_copy)
+
+        # no filters - data is passed through
+        data_copy = await compressBytes(app, data, dtype=dt, chunk_shape=shape)
+        self.assertEqual(data, data_copy)
+
+    def testCodecExecutor(self):
+        app = {}
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.codec_executor_test(app))
+        finally:
+            releaseCodecExecutor(app)
+            loop.close()
+
+        self.assertTrue("codec_stats" in app)
+        codec_stats = app["codec_stats"]
+        self.assertTrue("shuffle+zlib" in codec_stats)
+        stats = codec_stats["shuffle+zlib"]
+        self.assertEqual(stats["compress_count"], 2)
+        self.assertEqual(stats["uncompress_count"], 5)
+        self.assertEqual(stats["executor_count"], 5)
+        self.assertEqual(stats["uncompress_bytes"] > 0, True)
+        self.assertTrue(stats["compress_time"] > 0.0)
+        self.assertFalse("codec_executor" in app)
+
+    def testProcessExecutor(self):
+        shape = (100_000, )
+        dt = np.dtype("<i4")
+        data = (np.arange(shape[0], dtype=dt) % 100).tobytes()
+        kwargs = {"dtype": dt, "chunk_shape": shape, "compressor": "gzip"}
+        cdata = _compress(data, **kwargs)
+        app = {"codec_executor": ProcessPoolExecutor(max_workers=1)}
+        loop = asyncio.new_event_loop()
+        try:
+            # memoryview input (e.g. from mmap reads) needs to be sent as bytes
+            coro = uncompressBytes(app, memoryview(cdata), **kwargs)
+            data_copy = loop.run_until_complete(coro)
+        finally:
+            releaseCodecExecutor(app)
+            loop.close()
+        self.assertEqual(data, data_copy)
+
+    def testContentEncoding(self):
+        def mock_request(headers):
+            return make_mocked_request("GET", "/datasets/d-1/value", headers=headers)
+
+        self.assertEqual(getAcceptEncoding(mock_request({})), None)
+        req = mock_request({"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(getAcceptEncoding(req), None)
+        req = mock_request({"Accept-Encoding": "gzip, x-hsds-lz4, zstd"})
+        self.assertEqual(getAcceptEncoding(req), "zstd")
+        req = mock_request({"Accept-Encoding": "zstd;q=0.5, x-hsds-lz4"})
+        self.assertEqual(getAcceptEncoding(req), "x-hsds-lz4")
+        req = mock_request({"Accept-Encoding": "*, zstd;q=0"})
+        self.assertEqual(getAcceptEncoding(req), "x-hsds-lz4")
+        # the numcodecs lz4 block format is not the lz4 frame format
+        req = mock_request({"Accept-Encoding": "lz4"})
+        self.assertEqual(getAcceptEncoding(req), None)
+
+        self.assertEqual(getContentEncoding(mock_request({})), None)
+        req = mock_request({"Content-Encoding": "gzip"})
+        self.assertEqual(getContentEncoding(req), None)  # decoded by aiohttp
+        req = mock_request({"Content-Encoding": "ZSTD"})
+        self.assertEqual(getContentEncoding(req), "zstd")
+        req = mock_request({"Content-Encoding": "compress"})
+        with self.assertRaises(HTTPUnsupportedMediaType):
+            getContentEncoding(req)
+
+        async def encoding_test():
+            data = (np.arange(100000, dtype="i4") % 100).tobytes()
+            for encoding in ("zstd", "x-hsds-lz4"):
+                cdata = await encodeContent(data, encoding)
+                self.assertTrue(len(cdata) < len(data))
+                udata = await decodeContent(cdata, encoding)
+                self.assertEqual(udata, data)
+            # small or incompressible data is not encoded unless forced
+            self.assertEqual(await encodeContent(b"abc", "zstd"), None)
+            random_data = np.random.bytes(100000)
+            self.assertEqual(await encodeContent(random_data, "x-hsds-lz4"), None)
+            cdata = await encodeContent(b"abc", "zstd", force=True)
+            self.assertEqual(await decodeContent(cdata, "zstd"), b"abc")
+            with self.assertRaises(HTTPBadRequest):
+                await decodeContent(b"not zstd data", "zstd")
+            # frame header declaring a content size over max_request_size
+            header = ZSTD_MAGIC + b"\xe0" + (1 << 40).to_bytes(8, "little")
+            with self.assertRaises(HTTPRequestEntityTooLarge):
+                await decodeContent(header + b"\x00" * 16, "zstd")
+            # frame without a content size, as written by streaming compressors
+            header = ZSTD_MAGIC + b"\x00\x50"
+            with self.assertRaises(HTTPBadRequest):
+                await decodeContent(header + b"\x00" * 16, "zstd")
+            cdata = await encodeContent(data, "x-hsds-lz4")
+            cdata = (1 << 31).to_bytes(4, "little") + cdata[4:]
+            with self.assertRaises(HTTPRequestEntityTooLarge):
+                await decodeContent(cdata, "x-hsds-lz4")
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(encoding_test())
+        loop.close()
+
 
 if __name__ == "__main__":
     # setup test files
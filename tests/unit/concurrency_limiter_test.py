@@ -0,0 +1,98 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import unittest
+import sys
+
+sys.path.append("../..")
+from hsds.util.concurrencyLimiter import ConcurrencyLimiter
+
+
+class ConcurrencyLimiterTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ConcurrencyLimiterTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testAIMD(self):
+        limiter = ConcurrencyLimiter(initial_limit=4, min_limit=1, max_limit=8)
+        self.assertEqual(limiter.limit, 4)
+
+        async def run_requests(count, status_code=200, elapsed=0.01):
+            for i in range(count):
+                await limiter.acquire()
+                limiter.release(status_code=status_code, elapsed=elapsed)
+
+        loop = asyncio.new_event_loop()
+        # additive increase - about one per round of requests
+        loop.run_until_complete(run_requests(5))
+        self.assertEqual(limiter.limit, 5)
+        loop.run_until_complete(run_requests(100))
+        self.assertEqual(limiter.limit, 8)  # capped at max_limit
+        self.assertEqual(limiter.inflight, 0)
+
+        # multiplicative decrease on 503
+        loop.run_until_complete(run_requests(1, status_code=503))
+        self.assertEqual(limiter.limit, 4)
+        # back to back errors only reduce the limit once per request interval
+        limiter._latency_short = 60.0
+        loop.run_until_complete(run_requests(3, status_code=503))
+        self.assertEqual(limiter.limit, 4)
+        limiter._latency_short = 0.0
+        loop.run_until_complete(run_requests(5, status_code=503))
+        self.assertEqual(limiter.limit, 1)  # floor of min_limit
+
+        # latency well above the long term average is treated as congestion
+        limiter = ConcurrencyLimiter(initial_limit=8, min_limit=1, max_limit=8)
+        loop.run_until_complete(run_requests(20, elapsed=0.01))
+        self.assertEqual(limiter.limit, 8)
+        loop.run_until_complete(run_requests(10, elapsed=0.5))
+        self.assertTrue(limiter.limit < 8)
+
+        stats = limiter.getStats()
+        for key in ("limit", "inflight", "waiting", "request_count", "decrease_count"):
+            self.assertTrue(key in stats)
+        self.assertEqual(stats["request_count"], 30)
+        self.assertTrue(stats["decrease_count"] > 0)
+        loop.close()
+
+    def testWaiters(self):
+        limiter = ConcurrencyLimiter(initial_limit=2, min_limit=1, max_limit=2)
+        max_inflight = 0
+
+        async def request(delay):
+            nonlocal max_inflight
+            await limiter.acquire()
+            max_inflight = max(max_inflight, limiter.inflight)
+            await asyncio.sleep(delay)
+            limiter.release(status_code=200)
+
+        async def run():
+            tasks = [asyncio.create_task(request(0.01)) for i in range(10)]
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.inflight, 2)
+            self.assertEqual(limiter.waiting, 8)
+            # a cancelled waiter gives up its place
+            tasks[-1].cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+        loop.close()
+        self.assertEqual(max_inflight, 2)
+        self.assertEqual(limiter.inflight, 0)
+        self.assertEqual(limiter.waiting, 0)
+
+
+if __name__ == "__main__":
+    # setup test files
+
+    unittest.main()
@@ -0,0 +1,130 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import os
+import tempfile
+import unittest
+import sys
+
+sys.path.append("../..")
+from hsds.util.diskCache import DiskCache, removeStaleCacheDirs
+
+
+class DiskCacheTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(DiskCacheTest, self).__init__(*args, **kwargs)
+        # main
+
+    async def disk_cache_test(self, dirpath):
+        cache = DiskCache(dirpath, size_target=1000)
+        self.assertEqual(len(cache), 0)
+        data = await cache.get("bucket", "chunk_1")
+        self.assertTrue(data is None)
+        self.assertEqual(cache.missCount, 1)
+
+        await cache.put("bucket", "chunk_1", b"a" * 300)
+        await cache.put("bucket", "chunk_2", b"b" * 300)
+        await cache.put("bucket", "s3file", b"c" * 100, offset=1000, length=100)
+        await cache.put("bucket", "s3file", b"d" * 100, offset=2000, length=100)
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(cache.sizeUsed, 800)
+        self.assertEqual(cache.cacheUtilizationPercent, 80)
+
+        data = await cache.get("bucket", "chunk_1")
+        self.assertEqual(data, b"a" * 300)
+        data = await cache.get("bucket", "s3file", offset=1000, length=100)
+        self.assertEqual(data, b"c" * 100)
+        data = await cache.get("bucket", "s3file", offset=1000, length=200)
+        self.assertTrue(data is None)
+        self.assertEqual(cache.hitCount, 2)
+
+        # chunk_2 is least recently used, so should get evicted
+        await cache.put("bucket", "chunk_3", b"e" * 300)
+        self.assertEqual(cache.evictCount, 1)
+        self.assertFalse(("bucket", "chunk_2", 0, -1) in cache)
+        self.assertTrue(("bucket", "chunk_1", 0, -1) in cache)
+        self.assertEqual(cache.sizeUsed, 800)
+
+        # invalidate removes all ranges for the object
+        cache.invalidate("bucket", "s3file")
+        self.assertEqual(cache.invalidateCount, 2)
+        self.assertEqual(len(cache), 2)
+        data = await cache.get("bucket", "s3file", offset=2000, length=100)
+        self.assertTrue(data is None)
+
+        # data read before an update shouldn't get cached
+        generation = cache.generation
+        cache.invalidate("bucket", "chunk_1")
+        await cache.put("bucket", "chunk_1", b"f" * 10, generation=generation)
+        self.assertFalse(("bucket", "chunk_1", 0, -1) in cache)
+        generation = cache.generation
+        await cache.put("bucket", "chunk_1", b"g" * 10, generation=generation)
+        data = await cache.get("bucket", "chunk_1")
+        self.assertEqual(data, b"g" * 10)
+
+        # items larger than the cache are ignored
+        await cache.put("bucket", "chunk_4", b"h" * 2000)
+        self.assertEqual(len(cache), 2)
+
+        cache.close()
+        self.assertFalse(os.path.isdir(dirpath))
+
+    def testDiskCache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dirpath = os.path.join(tmp_dir, "cache")
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.disk_cache_test(dirpath))
+            loop.close()
+
+    async def disk_cache_expire_test(self, dirpath):
+        cache = DiskCache(dirpath, size_target=1000, expire_time=0.1)
+        await cache.put("bucket", "chunk_1", b"a" * 100)
+        data = await cache.get("bucket", "chunk_1")
+        self.assertEqual(data, b"a" * 100)
+        await asyncio.sleep(0.2)
+        data = await cache.get("bucket", "chunk_1")
+        self.assertTrue(data is None)
+        self.assertEqual(cache.expireCount, 1)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.sizeUsed, 0)
+        cache.close()
+
+    def testDiskCacheExpire(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dirpath = os.path.join(tmp_dir, "cache")
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.disk_cache_expire_test(dirpath))
+            loop.close()
+
+    def testRemoveStaleCacheDirs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # directory left behind by a process that has exited
+            stale_dir = os.path.join(tmp_dir, "dn_1")
+            os.makedirs(os.path.join(stale_dir, "ab"))
+            with open(os.path.join(stale_dir, ".lock"), "w") as f:
+                f.write("")
+            other_dir = os.path.join(tmp_dir, "other")
+            os.makedirs(other_dir)
+            cache = DiskCache(os.path.join(tmp_dir, "dn_2"), size_target=1000)
+            removeStaleCacheDirs(tmp_dir, "dn_")
+            self.assertFalse(os.path.isdir(stale_dir))
+            self.assertTrue(os.path.isdir(other_dir))
+            if sys.platform != "win32":
+                # directory of a running cache is kept
+                self.assertTrue(os.path.isdir(os.path.join(tmp_dir, "dn_2")))
+            cache.close()
+
+
+if __name__ == "__main__":
+    # setup test files
+
+    unittest.main()
@@ -12,10 +12,12 @@
 import unittest
 import logging
 import sys
+import numpy as np
 
 sys.path.append("../..")
 from hsds.util.dsetUtil import getHyperslabSelection, getSelectionShape
 from hsds.util.dsetUtil import getSelectionList, ItemIterator, getSelectionPagination
+from hsds.util.dsetUtil import getFilterOps
 
 
 class DsetUtilTest(unittest.TestCase):
@@ -630,6 +632,29 @@ class DsetUtilTest(unittest.TestCase):
         except ValueError:
             pass  # expected
 
+    def testFilterOps(self):
+        app = {"filter_map": {}}
+        dset_id = "d-b45ea08c-eb9f1a1c-5d91-9d9f1a-1b3f9d"
+        # zstd with no level uses the zstd_level config
+        filters = [{"class": "H5Z_FILTER_ZSTD", "id": 32015, "name": "zstd"}, ]
+        filter_ops = getFilterOps(app, dset_id, filters)
+        self.assertEqual(filter_ops["compressor"], "zstd")
+        self.assertEqual(filter_ops["level"], 3)
+
+        # user filter given by id
+        filters = [{"class": "H5Z_FILTER_USER", "id": 32015, "level": 9}, ]
+        filter_ops = getFilterOps({"filter_map": {}}, dset_id, filters)
+        self.assertEqual(filter_ops["compressor"], "zstd")
+        self.assertEqual(filter_ops["level"], 9)
+
+        filters = [{"class": "H5Z_FILTER_SHUFFLE", "id": 2, "name": "shuffle"},
+                   {"class": "H5Z_FILTER_LZ4", "id": 32004, "name": "lz4"}]
+        kwargs = {"dtype": np.dtype("<i4"), "chunk_shape": (100, )}
+        filter_ops = getFilterOps({"filter_map": {}}, dset_id, filters, **kwargs)
+        self.assertEqual(filter_ops["compressor"], "lz4")
+        self.assertEqual(filter_ops["shuffle"], 1)
+        self.assertEqual(filter_ops["level"], 5)
+
 
 if __name__ == "__main__":
     # setup test files
@@ -0,0 +1,113 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import os
+import tempfile
+import unittest
+import sys
+import numpy as np
+
+sys.path.append("../..")
+from hsds.util.fileClient import mmapRead, FileClient, TMP_SUFFIX
+from aiohttp.web_exceptions import HTTPInternalServerError
+from hsds.util.arrayUtil import bytesToArray
+
+
+def getClient(root_dir, use_mmap=False):
+    # skip the normal constructor - root_dir doesn't come from the config
+    client = FileClient.__new__(FileClient)
+    client._app = {}
+    client._root_dir = root_dir
+    client._use_mmap = use_mmap
+    return client
+
+
+class FileClientTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(FileClientTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testMmapRead(self):
+        arr = np.arange(1_000_000, dtype=np.dtype("<i4"))
+        data = arr.tobytes()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "chunk")
+            with open(filepath, "wb") as f:
+                f.write(data)
+
+            # whole file
+            buffer = mmapRead(filepath)
+            self.assertTrue(isinstance(buffer, memoryview))
+            self.assertEqual(len(buffer), len(data))
+            self.assertEqual(buffer.tobytes(), data)
+
+            # range that doesn't start on a page boundary
+            offset = 4 * 1001
+            length = 4 * 5000
+            buffer = mmapRead(filepath, offset=offset, length=length)
+            self.assertEqual(len(buffer), length)
+            self.assertEqual(buffer.tobytes(), data[offset:offset + length])
+
+            # range that extends past the end of the file
+            offset = len(data) - 100
+            buffer = mmapRead(filepath, offset=offset, length=1000)
+            self.assertEqual(buffer.tobytes(), data[offset:])
+
+            # offset beyond the end of the file
+            buffer = mmapRead(filepath, offset=len(data) + 10, length=10)
+            self.assertEqual(len(buffer), 0)
+
+            # array wraps the mapping without a copy, and updates
+            # don't get written back to the file
+            buffer = mmapRead(filepath)
+            chunk_arr = bytesToArray(buffer, arr.dtype, (1000, 1000))
+            self.assertEqual(chunk_arr.shape, (1000, 1000))
+            self.assertTrue(np.shares_memory(chunk_arr, np.frombuffer(buffer, dtype=arr.dtype)))
+            chunk_arr[0, 0] = 42
+            with open(filepath, "rb") as f:
+                self.assertEqual(f.read(), data)
+
+            # replace file as fileClient.put_object does, mapped data is unchanged
+            tmp_filepath = filepath + ".tmp"
+            with open(tmp_filepath, "wb") as f:
+                f.write(b"\0" * 16)
+            os.replace(tmp_filepath, filepath)
+            self.assertEqual(chunk_arr[0, 1], 1)
+            self.assertEqual(chunk_arr[999, 999], 999_999)
+
+    def testPutObject(self):
+        async def put_test(client, bucket_dir):
+            for i in range(2):
+                await client.put_object("a/b", b"x" * (i + 1), bucket="bucket")
+                with open(os.path.join(bucket_dir, "a", "b"), "rb") as f:
+                    self.assertEqual(f.read(), b"x" * (i + 1))
+            # failed writes don't leave temporary files behind
+            with self.assertRaises(HTTPInternalServerError):
+                await client.put_object("a/c", object(), bucket="bucket")
+            names = os.listdir(os.path.join(bucket_dir, "a"))
+            if client._use_mmap:
+                self.assertEqual(names, ["b"])
+            self.assertFalse(any(name.endswith(TMP_SUFFIX) for name in names))
+
+        for use_mmap in (False, True):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                bucket_dir = os.path.join(tmp_dir, "bucket")
+                os.mkdir(bucket_dir)
+                client = getClient(tmp_dir, use_mmap=use_mmap)
+                loop = asyncio.new_event_loop()
+                loop.run_until_complete(put_test(client, bucket_dir))
+                loop.close()
+
+
+if __name__ == "__main__":
+    # setup test files
+    unittest.main()
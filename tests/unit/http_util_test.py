@@ -0,0 +1,123 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import time
+import unittest
+import sys
+from unittest.mock import Mock
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.append("../..")
+from hsds.util.httpUtil import getETag, getObjectETag, isNotModified, notModifiedResponse
+from hsds.util.httpUtil import _watch_request, cancelOnDisconnect
+import hsds.config as config
+
+
+def getRequest(transport):
+    return make_mocked_request("GET", "/datasets/d-1/value", transport=transport)
+
+
+class HttpUtilTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(HttpUtilTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testETags(self):
+        etag = getETag(b"hello")
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(etag, getETag(b"hello"))
+        self.assertNotEqual(etag, getETag(b"hello!"))
+
+        req = make_mocked_request("GET", "/groups/g-1?include_links=1")
+        etag = getObjectETag(req, "g-1", 1700000000.5)
+        self.assertEqual(etag, getObjectETag(req, "g-1", 1700000000.5))
+        self.assertNotEqual(etag, getObjectETag(req, "g-1", 1700000001.5))
+        self.assertNotEqual(etag, getObjectETag(req, "g-2", 1700000000.5))
+        self.assertNotEqual(etag, getObjectETag(req, "g-1", 1700000000.5, [10, 20]))
+        # different query params give a different response
+        other_req = make_mocked_request("GET", "/groups/g-1")
+        self.assertNotEqual(etag, getObjectETag(other_req, "g-1", 1700000000.5))
+
+        self.assertFalse(isNotModified(req, etag))
+        headers = {"If-None-Match": etag}
+        req = make_mocked_request("GET", "/groups/g-1", headers=headers)
+        self.assertTrue(isNotModified(req, etag))
+        # weak comparison
+        headers = {"If-None-Match": f'"abc", {etag[2:]}'}
+        req = make_mocked_request("GET", "/groups/g-1", headers=headers)
+        self.assertTrue(isNotModified(req, etag))
+        headers = {"If-None-Match": 'W/"abc"'}
+        req = make_mocked_request("GET", "/groups/g-1", headers=headers)
+        self.assertFalse(isNotModified(req, etag))
+        headers = {"If-None-Match": "*"}
+        req = make_mocked_request("GET", "/groups/g-1", headers=headers)
+        self.assertTrue(isNotModified(req, etag))
+
+        resp = notModifiedResponse(etag)
+        self.assertEqual(resp.status, 304)
+        self.assertEqual(resp.headers["ETag"], etag)
+
+    def testWatchRequest(self):
+        async def watch(request, deadline=None, disconnect_after=None):
+            task = asyncio.create_task(asyncio.sleep(10))
+            watcher = asyncio.create_task(_watch_request(request, task, deadline, 0.01))
+            if disconnect_after is not None:
+                await asyncio.sleep(disconnect_after)
+                request.transport.is_closing.return_value = True
+            await asyncio.wait_for(watcher, 1)
+            await asyncio.sleep(0)  # let the cancel be delivered
+            return task
+
+        loop = asyncio.new_event_loop()
+        # client disconnects part way through the request
+        transport = Mock()
+        transport.is_closing.return_value = False
+        task = loop.run_until_complete(watch(getRequest(transport), disconnect_after=0.05))
+        self.assertTrue(task.cancelled())
+
+        # client is still connected, but the deadline has passed
+        transport = Mock()
+        transport.is_closing.return_value = False
+        deadline = time.time() + 0.05
+        task = loop.run_until_complete(watch(getRequest(transport), deadline=deadline))
+        self.assertTrue(task.cancelled())
+        loop.close()
+
+    def testCancelOnDisconnect(self):
+        async def handler(request):
+            cancelOnDisconnect(request)
+            await asyncio.sleep(0.05)  # watcher is waiting for its next poll
+            return request["cancel_watcher"]
+
+        async def run(request):
+            watcher = await asyncio.create_task(handler(request))
+            await asyncio.wait([watcher, ], timeout=1)
+            return watcher
+
+        transport = Mock()
+        transport.is_closing.return_value = False
+        config.cfg["request_cancel_interval"] = 60
+        loop = asyncio.new_event_loop()
+        try:
+            watcher = loop.run_until_complete(run(getRequest(transport)))
+        finally:
+            loop.close()
+            del config.cfg["request_cancel_interval"]
+        # the watcher is stopped once the handler is done rather than
+        # waiting for the next poll
+        self.assertTrue(watcher.done())
+
+
+if __name__ == "__main__":
+    # setup test files
+
+    unittest.main()
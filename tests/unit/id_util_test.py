@@ -16,7 +16,7 @@ sys.path.append("../..")
 from hsds.util.idUtil import getObjPartition, isValidUuid, validateUuid
 from hsds.util.idUtil import createObjId, getCollectionForId
 from hsds.util.idUtil import isObjId, isS3ObjKey, getS3Key, getObjId, isSchema2Id
-from hsds.util.idUtil import isRootObjId, getRootObjId
+from hsds.util.idUtil import isRootObjId, getRootObjId, jumpHash
 
 
 class IdUtilTest(unittest.TestCase):
@@ -136,6 +136,46 @@ class IdUtilTest(unittest.TestCase):
         self.assertTrue(node_number >= 0)
         self.assertTrue(node_number < node_count)
 
+    def testConsistentPartition(self):
+        ids = [createObjId("chunks") for i in range(2000)]
+        urls = [f"http://10.0.0.{i}:6101" for i in range(1, 10)]
+        for partitioner in ("modulo", "jump", "rendezvous"):
+            kwargs = {"partitioner": partitioner}
+            old_map = {}
+            new_map = {}
+            for id in ids:
+                old_map[id] = getObjPartition(id, 8, nodes=urls[:8], **kwargs)
+                # add a new node in the middle of the sorted list of nodes
+                new_urls = urls[:4] + urls[8:] + urls[4:8]
+                node_number = getObjPartition(id, 9, nodes=new_urls, **kwargs)
+                self.assertTrue(node_number >= 0)
+                self.assertTrue(node_number < 9)
+                if partitioner == "rendezvous":
+                    # compare by url since node numbers have shifted
+                    old_map[id] = urls[old_map[id]]
+                    node_number = new_urls[node_number]
+                new_map[id] = node_number
+            # every node should get a share of the ids
+            self.assertEqual(len(set(new_map.values())), 9)
+            moved = sum(1 for id in ids if old_map[id] != new_map[id])
+            if partitioner == "modulo":
+                self.assertTrue(moved > len(ids) // 2)
+            else:
+                # about 1/9th of the ids should move
+                self.assertTrue(moved < len(ids) // 5)
+                self.assertTrue(moved > len(ids) // 20)
+
+        # jump hash only moves keys to the new bucket
+        for key in range(1000):
+            old_bucket = jumpHash(key, 10)
+            new_bucket = jumpHash(key, 11)
+            self.assertTrue(new_bucket in (old_bucket, 10))
+
+        with self.assertRaises(ValueError):
+            getObjPartition(ids[0], 8, partitioner="rendezvous")
+        with self.assertRaises(ValueError):
+            getObjPartition(ids[0], 8, partitioner="bogus")
+
     def testGetCollection(self):
         group_id = "g-314d61b8-9954-11e6-a733-3c15c2da029e"
         dataset_id = "d-4c48f3ae-9954-11e6-a3cd-3c15c2da029e"
@@ -9,6 +9,7 @@
 # distribution tree.  If you do not have access to this file, you may        #
 # request a copy from help@hdfgroup.org.                                     #
 ##############################################################################
+import asyncio
 import unittest
 import random
 import sys
@@ -296,6 +297,140 @@ class LruCacheTest(unittest.TestCase):
         mem_per = cc.cacheUtilizationPercent
         self.assertEqual(mem_per, 0)  # no memory used
 
+    def testCompressedTier(self):
+        """check chunks evicted from the cache are kept in compressed form"""
+        chunk_size = 100 * 100 * 4
+        kwargs = {"mem_target": chunk_size * 2, "compressed_target": chunk_size * 2}
+        cc = LruCache(**kwargs)
+        self.assertEqual(cc.compressedMemTarget, chunk_size * 2)
+        ids = []
+        for i in range(4):
+            chunk_id = createObjId("chunks")
+            ids.append(chunk_id)
+            arr = np.arange(100 * 100, dtype="i4").reshape((100, 100)) + i
+            cc[chunk_id] = arr
+            cc.consistencyCheck()
+        # only two chunks fit in the main tier
+        self.assertEqual(len(cc), 2)
+        self.assertEqual(cc.memUsed, chunk_size * 2)
+        self.assertEqual(cc.compressedCount, 2)
+        self.assertEqual(cc.compressedAddCount, 2)
+        self.assertTrue(cc.compressedMemUsed < chunk_size)
+
+        # membership test is for the main tier, and doesn't move the chunk
+        # back to the main tier
+        self.assertFalse(ids[0] in cc)
+        self.assertTrue(cc.isCompressed(ids[0]))
+        cc.consistencyCheck()
+        self.assertEqual(cc.compressedHitCount, 0)
+        self.assertEqual(cc.compressedCount, 2)
+        self.assertEqual(len(cc), 2)
+
+        # accessing an evicted chunk should restore it to the main tier
+        arr = cc[ids[0]]
+        cc.consistencyCheck()
+        self.assertEqual(cc.compressedHitCount, 1)
+        self.assertEqual(arr.shape, (100, 100))
+        self.assertEqual(arr.dtype, np.dtype("i4"))
+        self.assertEqual(arr[10, 10], 1010)
+        self.assertEqual(len(cc), 2)
+        # ids[2] was evicted to make room
+        self.assertEqual(cc.compressedCount, 2)
+        self.assertTrue(cc.isCompressed(ids[1]))
+        self.assertEqual(cc[ids[1]][10, 10], 1011)
+        self.assertEqual(cc.compressedHitCount, 2)
+        self.assertEqual(cc.hitCount, 2)
+
+        # new data for a key invalidates the compressed copy
+        self.assertEqual(list(cc), [ids[1], ids[0]])
+        cc[ids[2]] = np.zeros((100, 100), dtype="i4")
+        cc.consistencyCheck()
+        self.assertEqual(cc[ids[2]][10, 10], 0)
+        self.assertEqual(cc.compressedHitCount, 2)
+
+        # deleted items are removed from both tiers
+        for chunk_id in ids:
+            if chunk_id in cc or cc.isCompressed(chunk_id):
+                del cc[chunk_id]
+        self.assertEqual(len(cc), 0)
+        self.assertEqual(cc.compressedCount, 0)
+        self.assertEqual(cc.compressedMemUsed, 0)
+        self.assertFalse(ids[3] in cc)
+        self.assertTrue(cc.missCount > 0)
+
+        # incompressible data is not kept
+        cc = LruCache(**kwargs)
+        for i in range(3):
+            cc[createObjId("chunks")] = np.random.randint(0, 256, chunk_size, dtype="u1")
+        self.assertEqual(len(cc), 2)
+        self.assertEqual(cc.compressedCount, 0)
+
+        # compressed tier is off by default
+        cc = LruCache(mem_target=chunk_size)
+        for i in range(2):
+            cc[createObjId("chunks")] = np.zeros((100, 100), dtype="i4")
+        self.assertEqual(len(cc), 1)
+        self.assertEqual(cc.compressedCount, 0)
+
+    def testEvictCallback(self):
+        evicted = []
+        cc = LruCache(mem_target=1024 * 10, evict_callback=evicted.append)
+        ids = []
+        for i in range(3):
+            chunk_id = createObjId("chunks")
+            ids.append(chunk_id)
+            cc[chunk_id] = np.zeros((1024,), dtype="i4")  # 4k each
+        self.assertEqual(evicted, [ids[0], ])
+        del cc[ids[2]]
+        self.assertEqual(evicted, [ids[0], ids[2]])
+
+    async def compressed_executor_test(self):
+        chunk_size = 100 * 100 * 4
+        kwargs = {"mem_target": chunk_size * 2, "compressed_target": chunk_size * 2}
+        kwargs["inline_threshold"] = 1000
+        cc = LruCache(**kwargs)
+        ids = []
+        for i in range(3):
+            chunk_id = createObjId("chunks")
+            ids.append(chunk_id)
+            cc[chunk_id] = np.arange(100 * 100, dtype="i4").reshape((100, 100)) + i
+        # compression of the evicted chunk is done in the executor
+        self.assertEqual(cc.compressedCount, 0)
+        self.assertFalse(ids[0] in cc)
+        await asyncio.sleep(0.1)
+        self.assertEqual(cc.compressedCount, 1)
+        self.assertFalse(ids[0] in cc)
+        self.assertTrue(cc.isCompressed(ids[0]))
+
+        # restore decompresses in the executor
+        await cc.restore(ids[0])
+        cc.consistencyCheck()
+        self.assertTrue(ids[0] in cc)
+        self.assertFalse(cc.isCompressed(ids[0]))
+        self.assertEqual(cc.compressedHitCount, 1)
+        self.assertEqual(cc[ids[0]][10, 10], 1010)
+        await asyncio.sleep(0.1)
+        self.assertEqual(cc.compressedCount, 1)  # ids[1] was evicted
+
+        # updating a key while it's being compressed discards the compressed copy
+        self.assertEqual(list(cc), [ids[0], ids[2]])
+        cc[createObjId("chunks")] = np.zeros((100, 100), dtype="i4")  # evicts ids[2]
+        cc[ids[2]] = np.ones((100, 100), dtype="i4")  # evicts ids[0]
+        await asyncio.sleep(0.1)
+        cc.consistencyCheck()
+        self.assertEqual(cc.compressedCount, 2)  # ids[0] and ids[1]
+        self.assertEqual(cc[ids[2]][10, 10], 1)
+        self.assertEqual(cc.compressedHitCount, 1)
+
+        # compressed only items can be deleted
+        del cc[ids[1]]
+        self.assertFalse(cc.isCompressed(ids[1]))
+
+    def testCompressedTierExecutor(self):
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self.compressed_executor_test())
+        loop.close()
+
 
 if __name__ == "__main__":
     # setup test files
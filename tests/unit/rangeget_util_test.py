@@ -12,11 +12,17 @@
 import unittest
 import logging
 import sys
+import numpy as np
 
 sys.path.append("../..")
 from hsds.util.rangegetUtil import (
     ChunkLocation,
     chunkMunge,
+    estimateRangeGetGap,
+    getHyperChunkFactors,
+    getHyperChunkIndex,
+    getHyperChunkIndices,
+    setHyperChunks,
 )
 
 
@@ -81,6 +87,92 @@ class RangegetutilTest(unittest.TestCase):
         except ValueError:
             pass  # expected
 
+    def testMaxSize(self):
+        c1 = ChunkLocation(1, 100, 25)
+        c2 = ChunkLocation(2, 200, 35)
+        c3 = ChunkLocation(3, 300, 40)
+        c4 = ChunkLocation(4, 340, 30)
+        h5chunks = [c1, c2, c3, c4]
+
+        # c3 and c4 are adjacent and span 70 bytes
+        munged = chunkMunge(h5chunks, max_size=100)
+        self.assertEqual(munged, [c1, c2, [c3, c4]])
+
+        munged = chunkMunge(h5chunks, max_size=170)
+        self.assertEqual(munged, [c1, [c2, c3, c4]])
+
+        munged = chunkMunge(h5chunks, max_size=50)
+        self.assertEqual(munged, [c1, c2, c3, c4])
+
+        # no limit
+        munged = chunkMunge(h5chunks, max_size=0)
+        self.assertEqual(munged, [[c1, c2, c3, c4], ])
+
+    def testEstimateGap(self):
+        # 50ms latency, 100 MB/s
+        latency = 0.05
+        throughput = 100.0 * 1024 * 1024
+        timings = []
+        for i in range(20):
+            nbytes = (i + 1) * 100 * 1024
+            timings.append((nbytes, latency + nbytes / throughput))
+        gap = estimateRangeGetGap(timings)
+        self.assertTrue(abs(gap - latency * throughput) < 1024)
+
+        # posix like - 0.1ms latency, 1 GB/s
+        latency = 0.0001
+        throughput = 1024.0 * 1024 * 1024
+        timings = []
+        for i in range(20):
+            nbytes = (i + 1) * 100 * 1024
+            timings.append((nbytes, latency + nbytes / throughput))
+        gap = estimateRangeGetGap(timings)
+        self.assertTrue(abs(gap - latency * throughput) < 1024)
+
+        # not enough samples
+        self.assertEqual(estimateRangeGetGap(timings[:5]), None)
+
+        # all the same size
+        timings = [(1000, 0.01 + i * 0.001) for i in range(20)]
+        self.assertEqual(estimateRangeGetGap(timings), None)
+
+    def testHyperChunks(self):
+        chunk_dims = (6, 8, 10)
+        hyper_dims = (3, 2, 5)
+        factors = getHyperChunkFactors(chunk_dims, hyper_dims)
+        self.assertEqual(factors, [2, 4, 2])
+        indices = getHyperChunkIndices(factors)
+        self.assertEqual(indices.shape, (16, 3))
+        for i in range(16):
+            self.assertEqual(tuple(indices[i]), getHyperChunkIndex(i, factors))
+
+        # fill each hyperchunk with its position in the list
+        # (in reverse order to check that the index is used)
+        order = list(range(16))
+        order.reverse()
+        hyper_chunks = np.zeros((16,) + hyper_dims, dtype=np.int32)
+        for n, i in enumerate(order):
+            hyper_chunks[n, ...] = i
+        chunk_arr = np.zeros(chunk_dims, dtype=np.int32)
+        setHyperChunks(chunk_arr, hyper_dims, indices[order], hyper_chunks)
+
+        # compare with slice by slice assignment
+        expected = np.zeros(chunk_dims, dtype=np.int32)
+        for i in range(16):
+            slices = []
+            for dim in range(3):
+                start = indices[i][dim] * hyper_dims[dim]
+                slices.append(slice(start, start + hyper_dims[dim]))
+            expected[tuple(slices)] = i
+        self.assertTrue(np.array_equal(chunk_arr, expected))
+
+        # a subset of the hyperchunks
+        chunk_arr = np.zeros(chunk_dims, dtype=np.int32)
+        setHyperChunks(chunk_arr, hyper_dims, indices[[3, 5]], hyper_chunks[[0, 1]] + 1)
+        self.assertEqual(np.count_nonzero(chunk_arr), 2 * 30)
+        self.assertEqual(chunk_arr[0, 2, 5], 16)
+        self.assertEqual(chunk_arr[0, 4, 5], 15)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,214 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import unittest
+import sys
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
+
+sys.path.append("../..")
+from hsds.util.s3Client import S3Client
+
+
+class FakeBody:
+    def __init__(self, data):
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+    async def iter_chunks(self, chunk_size=1000):
+        for i in range(0, len(self._data), chunk_size):
+            yield self._data[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeS3:
+    """ stands in for an aiobotocore s3 client """
+
+    def __init__(self, data):
+        self._data = data
+        self.requests = []
+
+    async def get_object(self, Bucket=None, Key=None, Range=None):
+        self.requests.append(Range)
+        size = len(self._data)
+        if Range is None:
+            return {"Body": FakeBody(self._data), "ContentLength": size}
+        start, end = Range[len("bytes="):].split("-")
+        start = int(start)
+        end = min(int(end), size - 1)
+        if start >= size:
+            raise ClientError({"Error": {"Code": "InvalidRange"}}, "GetObject")
+        rsp = {"Body": FakeBody(self._data[start:end + 1])}
+        rsp["ContentRange"] = f"bytes {start}-{end}/{size}"
+        return rsp
+
+
+class FakeMultipartS3:
+    """ stands in for the multipart upload api of an aiobotocore s3 client """
+
+    def __init__(self, fail_part=None, hang_part=None):
+        self.parts = {}
+        self.data = None
+        self.aborted = False
+        self._fail_part = fail_part
+        self._hang_part = hang_part
+
+    async def create_multipart_upload(self, Bucket=None, Key=None):
+        return {"UploadId": "abc"}
+
+    async def upload_part(self, Bucket=None, Key=None, UploadId=None, PartNumber=None, Body=None):
+        if PartNumber == self._fail_part:
+            raise ClientError({"Error": {"Code": "InternalError"}}, "UploadPart")
+        if PartNumber == self._hang_part:
+            await asyncio.sleep(60)
+        await asyncio.sleep(0)
+        self.parts[PartNumber] = Body
+        return {"ETag": f"etag{PartNumber}"}
+
+    async def complete_multipart_upload(self, Bucket=None, Key=None, UploadId=None,
+                                        MultipartUpload=None):
+        parts = MultipartUpload["Parts"]
+        part_numbers = [part["PartNumber"] for part in parts]
+        if part_numbers != sorted(part_numbers):
+            raise ClientError({"Error": {"Code": "InvalidPartOrder"}}, "CompleteMultipartUpload")
+        self.data = b"".join([self.parts[n] for n in part_numbers])
+        return {"ETag": f"etag-{len(parts)}"}
+
+    async def abort_multipart_upload(self, Bucket=None, Key=None, UploadId=None):
+        self.aborted = True
+
+
+def getClient():
+    # skip the normal constructor - no s3 endpoint is needed
+    client = S3Client.__new__(S3Client)
+    client._aio_config = AioConfig(max_pool_connections=64)
+    return client
+
+
+class S3ClientTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(S3ClientTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testGetParts(self):
+        data = bytes(range(256)) * 400  # 102400 bytes
+        client = getClient()
+        loop = asyncio.new_event_loop()
+
+        # whole object - first request finds the object size
+        s3 = FakeS3(data)
+        kwargs = {"split_size": 10000}
+        buffer = loop.run_until_complete(client._get_parts(s3, "b", "k", **kwargs))
+        self.assertEqual(bytes(buffer), data)
+        self.assertEqual(s3.requests[0], "bytes=0-9999")
+        self.assertEqual(len(s3.requests), 5)
+
+        # object smaller than split_size
+        s3 = FakeS3(data[:500])
+        buffer = loop.run_until_complete(client._get_parts(s3, "b", "k", **kwargs))
+        self.assertEqual(bytes(buffer), data[:500])
+        self.assertEqual(len(s3.requests), 1)
+
+        # empty object
+        s3 = FakeS3(b"")
+        buffer = loop.run_until_complete(client._get_parts(s3, "b", "k", **kwargs))
+        self.assertEqual(bytes(buffer), b"")
+
+        # explicit range
+        s3 = FakeS3(data)
+        kwargs = {"offset": 1234, "length": 50000, "split_size": 10000}
+        buffer = loop.run_until_complete(client._get_parts(s3, "b", "k", **kwargs))
+        self.assertEqual(bytes(buffer), data[1234:51234])
+        self.assertEqual(len(s3.requests), 4)
+
+        # range that extends past the end of the object
+        kwargs = {"offset": 90000, "length": 40000, "split_size": 10000}
+        buffer = loop.run_until_complete(client._get_parts(s3, "b", "k", **kwargs))
+        self.assertEqual(bytes(buffer), data[90000:])
+        loop.close()
+
+    def testGetData(self):
+        data = bytes(range(256)) * 400  # 102400 bytes
+        client = getClient()
+        loop = asyncio.new_event_loop()
+
+        # metadata objects are read with a plain get
+        s3 = FakeS3(data[:500])
+        kwargs = {"split_size": 10000}
+        buffer = loop.run_until_complete(client._get_data(s3, "b", "db/g-1/.group.json", **kwargs))
+        self.assertEqual(bytes(buffer), data[:500])
+        self.assertEqual(s3.requests, [None, ])
+
+        # chunk objects are split
+        s3 = FakeS3(data)
+        buffer = loop.run_until_complete(client._get_data(s3, "b", "db/g-1/d/d-1/0", **kwargs))
+        self.assertEqual(bytes(buffer), data)
+        self.assertEqual(len(s3.requests), 5)
+
+        # small ranges use one range get
+        s3 = FakeS3(data)
+        kwargs = {"offset": 100, "length": 1000, "split_size": 10000}
+        buffer = loop.run_until_complete(client._get_data(s3, "b", "db/g-1/d/d-1/0", **kwargs))
+        self.assertEqual(bytes(buffer), data[100:1100])
+        self.assertEqual(s3.requests, ["bytes=100-1099", ])
+
+        # no split size - plain get
+        s3 = FakeS3(data)
+        buffer = loop.run_until_complete(client._get_data(s3, "b", "db/g-1/d/d-1/0"))
+        self.assertEqual(bytes(buffer), data)
+        self.assertEqual(s3.requests, [None, ])
+        loop.close()
+
+    def testPutMultipart(self):
+        data = bytes(range(256)) * 400  # 102400 bytes
+        client = getClient()
+        loop = asyncio.new_event_loop()
+
+        s3 = FakeMultipartS3()
+        etag = loop.run_until_complete(client._put_multipart(s3, "b", "k", data, 30000))
+        self.assertEqual(etag, "etag-4")
+        self.assertEqual(len(s3.parts), 4)
+        self.assertEqual(len(s3.parts[4]), 102400 - 3 * 30000)
+        self.assertEqual(s3.data, data)
+        self.assertFalse(s3.aborted)
+
+        # failed part should abort the upload
+        s3 = FakeMultipartS3(fail_part=2)
+        with self.assertRaises(ClientError):
+            loop.run_until_complete(client._put_multipart(s3, "b", "k", data, 30000))
+        self.assertTrue(s3.aborted)
+        self.assertTrue(s3.data is None)
+
+        # so should cancelling the put
+        s3 = FakeMultipartS3(hang_part=3)
+
+        async def cancel_put():
+            task = asyncio.create_task(client._put_multipart(s3, "b", "k", data, 30000))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            loop.run_until_complete(cancel_put())
+        self.assertTrue(s3.aborted)
+        self.assertTrue(s3.data is None)
+        loop.close()
+
+
+if __name__ == "__main__":
+    # setup test files
+
+    unittest.main()
@@ -16,6 +16,7 @@ import numpy as np
 from aiobotocore.session import get_session
 import unittest
 import sys
+from unittest.mock import patch
 from aiohttp.web_exceptions import HTTPNotFound
 
 sys.path.append("../..")
@@ -24,6 +25,25 @@ from hsds.util.storUtil import getStorJSONObj, putStorJSONObj, putStorBytes
 from hsds.util.storUtil import getStorBytes, isStorObj
 from hsds.util.storUtil import getStorObjStats, getStorKeys, releaseStorageClient
 from hsds.util.storUtil import _getStorageDriverName, getBucketFromStorURI, getKeyFromStorURI
+from hsds.util.storUtil import _getStorObject, getHyperChunks
+from hsds.util.rangegetUtil import ChunkLocation
+
+
+class SlowClient:
+    """ storage client stand-in that counts get_object requests """
+
+    def __init__(self, data):
+        self._data = data
+        self.get_count = 0
+
+    async def get_object(self, bucket=None, key=None, offset=0, length=-1):
+        self.get_count += 1
+        await asyncio.sleep(0.1)
+        if key == "missing":
+            raise HTTPNotFound()
+        if length > 0:
+            return self._data[offset:offset + length]
+        return self._data
 
 
 class StorUtilTest(unittest.TestCase):
@@ -223,6 +243,78 @@ class StorUtilTest(unittest.TestCase):
         """
         await releaseStorageClient(app)
 
+    async def read_coalesce_test(self, app, client):
+        kwargs = {"offset": 100, "length": 1000}
+        tasks = []
+        for i in range(5):
+            tasks.append(_getStorObject(app, client, "mybucket", "key1", **kwargs))
+        tasks.append(_getStorObject(app, client, "mybucket", "key2", **kwargs))
+        results = await asyncio.gather(*tasks)
+        self.assertEqual(client.get_count, 2)
+        for data in results:
+            self.assertEqual(bytes(data), bytes(client._data[100:1100]))
+        # callers sharing a read should not share mutable buffers
+        self.assertTrue(results[0] is not results[1])
+        stats = app["read_coalesce_stats"]
+        self.assertEqual(stats["read_count"], 2)
+        self.assertEqual(stats["hit_count"], 4)
+        self.assertEqual(stats["coalesce_count"], 1)
+        self.assertEqual(len(app["pending_stor_reads"]), 0)
+
+        # a new read after the first completes should go to storage
+        await _getStorObject(app, client, "mybucket", "key1", **kwargs)
+        self.assertEqual(client.get_count, 3)
+
+        # errors are returned to every caller
+        tasks = [_getStorObject(app, client, "mybucket", "missing") for i in range(3)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual(client.get_count, 4)
+        for result in results:
+            self.assertTrue(isinstance(result, HTTPNotFound))
+
+        # cancelling one caller doesn't cancel the read for the others
+        task1 = asyncio.ensure_future(_getStorObject(app, client, "mybucket", "key3"))
+        task2 = asyncio.ensure_future(_getStorObject(app, client, "mybucket", "key3"))
+        await asyncio.sleep(0)
+        task1.cancel()
+        data = await task2
+        self.assertEqual(len(data), len(client._data))
+        self.assertEqual(client.get_count, 5)
+
+    def testReadCoalesce(self):
+        client = SlowClient(bytearray(range(256)) * 10)
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self.read_coalesce_test({}, client))
+        loop.close()
+
+    def testGetHyperChunks(self):
+        # three 2x2 hyperchunks of a 4x4 chunk, with a gap in the file
+        hyper_chunks = [np.arange(4, dtype="<i4") + 10 * (i + 1) for i in range(3)]
+        file_data = bytearray()
+        file_data.extend(hyper_chunks[0].tobytes())
+        file_data.extend(hyper_chunks[1].tobytes())
+        file_data.extend(b"\xff" * 8)
+        file_data.extend(hyper_chunks[2].tobytes())
+        chunk_locations = [ChunkLocation([0, 0], 100, 16), ChunkLocation([0, 1], 116, 16)]
+        chunk_locations.append(ChunkLocation([1, 1], 140, 16))
+
+        async def getStorBytes(app, key, offset=0, length=0, bucket=None, use_cache=False):
+            offset -= 100
+            return bytes(file_data[offset:offset + length])
+
+        chunk_arr = np.zeros((4, 4), dtype="<i4")
+        kwargs = {"chunk_arr": chunk_arr, "hyper_dims": [2, 2]}
+        kwargs["chunk_locations"] = chunk_locations
+        loop = asyncio.new_event_loop()
+        with patch("hsds.util.storUtil.getStorBytes", new=getStorBytes):
+            loop.run_until_complete(getHyperChunks({}, "afile.h5", **kwargs))
+        loop.close()
+        expected = np.zeros((4, 4), dtype="<i4")
+        expected[0:2, 0:2] = hyper_chunks[0].reshape((2, 2))
+        expected[0:2, 2:4] = hyper_chunks[1].reshape((2, 2))
+        expected[2:4, 2:4] = hyper_chunks[2].reshape((2, 2))
+        self.assertTrue(np.array_equal(chunk_arr, expected))
+
     def testStorUtil(self):
         # run synchronus tests
         self.s3path_test()
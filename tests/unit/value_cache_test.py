@@ -0,0 +1,90 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import time
+import unittest
+import sys
+
+sys.path.append("../..")
+from hsds.util.valueCache import ValueCache
+from hsds.util.httpUtil import getETag
+
+
+class ValueCacheTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ValueCacheTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testValueCache(self):
+        cache = ValueCache(mem_target=1000, max_item_size=500)
+        self.assertEqual(len(cache), 0)
+        self.assertTrue(cache.get("d-1", "[0:10]") is None)
+        self.assertEqual(cache.missCount, 1)
+
+        etag = cache.put("d-1", "[0:10]", b"a" * 300)
+        self.assertEqual(etag, getETag(b"a" * 300))
+        self.assertTrue(etag.startswith('W/"'))
+        cache.put("d-1", "[10:20]", b"b" * 300)
+        cache.put("d-2", "[0:10]", b"c" * 300)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.memUsed, 900)
+        self.assertEqual(cache.cacheUtilizationPercent, 90)
+
+        self.assertEqual(cache.get("d-1", "[0:10]"), (b"a" * 300, etag))
+        self.assertEqual(cache.hitCount, 1)
+
+        # d-1 [10:20] is least recently used, so should get evicted
+        cache.put("d-2", "[10:20]", b"d" * 300)
+        self.assertEqual(cache.evictCount, 1)
+        self.assertFalse(("d-1", "[10:20]") in cache)
+        self.assertTrue(("d-1", "[0:10]") in cache)
+
+        # items larger than max_item_size are not cached
+        cache.put("d-3", "[0:10]", b"e" * 600)
+        self.assertFalse(("d-3", "[0:10]") in cache)
+
+        # invalidate removes all selections for the dataset
+        cache.invalidate("d-2")
+        self.assertEqual(cache.invalidateCount, 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.memUsed, 300)
+
+        # responses read before an invalidate don't get cached
+        generation = cache.generation
+        cache.invalidate("d-1")
+        cache.put("d-1", "[0:10]", b"f" * 100, generation=generation)
+        self.assertTrue(cache.get("d-1", "[0:10]") is None)
+        cache.put("d-1", "[0:10]", b"f" * 100, generation=cache.generation)
+        self.assertEqual(cache.get("d-1", "[0:10]")[0], b"f" * 100)
+
+        # a precomputed etag is stored as is
+        etag = getETag(b"g" * 100)
+        self.assertEqual(cache.put("d-2", "[0:10]", b"g" * 100, etag=etag), etag)
+        self.assertEqual(cache.get("d-2", "[0:10]"), (b"g" * 100, etag))
+
+        cache.clearCache()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.memUsed, 0)
+
+    def testExpire(self):
+        cache = ValueCache(mem_target=1000, expire_time=0.1)
+        cache.put("d-1", "[0:10]", b"a" * 100)
+        self.assertTrue(cache.get("d-1", "[0:10]") is not None)
+        time.sleep(0.2)
+        self.assertTrue(cache.get("d-1", "[0:10]") is None)
+        self.assertEqual(cache.expireCount, 1)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    # setup test files
+
+    unittest.main()